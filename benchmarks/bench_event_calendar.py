@@ -0,0 +1,196 @@
+"""Date range queries for open events over a large calendar.
+
+Seeds EVENTS events over two years, most of them already full, in an SQLite
+file and times "open events for a leader in the next 30 days" three ways:
+
+  - python:    load every event and filter in Python
+  - date index: the range query over the old (starts_at, id) index, every
+               event in range is read from the table to check its counters
+  - calendar:  the same query over ix_event_calendar, which carries the
+               counters, so full events are skipped on the index entry
+
+then streams the iCalendar feed for a whole year and reports its peak
+memory against building the same document as one string.
+
+    python benchmarks/bench_event_calendar.py [events] [full fraction]
+"""
+
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("SECRET_KEY", "bench")
+os.environ.setdefault("PASSWORD_SALT", "bench")
+os.environ.setdefault("JOBS_IN_WEB_PROCESS", "0")
+
+from datetime import datetime, timedelta  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+from flaskblog import create_app, db  # noqa: E402
+from flaskblog.bookings.calendar import ical_feed, open_events  # noqa: E402
+from flaskblog.config import Config  # noqa: E402
+from flaskblog.models import Event, User  # noqa: E402
+
+EVENTS = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+FULL = float(sys.argv[2]) if len(sys.argv) > 2 else 0.8
+RUNS = 7
+START = datetime(2030, 1, 1)
+WINDOW = timedelta(days=30)
+
+
+def seed():
+    db.create_all()
+    db.session.execute(
+        User.__table__.insert(),
+        [
+            {
+                "username": "bench",
+                "email": "bench@example.com",
+                "email_verified": True,
+                "password": b"x",
+                "first_name": "Bench",
+                "last_name": "User",
+                "role": "Leader",
+            }
+        ],
+    )
+    rng = random.Random(0)
+    rows = []
+    for number in range(EVENTS):
+        capacity = rng.choice((20, 40, 100))
+        if rng.random() < FULL:
+            leaders = capacity // 2
+            followers = capacity - leaders
+        else:
+            leaders = rng.randrange(capacity // 2)
+            followers = rng.randrange(capacity // 2)
+        rows.append(
+            {
+                "title": f"Milonga {number}",
+                "description": "Live orchestra, class before. " * 8,
+                "location": "Town hall",
+                "starts_at": START + timedelta(minutes=rng.randrange(2 * 365 * 1440)),
+                "organizer_id": 1,
+                "capacity": capacity,
+                "max_imbalance": 2,
+                "leaders": leaders,
+                "followers": followers,
+                "created_at": START,
+            }
+        )
+    for batch in range(0, EVENTS, 10_000):
+        db.session.execute(Event.__table__.insert(), rows[batch : batch + 10_000])
+    db.session.commit()
+    db.session.execute(text("ANALYZE"))
+    db.session.commit()
+
+
+def median_ms(run):
+    times = []
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        result = run()
+        times.append(time.perf_counter() - started)
+    return statistics.median(times) * 1000, result
+
+
+def in_python():
+    end = START + WINDOW
+    return [
+        event
+        for event in Event.query.all()
+        if START <= event.starts_at < end
+        and event.booked < event.capacity
+        and event.leaders + 1 - event.followers <= event.max_imbalance
+    ]
+
+
+def in_sql():
+    return open_events(START, START + WINDOW, "Leader").all()
+
+
+def plan():
+    query = open_events(START, START + WINDOW, "Leader")
+    statement = query.statement.compile(db.engine)
+    parameters = tuple(statement.params[name] for name in statement.positiontup)
+    rows = db.session.connection().exec_driver_sql(
+        f"EXPLAIN QUERY PLAN {statement}", tuple(map(str, parameters))
+    )
+    return "; ".join(row.detail for row in rows)
+
+
+def feed(build_string):
+    rows = open_events(START, START + timedelta(days=365)).yield_per(500)
+    chunks = ical_feed(rows, "bench", lambda event_id: f"/event/{event_id}")
+    if build_string:
+        return len("".join(list(chunks)))
+    return sum(len(chunk) for chunk in chunks)
+
+
+def peak_kib(run):
+    # traced separately, tracemalloc slows everything down several times
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1024
+
+
+def main():
+    directory = tempfile.mkdtemp()
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = "sqlite:///" + os.path.join(directory, "bench.db")
+
+    app = create_app(BenchConfig)
+    try:
+        with app.app_context():
+            seed()
+            print(f"{EVENTS} events, {FULL:.0%} full, open for a leader in 30 days:")
+            python_ms, found = median_ms(in_python)
+            print(f"  {'python':>10}: {python_ms:8.1f} ms, {len(found)} events")
+
+            db.session.execute(text("DROP INDEX ix_event_calendar"))
+            db.session.execute(
+                text("CREATE INDEX ix_event_starts_at_id ON event (starts_at, id)")
+            )
+            db.session.commit()
+            date_ms, found = median_ms(in_sql)
+            print(f"  {'date index':>10}: {date_ms:8.1f} ms, {len(found)} events")
+            print(f"  {'':>10}  {plan()}")
+
+            db.session.execute(text("DROP INDEX ix_event_starts_at_id"))
+            db.session.execute(
+                text(
+                    "CREATE INDEX ix_event_calendar ON event "
+                    "(starts_at, id, capacity, leaders, followers, max_imbalance)"
+                )
+            )
+            db.session.commit()
+            calendar_ms, found = median_ms(in_sql)
+            print(f"  {'calendar':>10}: {calendar_ms:8.1f} ms, {len(found)} events")
+            print(f"  {'':>10}  {plan()}")
+
+            print("iCalendar feed, open events in one year:")
+            for label, build_string in (("streamed", False), ("one string", True)):
+                elapsed, size = median_ms(lambda: feed(build_string))
+                peak = peak_kib(lambda: feed(build_string))
+                print(
+                    f"  {label:>10}: {elapsed:8.1f} ms, {size / 1024:8.0f} KiB "
+                    f"document, peak {peak:8.0f} KiB allocated"
+                )
+            db.session.remove()
+    finally:
+        with app.app_context():
+            db.engine.dispose()
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
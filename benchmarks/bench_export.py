@@ -0,0 +1,132 @@
+"""Memory use of a bulk post export.
+
+Seeds POSTS posts in an SQLite file and exports them as CSV and NDJSON two
+ways, reporting time and peak memory allocated:
+
+  - all():     load every row with .all() and build the file as one string
+  - streamed:  export_chunks, yield_per batches written out one at a time
+
+    python benchmarks/bench_export.py [posts]
+"""
+
+import csv
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("SECRET_KEY", "bench")
+os.environ.setdefault("PASSWORD_SALT", "bench")
+os.environ.setdefault("JOBS_IN_WEB_PROCESS", "0")
+
+from datetime import datetime, timedelta  # noqa: E402
+from flaskblog import create_app, db  # noqa: E402
+from flaskblog.config import Config  # noqa: E402
+from flaskblog.export import EXPORTS, export_chunks  # noqa: E402
+from flaskblog.models import Post, User  # noqa: E402
+
+POSTS = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+START = datetime(2030, 1, 1)
+
+
+def seed():
+    db.create_all()
+    db.session.execute(
+        User.__table__.insert(),
+        [
+            {
+                "username": "bench",
+                "email": "bench@example.com",
+                "email_verified": True,
+                "password": b"x",
+                "first_name": "Bench",
+                "last_name": "User",
+                "role": "Leader",
+            }
+        ],
+    )
+    content = "Notes from last night's milonga. " * 20
+    for batch in range(0, POSTS, 10_000):
+        db.session.execute(
+            Post.__table__.insert(),
+            [
+                {
+                    "title": f"Post {number}",
+                    "date_posted": START + timedelta(minutes=number),
+                    "content": content,
+                    "excerpt": content[:200],
+                    "user_id": 1,
+                }
+                for number in range(batch, min(batch + 10_000, POSTS))
+            ],
+        )
+    db.session.commit()
+
+
+def all_at_once(format):
+    columns = EXPORTS["posts"]
+    names = [column.key for column in columns]
+    rows = db.session.query(*columns).order_by(Post.id).all()
+    if format == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(names)
+        writer.writerows(rows)
+        return len(buffer.getvalue())
+    return len(
+        "".join(
+            json.dumps(dict(zip(names, row)), default=datetime.isoformat) + "\n"
+            for row in rows
+        )
+    )
+
+
+def streamed(format):
+    return sum(len(chunk) for chunk in export_chunks("posts", format))
+
+
+def measure(run):
+    started = time.perf_counter()
+    size = run()
+    elapsed = time.perf_counter() - started
+    # traced separately, tracemalloc slows everything down several times
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed * 1000, size, peak / 1024
+
+
+def main():
+    directory = tempfile.mkdtemp()
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = "sqlite:///" + os.path.join(directory, "bench.db")
+
+    app = create_app(BenchConfig)
+    try:
+        with app.app_context():
+            seed()
+            print(f"{POSTS} posts:")
+            for format in ("csv", "ndjson"):
+                for label, export in (("all()", all_at_once), ("streamed", streamed)):
+                    elapsed, size, peak = measure(lambda: export(format))
+                    print(
+                        f"  {format:>6} {label:>8}: {elapsed:8.1f} ms, "
+                        f"{size / 1024:8.0f} KiB file, peak {peak:8.0f} KiB allocated"
+                    )
+            db.session.remove()
+    finally:
+        with app.app_context():
+            db.engine.dispose()
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Anonymous home feed throughput with the fragment cache on and off.
+
+Seeds a throwaway SQLite database, then replays the same mix of anonymous
+feed requests (mostly the front page, some deeper pages) against the app with
+FEED_CACHE_ENABLED set each way and reports requests per second.
+
+    python benchmarks/bench_feed_cache.py
+"""
+
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + DB_PATH
+os.environ.setdefault("SECRET_KEY", "bench")
+os.environ.setdefault("PASSWORD_SALT", "bench")
+
+from flaskblog import create_app, db  # noqa: E402
+from flaskblog.models import User, Post, make_excerpt  # noqa: E402
+
+AUTHORS = 50
+POSTS = 2_000
+REQUESTS = 2_000
+URLS = ["/"] * 8 + ["/home?page=2", "/home?page=3"]
+
+
+def seed():
+    db.create_all()
+    db.session.execute(
+        User.__table__.insert(),
+        [
+            {
+                "username": f"author{i}",
+                "email": f"author{i}@example.com",
+                "email_verified": True,
+                "password": b"x",
+                "first_name": "Bench",
+                "last_name": f"Author{i}",
+                "role": "Both",
+                "image_file": "default.png",
+            }
+            for i in range(AUTHORS)
+        ],
+    )
+    start = datetime(2020, 1, 1)
+    db.session.execute(
+        Post.__table__.insert(),
+        [
+            {
+                "title": f"Post {i}",
+                "content": "Lorem ipsum dolor sit amet. " * 20,
+                "excerpt": make_excerpt("Lorem ipsum dolor sit amet. " * 20),
+                "date_posted": start + timedelta(minutes=i),
+                "user_id": i % AUTHORS + 1,
+            }
+            for i in range(POSTS)
+        ],
+    )
+    db.session.commit()
+
+
+def requests_per_second(client):
+    for url in URLS:
+        client.get(url)
+    started = time.perf_counter()
+    for i in range(REQUESTS):
+        response = client.get(URLS[i % len(URLS)])
+        assert response.status_code == 200
+    return REQUESTS / (time.perf_counter() - started)
+
+
+def main():
+    app = create_app()
+    client = app.test_client()
+    with app.app_context():
+        seed()
+    for enabled in (False, True):
+        app.config["FEED_CACHE_ENABLED"] = enabled
+        rps = requests_per_second(client)
+        print(f"cache {'on ' if enabled else 'off'}: {rps:8.1f} requests/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Feed pagination latency, cursor (keyset) vs page number (OFFSET).
+
+Seeds a throwaway SQLite database with enough posts for 10,000 feed pages and
+times fetching a page of the home feed at increasing depths both ways. The app
+itself only numbers the first FEED_PAGE_LINKS pages; this shows why.
+
+    python benchmarks/bench_pagination.py
+"""
+
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + DB_PATH
+os.environ.setdefault("SECRET_KEY", "bench")
+os.environ.setdefault("PASSWORD_SALT", "bench")
+
+from flaskblog import create_app, db  # noqa: E402
+from flaskblog.models import User, Post, make_excerpt  # noqa: E402
+from flaskblog.pagination import encode_cursor, paginate_feed  # noqa: E402
+from flaskblog.posts.utils import feed_query  # noqa: E402
+
+PER_PAGE = 7
+PAGES = 10_000
+DEPTHS = [1, 10, 100, 1_000, 5_000, 10_000]
+REPEAT = 20
+
+
+def seed():
+    db.create_all()
+    db.session.execute(
+        User.__table__.insert(),
+        [
+            {
+                "username": "bench",
+                "email": "bench@example.com",
+                "email_verified": True,
+                "password": b"x",
+                "first_name": "Bench",
+                "last_name": "User",
+                "role": "Both",
+                "image_file": "default.png",
+            }
+        ],
+    )
+    start = datetime(2020, 1, 1)
+    rows = [
+        {
+            "title": f"Post {i}",
+            "content": "Lorem ipsum dolor sit amet. " * 4,
+            "excerpt": make_excerpt("Lorem ipsum dolor sit amet. " * 4),
+            "date_posted": start + timedelta(minutes=i),
+            "user_id": 1,
+        }
+        for i in range(PER_PAGE * PAGES)
+    ]
+    db.session.execute(Post.__table__.insert(), rows)
+    db.session.commit()
+
+
+def timed(app, url):
+    # the feed query behind /home, without rendering (deep numbered pages
+    # would render thousands of page links) or the fragment cache
+    with app.test_request_context(url):
+        paginate_feed(feed_query(), per_page=PER_PAGE)
+        started = time.perf_counter()
+        for _ in range(REPEAT):
+            page = paginate_feed(feed_query(), per_page=PER_PAGE)
+        elapsed = (time.perf_counter() - started) / REPEAT
+    assert len(page.items) == PER_PAGE, url
+    return elapsed * 1000
+
+
+def main():
+    app = create_app()
+    # lifted so that deep page numbers can be timed at all
+    app.config["FEED_PAGE_LINKS"] = PAGES
+    with app.app_context():
+        seed()
+        newest_first = Post.query.order_by(Post.date_posted.desc(), Post.id.desc())
+        print(f"{'page':>8} {'offset ms':>10} {'cursor ms':>10}")
+        for depth in DEPTHS:
+            offset_ms = timed(app, f"/home?page={depth}")
+            if depth == 1:
+                cursor_ms = timed(app, "/home")
+            else:
+                # the cursor a reader would hold after walking to this page
+                last_on_previous = newest_first.offset(
+                    (depth - 1) * PER_PAGE - 1
+                ).first()
+                cursor_ms = timed(app, f"/home?after={encode_cursor(last_on_previous)}")
+            print(f"{depth:>8} {offset_ms:>10.2f} {cursor_ms:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
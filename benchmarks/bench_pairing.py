@@ -0,0 +1,78 @@
+"""Partner rotations for a large class, round by round.
+
+Builds ATTENDEES dancers with a realistic mix of profile roles and times
+flaskblog.bookings.pairing.rotation: the first round, every round of a long
+rotation, and a rotation long enough that most pairs have danced together,
+which forces the Hopcroft-Karp repair to do real work. Checks that no pair
+repeats while fresh partners exist.
+
+    python benchmarks/bench_pairing.py [attendees] [rounds]
+"""
+
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("SECRET_KEY", "bench")
+os.environ.setdefault("PASSWORD_SALT", "bench")
+os.environ.setdefault("SQLALCHEMY_DATABASE_URI", "sqlite:///:memory:")
+
+from flaskblog.bookings.pairing import rotation  # noqa: E402
+
+ATTENDEES = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+ROUNDS = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+RUNS = 7
+
+
+def make_attendees(seed=0):
+    # roughly 40% leaders, 40% followers and 20% "Both"
+    rng = random.Random(seed)
+    roles = ["Leader"] * 4 + ["Follower"] * 4 + ["Both"] * 2
+    return [(f"dancer{number}", rng.choice(roles)) for number in range(ATTENDEES)]
+
+
+def timed(attendees, rounds):
+    times = []
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        schedule = rotation(attendees, rounds)
+        times.append(time.perf_counter() - started)
+    return statistics.median(times), schedule
+
+
+def repeats(schedule):
+    seen = set()
+    count = 0
+    for round_ in schedule:
+        for pair in round_.pairs:
+            key = frozenset(pair)
+            count += key in seen
+            seen.add(key)
+    return count
+
+
+def main():
+    attendees = make_attendees()
+    roles = {role: sum(1 for _, r in attendees if r == role) for _, role in attendees}
+    print(f"{ATTENDEES} attendees: {roles}")
+    long_rounds = ATTENDEES // 2
+    for label, rounds in (
+        ("1 round", 1),
+        (f"{ROUNDS} rounds", ROUNDS),
+        (f"{long_rounds} rounds", long_rounds),
+    ):
+        seconds, schedule = timed(attendees, rounds)
+        pairs = sum(len(round_.pairs) for round_ in schedule)
+        print(
+            f"{label:>12}: {seconds * 1000:8.1f} ms total, "
+            f"{seconds * 1000 / rounds:6.2f} ms per round, "
+            f"{pairs / rounds:.0f} pairs per round, {repeats(schedule)} repeats"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Full-text search over a million synthetic posts, FTS5 against LIKE.
+
+Seeds a throwaway SQLite database with POSTS posts written from a Zipf-ish
+vocabulary, builds the search index with a rebuild, then times ranked first
+pages through flaskblog.search for common, rare and prefix terms next to the
+naive, unranked `LIKE '%term%'` scan they replace. The LIKE scan can stop early
+for common words (it only needs the newest ten), but has to read the whole
+table for rare ones.
+
+    python benchmarks/bench_search.py [posts]
+"""
+
+import itertools
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + DB_PATH
+os.environ.setdefault("SECRET_KEY", "bench")
+os.environ.setdefault("PASSWORD_SALT", "bench")
+os.environ.setdefault("JOBS_IN_WEB_PROCESS", "0")
+
+from datetime import datetime, timedelta  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+from flaskblog import create_app, db  # noqa: E402
+from flaskblog.models import User, Post, make_excerpt  # noqa: E402
+from flaskblog.search import rebuild_index, search_posts  # noqa: E402
+
+POSTS = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+AUTHORS = 1_000
+WORDS_PER_POST = 40
+CHUNK = 20_000
+REPEAT = 20
+# made up words of 3 to 10 letters; word i is drawn with probability ~ 1/(i+1),
+# so the first few are in almost every post and the last ones are rare
+_letters = random.Random(0)
+VOCABULARY = sorted(
+    {
+        "".join(
+            _letters.choices("abcdefghijklmnopqrstuvwxyz", k=_letters.randint(3, 10))
+        )
+        for _ in range(20_500)
+    }
+)[:20_000]
+_letters.shuffle(VOCABULARY)
+CUM_WEIGHTS = list(itertools.accumulate(1 / (i + 1) for i in range(len(VOCABULARY))))
+TERMS = {
+    "common": VOCABULARY[3],
+    "rare": VOCABULARY[15_000],
+    "two common": f"{VOCABULARY[3]} {VOCABULARY[10]}",
+    "mid": VOCABULARY[150],
+    "prefix": VOCABULARY[150][:4],
+    "no match": "nothing",
+}
+
+
+def seed():
+    db.create_all()
+    db.session.execute(
+        User.__table__.insert(),
+        [
+            {
+                "username": f"author{i}",
+                "email": f"author{i}@example.com",
+                "email_verified": True,
+                "password": b"x",
+                "first_name": "Bench",
+                "last_name": f"Author{i}",
+                "role": "Both",
+                "image_file": "default.png",
+            }
+            for i in range(AUTHORS)
+        ],
+    )
+    rng = random.Random(1)
+    start = datetime(2020, 1, 1)
+    for offset in range(0, POSTS, CHUNK):
+        rows = []
+        for i in range(offset, min(offset + CHUNK, POSTS)):
+            words = rng.choices(
+                VOCABULARY, cum_weights=CUM_WEIGHTS, k=WORDS_PER_POST + 4
+            )
+            rows.append(
+                {
+                    "title": " ".join(words[:4]),
+                    "content": " ".join(words[4:]),
+                    "excerpt": make_excerpt(" ".join(words[4:])),
+                    "date_posted": start + timedelta(seconds=i),
+                    "user_id": i % AUTHORS + 1,
+                }
+            )
+        db.session.execute(Post.__table__.insert(), rows)
+        db.session.commit()
+
+
+def median_ms(run):
+    times = []
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - started)
+    return statistics.median(times) * 1000
+
+
+def like_scan(terms):
+    # what a search without an index would have to do
+    clauses = " AND ".join(
+        f"(title LIKE :t{i} OR content LIKE :t{i})" for i in range(len(terms.split()))
+    )
+    params = {f"t{i}": f"%{term}%" for i, term in enumerate(terms.split())}
+    return db.session.execute(
+        text(f"SELECT id FROM post WHERE {clauses} ORDER BY date_posted DESC LIMIT 11"),
+        params,
+    ).all()
+
+
+def main():
+    app = create_app()
+    with app.app_context():
+        started = time.perf_counter()
+        seed()
+        print(f"seeded {POSTS:,} posts in {time.perf_counter() - started:.1f}s")
+        started = time.perf_counter()
+        rebuild_index()
+        print(f"built the index in {time.perf_counter() - started:.1f}s")
+
+    print(f"{'terms':<26} {'fts5 page':>12} {'LIKE scan':>12}")
+    for kind, terms in TERMS.items():
+        with app.test_request_context():
+            fts = median_ms(lambda: search_posts(terms, per_page=10))
+            like = median_ms(lambda: like_scan(terms))
+        print(f"{kind + ' (' + terms + ')':<26} {fts:10.2f}ms {like:10.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""Concurrent readers and writers on one SQLite file, tuned against untuned.
+
+Request threads read a feed page and every fifth operation write a post,
+while a scheduler thread rewrites a batch of rows in a loop, all through the
+app's engine and pool. The same workload runs with the engine settings from
+Config (WAL, synchronous=NORMAL, busy_timeout, mmap) and with the previous
+SQLite defaults (rollback journal, synchronous=FULL, Python's own 5 s busy
+timeout, no mmap), and reports throughput, "database is locked" errors,
+operation latency and pool checkout waits.
+
+    python benchmarks/bench_sqlite_concurrency.py [threads] [seconds]
+"""
+
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("SECRET_KEY", "bench")
+os.environ.setdefault("PASSWORD_SALT", "bench")
+os.environ.setdefault("JOBS_IN_WEB_PROCESS", "0")
+
+from datetime import datetime  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from flaskblog import create_app, db  # noqa: E402
+from flaskblog.config import Config  # noqa: E402
+from flaskblog.engine import POOL_CHECKOUT_SECONDS  # noqa: E402
+from flaskblog.models import User, Post  # noqa: E402
+
+THREADS = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+SECONDS = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+POSTS = 5_000
+
+
+def make_config(path, tuned):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = "sqlite:///" + path
+        DB_POOL_SIZE = THREADS + 1
+
+    if not tuned:
+        BenchConfig.SQLITE_JOURNAL_MODE = "delete"
+        BenchConfig.SQLITE_SYNCHRONOUS = "full"
+        BenchConfig.SQLITE_BUSY_TIMEOUT_MS = 5000
+        BenchConfig.SQLITE_MMAP_SIZE = 0
+    return BenchConfig
+
+
+def seed():
+    db.create_all()
+    db.session.execute(
+        User.__table__.insert(),
+        [
+            {
+                "username": "bench",
+                "email": "bench@example.com",
+                "email_verified": True,
+                "password": b"x",
+                "first_name": "Bench",
+                "last_name": "User",
+                "role": "Both",
+                "image_file": "default.png",
+            }
+        ],
+    )
+    db.session.execute(
+        Post.__table__.insert(),
+        [
+            {
+                "title": f"Post {i}",
+                "content": "Lorem ipsum dolor sit amet. " * 10,
+                "excerpt": "Lorem ipsum dolor sit amet.",
+                "date_posted": datetime(2020, 1, 1),
+                "user_id": 1,
+            }
+            for i in range(POSTS)
+        ],
+    )
+    db.session.commit()
+
+
+def request_worker(app, stop, latencies, errors):
+    with app.app_context():
+        i = 0
+        while not stop.is_set():
+            i += 1
+            started = time.perf_counter()
+            try:
+                if i % 5 == 0:
+                    db.session.execute(
+                        text(
+                            "INSERT INTO post (title, date_posted, content, excerpt, "
+                            "user_id, revision) VALUES ('new', :now, 'body', 'body', 1, 0)"
+                        ),
+                        {"now": datetime.utcnow()},
+                    )
+                    db.session.execute(
+                        text("UPDATE user SET post_count = post_count + 1 WHERE id = 1")
+                    )
+                    db.session.commit()
+                else:
+                    db.session.execute(
+                        text(
+                            "SELECT id, title, excerpt FROM post "
+                            "ORDER BY date_posted DESC, id DESC LIMIT 8"
+                        )
+                    ).all()
+                    db.session.commit()
+            except OperationalError:
+                db.session.rollback()
+                errors.append(1)
+            latencies.append(time.perf_counter() - started)
+        db.session.remove()
+
+
+def scheduler_worker(app, stop, errors):
+    # stands in for the cleanup jobs: a steady stream of batch updates
+    with app.app_context():
+        while not stop.is_set():
+            try:
+                db.session.execute(
+                    text(
+                        "UPDATE post SET revision = revision + 1 "
+                        "WHERE id IN (SELECT id FROM post ORDER BY random() LIMIT 500)"
+                    )
+                )
+                db.session.commit()
+            except OperationalError:
+                db.session.rollback()
+                errors.append(1)
+            time.sleep(0.01)
+        db.session.remove()
+
+
+def run(tuned):
+    directory = tempfile.mkdtemp()
+    app = create_app(make_config(os.path.join(directory, "bench.db"), tuned))
+    with app.app_context():
+        seed()
+    stop = threading.Event()
+    latencies, errors = [], []
+    checkouts_before = POOL_CHECKOUT_SECONDS.count
+    sum_before = POOL_CHECKOUT_SECONDS.sum
+    threads = [
+        threading.Thread(target=request_worker, args=(app, stop, latencies, errors))
+        for _ in range(THREADS)
+    ] + [threading.Thread(target=scheduler_worker, args=(app, stop, errors))]
+    for thread in threads:
+        thread.start()
+    time.sleep(SECONDS)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    with app.app_context():
+        db.engine.dispose()
+    shutil.rmtree(directory)
+
+    latencies.sort()
+    checkouts = POOL_CHECKOUT_SECONDS.count - checkouts_before
+    wait = (POOL_CHECKOUT_SECONDS.sum - sum_before) / max(checkouts, 1)
+    print(
+        f"{'tuned' if tuned else 'untuned':<8} {len(latencies) / SECONDS:9.0f} ops/s "
+        f"{len(errors):6d} locked "
+        f"p50 {statistics.median(latencies) * 1000:7.2f}ms "
+        f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:8.2f}ms "
+        f"checkout wait {wait * 1e6:7.1f}us"
+    )
+
+
+def main():
+    print(f"{THREADS} request threads and one scheduler thread, {SECONDS:.0f}s each")
+    run(tuned=False)
+    run(tuned=True)
+
+
+if __name__ == "__main__":
+    main()
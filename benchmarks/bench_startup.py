@@ -0,0 +1,70 @@
+"""Process startup cost: importing flaskblog and building an app.
+
+Runs fresh interpreters (so nothing is cached in sys.modules) and reports the
+median wall time of `import flaskblog` and of `create_app()` on top of it,
+then the slowest imports pulled in directly by the snippet, from one
+`python -X importtime` run.
+
+    python benchmarks/bench_startup.py
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUNS = 7
+SNIPPETS = {
+    "import flaskblog": "import flaskblog",
+    "create_app()": "from flaskblog import create_app; create_app()",
+}
+ENV = dict(
+    os.environ,
+    SQLALCHEMY_DATABASE_URI="sqlite:///:memory:",
+    SECRET_KEY="bench",
+    PASSWORD_SALT="bench",
+    PYTHONPATH=ROOT,
+)
+
+
+def wall_time(code):
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], env=ENV, check=True)
+    return time.perf_counter() - started
+
+
+def slowest_imports(count=10):
+    # -X importtime writes "import time: self | cumulative | package" to stderr
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", SNIPPETS["create_app()"]],
+        env=ENV,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    direct = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, package = line.split("|")
+        # nesting adds two spaces per level, keep what the snippet's own
+        # imports pulled in
+        if len(package) - len(package.lstrip()) == 3:
+            direct[package.strip()] = int(cumulative)
+    return sorted(direct.items(), key=lambda item: item[1], reverse=True)[:count]
+
+
+def main():
+    wall_time("pass")  # warm the OS file cache
+    for name, code in SNIPPETS.items():
+        times = [wall_time(code) for _ in range(RUNS)]
+        print(f"{name:<18} {statistics.median(times) * 1000:8.1f} ms (median)")
+    print("\nslowest imports (cumulative):")
+    for package, microseconds in slowest_imports():
+        print(f"  {package:<40} {microseconds / 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,82 +2,82 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
 from flask_login import LoginManager
-from flask_mail import Mail
+from flaskblog.cache import IdentityCache, FragmentCache
 from flaskblog.config import Config
-from flask_migrate import Migrate
-from apscheduler.schedulers.background import BackgroundScheduler
-from datetime import datetime, timedelta
+from flaskblog.mailqueue import MailQueue
+from flaskblog.replicas import RoutingSession
+from flaskblog.users.hashing import PasswordHasher
 import logging
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-db = SQLAlchemy()
+# routes read-only GET requests to the replicas, see flaskblog.replicas
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 bcrypt = Bcrypt()
+password_hasher = PasswordHasher()
 login_manager = LoginManager()
 login_manager.login_view = "users.login"
 login_manager.login_message_category = "info"
-mail = Mail()
-migrate = Migrate()
-scheduler = BackgroundScheduler()
-
-
-def delete_old_pending_users():
-
-    from flaskblog.models import User
-
-    with app.app_context():
-        logger.info("Running delete_old_pending_users task.")
-        cutoff_time = datetime.utcnow() - timedelta(minutes=30)
-        old_users = User.query.filter(
-            User.created_at < cutoff_time, User.email_verified == False
-        ).all()
-        if old_users:
-            logger.info(f"Found {len(old_users)} old pending users to delete.")
-            for user in old_users:
-                logger.info(
-                    f"Deleting user {user.username} created at {user.created_at} with email {user.email}"
-                )
-                db.session.delete(user)
-            db.session.commit()
-            logger.info(f"Deleted {len(old_users)} old pending users.")
-        else:
-            logger.info("No old pending users to delete.")
+mail_queue = MailQueue()
+user_cache = IdentityCache()
+fragment_cache = FragmentCache()
 
 
+# Apps are only ever built here: run.py, the flask CLI, tests and benchmarks
+# each call create_app. Heavy, rarely needed libraries (Pillow, Flask-Mail,
+# APScheduler, Flask-Migrate) are imported on first use, not at startup.
+# The job scheduler starts with the first request, see flaskblog.jobs.
 def create_app(config_class=Config):
-    global app
     app = Flask(__name__)
-    app.config.from_object(Config)
+    app.config.from_object(config_class)
 
+    from flaskblog import engine, replicas
+
+    # pool sizing and driver options come from the DB_* settings
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine.engine_options(app.config)
     db.init_app(app)
+    engine.init_app(app)
+    replicas.init_app(app)
     bcrypt.init_app(app)
+    password_hasher.init_app(app)
     login_manager.init_app(app)
-    mail.init_app(app)
-    migrate.init_app(app, db)
+    user_cache.init_app(app)
+    fragment_cache.init_app(app)
+    mail_queue.init_app(app)
+
+    from flaskblog import cli
+
+    cli.init_app(app)
 
     # Register blueprints
     from flaskblog.users.routes import users
     from flaskblog.posts.routes import posts
     from flaskblog.main.routes import main
+    from flaskblog.bookings.routes import bookings
     from flaskblog.errors.handlers import errors
+    from flaskblog.instrumentation import metrics
+    from flaskblog.export import admin
 
     app.register_blueprint(users)
     app.register_blueprint(posts)
     app.register_blueprint(main)
+    app.register_blueprint(bookings)
     app.register_blueprint(errors)
+    app.register_blueprint(metrics)
+    app.register_blueprint(admin)
 
-    if not scheduler.running:
-        # Log attempt to start the scheduler
-        logger.info("Attempting to start the scheduler.")
-        scheduler.add_job(func=delete_old_pending_users, trigger="interval", minutes=1)
-        scheduler.start()
-        logger.info("Scheduler started for deleting old pending users.")
-    else:
-        logger.info("Scheduler is already running.")
+    from flaskblog.conditional import cache_uploads_forever
 
-    return app
+    app.after_request(cache_uploads_forever)
 
+    from flaskblog import instrumentation
 
-app = create_app()
+    instrumentation.init_app(app)
+
+    from flaskblog import jobs
+
+    jobs.init_app(app)
+
+    return app
@@ -0,0 +1,135 @@
+from datetime import datetime
+from flask import abort, request
+from flask_login import current_user
+from sqlalchemy import or_, tuple_
+from flaskblog.bookings.utils import ROLES, counters
+from flaskblog.models import Event
+from flaskblog.pagination import decode_cursor
+
+# Date range queries over open events: events with a place left that the
+# caller's role could take right now, by the same rules as take_place. One
+# range scan over ix_event_calendar answers them; capacity and ratio are
+# checked on the index entries, only the open events' rows are read.
+
+# columns the JSON API and the iCalendar feed need
+CALENDAR_COLUMNS = (
+    Event.id,
+    Event.title,
+    Event.description,
+    Event.location,
+    Event.starts_at,
+    Event.created_at,
+    Event.capacity,
+    Event.leaders,
+    Event.followers,
+)
+
+
+def room_for(role):
+    mine, other = counters(role)
+    return mine + 1 - other <= Event.max_imbalance
+
+
+def open_events(start, end=None, role=None):
+    # role is "Leader", "Follower", "Both" (either will do) or None (any place)
+    query = Event.query.filter(
+        Event.starts_at >= start, Event.leaders + Event.followers < Event.capacity
+    )
+    if end is not None:
+        query = query.filter(Event.starts_at < end)
+    if role in ROLES:
+        query = query.filter(room_for(role))
+    elif role == "Both":
+        query = query.filter(or_(*(room_for(each) for each in ROLES)))
+    return query.with_entities(*CALENDAR_COLUMNS).order_by(Event.starts_at, Event.id)
+
+
+def after_cursor(query, token):
+    # keyset continuation in (starts_at, id) order
+    return query.filter(
+        tuple_(Event.starts_at, Event.id) > tuple_(*decode_cursor(token))
+    )
+
+
+def parse_moment(name, default=None):
+    value = request.args.get(name)
+    if not value:
+        return default
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        abort(400)
+
+
+def range_from_request():
+    # ?from=&to= as ISO dates or datetimes in UTC, ?role= overrides the
+    # signed-in user's profile role
+    start = parse_moment("from", datetime.utcnow())
+    end = parse_moment("to")
+    role = request.args.get("role")
+    if role is None and current_user.is_authenticated:
+        role = current_user.role
+    if role not in (None, "Both") + ROLES:
+        abort(400)
+    return start, end, role
+
+
+def ical_text(value):
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+    )
+
+
+def ical_line(name, value):
+    # content lines are folded at 75 octets, continuation lines start with a space
+    line = f"{name}:{value}".encode()
+    chunks = []
+    limit = 75
+    while len(line) > limit:
+        cut = limit
+        # never split a UTF-8 sequence, back off its continuation bytes
+        while line[cut] & 0xC0 == 0x80:
+            cut -= 1
+        chunks.append(line[:cut])
+        line = line[cut:]
+        limit = 74
+    chunks.append(line)
+    return b"\r\n ".join(chunks).decode() + "\r\n"
+
+
+def ical_moment(moment):
+    # starts_at and created_at are stored in UTC
+    return moment.strftime("%Y%m%dT%H%M%SZ")
+
+
+def ical_feed(rows, host, event_url):
+    # Yields the feed piece by piece, one event at a time, so an export of any
+    # size is never built in memory. rows come from open_events().
+    yield (
+        "BEGIN:VCALENDAR\r\n"
+        "VERSION:2.0\r\n"
+        "PRODID:-//Tango Bookings//Events//EN\r\n"
+        "CALSCALE:GREGORIAN\r\n"
+    )
+    for row in rows:
+        yield (
+            "BEGIN:VEVENT\r\n"
+            + ical_line("UID", f"event-{row.id}@{host}")
+            + ical_line("DTSTAMP", ical_moment(row.created_at or row.starts_at))
+            + ical_line("DTSTART", ical_moment(row.starts_at))
+            + ical_line("SUMMARY", ical_text(row.title))
+            + ical_line("LOCATION", ical_text(row.location))
+            + (
+                ical_line("DESCRIPTION", ical_text(row.description))
+                if row.description
+                else ""
+            )
+            + ical_line("URL", event_url(row.id))
+            + "END:VEVENT\r\n"
+        )
+    yield "END:VCALENDAR\r\n"
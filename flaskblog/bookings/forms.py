@@ -0,0 +1,34 @@
+from flask_wtf import FlaskForm
+from wtforms import (
+    DateTimeLocalField,
+    IntegerField,
+    RadioField,
+    StringField,
+    SubmitField,
+    TextAreaField,
+)
+from wtforms.validators import DataRequired, Length, NumberRange, Optional
+
+
+class EventForm(FlaskForm):
+    title = StringField("Title", validators=[DataRequired(), Length(max=100)])
+    description = TextAreaField("Description", validators=[Optional()])
+    location = StringField("Location", validators=[DataRequired(), Length(max=120)])
+    starts_at = DateTimeLocalField(
+        "Starts at", format="%Y-%m-%dT%H:%M", validators=[DataRequired()]
+    )
+    capacity = IntegerField(
+        "Places", validators=[DataRequired(), NumberRange(min=1, max=10000)]
+    )
+    max_imbalance = IntegerField(
+        "Most leaders may outnumber followers by (or the other way round)",
+        default=2,
+        validators=[DataRequired(), NumberRange(min=1)],
+    )
+    submit = SubmitField("Create Event")
+
+
+class BookingForm(FlaskForm):
+    # choices are set per user, see roles_for
+    role = RadioField("Dancing as", validators=[DataRequired()])
+    submit = SubmitField("Book")
@@ -0,0 +1,151 @@
+import math
+from collections import deque, namedtuple
+from flaskblog import db
+from flaskblog.models import Booking, User
+
+# Partner rotations for class practice. Each round pairs leaders with
+# followers, "Both" dancers filling whichever side is short, and nobody dances
+# with the same partner twice while a fresh partner is available.
+#
+# A round is a maximum bipartite matching (Hopcroft-Karp) between the two
+# sides, over the pairs that have not danced together yet. The matching is
+# seeded with a circle rotation, which is already complete when nobody
+# switches sides, so most rounds cost O(n) and the O(E sqrt(V)) search only
+# repairs the clashes.
+
+Round = namedtuple("Round", "pairs sitting_out")
+
+NO_MATCH = -1
+
+
+def event_attendees(event):
+    # (username, profile role) of everyone booked, in booking order
+    return (
+        db.session.query(User.username, User.role)
+        .join(Booking, Booking.user_id == User.id)
+        .filter(Booking.event_id == event.id)
+        .order_by(Booking.id)
+        .all()
+    )
+
+
+def split_sides(attendees, round_number):
+    # "Both" dancers even out the sides, a different few of them lead each round
+    leads = [key for key, role in attendees if role == "Leader"]
+    follows = [key for key, role in attendees if role == "Follower"]
+    both = [key for key, role in attendees if role == "Both"]
+    leading = min(max(len(attendees) // 2 - len(leads), 0), len(both))
+    if both:
+        start = round_number * leading % len(both)
+        both = both[start:] + both[:start]
+    return leads + both[:leading], follows + both[leading:]
+
+
+def max_matching(size_left, size_right, neighbours, match_left):
+    # Hopcroft-Karp, starting from the partial matching in match_left. Each
+    # phase finds a maximal set of shortest augmenting paths with one BFS and
+    # DFS; there are at most O(sqrt(V)) phases.
+    match_right = [NO_MATCH] * size_right
+    for u, v in enumerate(match_left):
+        if v != NO_MATCH:
+            match_right[v] = u
+    unreached = size_left + 1
+
+    def bfs():
+        distance[:] = [unreached] * size_left
+        queue = deque()
+        for u in range(size_left):
+            if match_left[u] == NO_MATCH:
+                distance[u] = 0
+                queue.append(u)
+        found = False
+        while queue:
+            u = queue.popleft()
+            for v in neighbours(u):
+                w = match_right[v]
+                if w == NO_MATCH:
+                    found = True
+                elif distance[w] == unreached:
+                    distance[w] = distance[u] + 1
+                    queue.append(w)
+        return found
+
+    def dfs(u):
+        for v in neighbours(u):
+            w = match_right[v]
+            if w == NO_MATCH or (distance[w] == distance[u] + 1 and dfs(w)):
+                match_left[u] = v
+                match_right[v] = u
+                return True
+        distance[u] = unreached
+        return False
+
+    distance = [unreached] * size_left
+    while bfs():
+        for u in range(size_left):
+            if match_left[u] == NO_MATCH:
+                dfs(u)
+    return match_left
+
+
+def pair_round(leads, follows, round_number, partners):
+    # Matches the smaller side into the larger one; partners maps a dancer to
+    # the set of everyone they have danced with. Returns (lead, follow) pairs.
+    flipped = len(leads) > len(follows)
+    left, right = (follows, leads) if flipped else (leads, follows)
+    if not left:
+        return []
+    size_left, size_right = len(left), len(right)
+    # The seeds pair the left side with a window of the right one. The window
+    # moves on by size_left each round, so everyone on the larger side takes
+    # their turn sitting out, and once it comes back round the partners within
+    # it shift by one. With equal sides this is leader i with follower i + round.
+    window = round_number * size_left % size_right
+    shift = round_number // (size_right // math.gcd(size_left, size_right))
+    seeds = [(window + (u + shift) % size_left) % size_right for u in range(size_left)]
+    fresh = {}
+
+    def fresh_neighbours(u):
+        # right side in rotation order from u's seed partner, minus old partners
+        if u not in fresh:
+            danced = partners.get(left[u], ())
+            fresh[u] = [
+                v % size_right
+                for v in range(seeds[u], seeds[u] + size_right)
+                if right[v % size_right] not in danced
+            ]
+        return fresh[u]
+
+    match_left = [
+        NO_MATCH if right[seed] in partners.get(left[u], ()) else seed
+        for u, seed in enumerate(seeds)
+    ]
+    match_left = max_matching(size_left, size_right, fresh_neighbours, match_left)
+
+    if NO_MATCH in match_left:
+        # out of fresh partners for someone: dancing again beats sitting out
+        everyone = list(range(size_right))
+        match_left = max_matching(size_left, size_right, lambda u: everyone, match_left)
+
+    pairs = []
+    for u, v in enumerate(match_left):
+        if v != NO_MATCH:
+            pair = (right[v], left[u]) if flipped else (left[u], right[v])
+            pairs.append(pair)
+    return pairs
+
+
+def rotation(attendees, rounds):
+    # attendees are (key, role) pairs, keys are any unique hashable name
+    partners = {}
+    schedule = []
+    for round_number in range(rounds):
+        leads, follows = split_sides(attendees, round_number)
+        pairs = pair_round(leads, follows, round_number, partners)
+        for lead, follow in pairs:
+            partners.setdefault(lead, set()).add(follow)
+            partners.setdefault(follow, set()).add(lead)
+        dancing = {key for pair in pairs for key in pair}
+        sitting_out = [key for key, _ in attendees if key not in dancing]
+        schedule.append(Round(pairs, sitting_out))
+    return schedule
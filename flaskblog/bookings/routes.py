@@ -0,0 +1,247 @@
+from datetime import datetime
+from flask import (
+    render_template,
+    url_for,
+    flash,
+    redirect,
+    request,
+    abort,
+    jsonify,
+    Response,
+    stream_with_context,
+    Blueprint,
+)
+from flask_login import current_user, login_required
+from flaskblog import db
+from flaskblog.bookings.calendar import (
+    after_cursor,
+    ical_feed,
+    open_events,
+    range_from_request,
+)
+from flaskblog.bookings.forms import BookingForm, EventForm
+from flaskblog.bookings.pairing import event_attendees, rotation
+from flaskblog.bookings.utils import (
+    BookingRefused,
+    book,
+    cancel,
+    find_booking,
+    find_waitlist_entry,
+    join_waitlist,
+    leave_waitlist,
+    roles_for,
+    waitlist_position,
+)
+from flaskblog.models import Event
+from flaskblog.pagination import encode_key
+
+
+bookings = Blueprint("bookings", __name__, template_folder="templates")
+
+EVENTS_PER_PAGE = 20
+EVENTS_PER_RESPONSE = 200
+MAX_ROUNDS = 50
+
+
+def booking_form(event):
+    form = BookingForm()
+    roles = roles_for(current_user)
+    form.role.choices = [(role, role) for role in roles]
+    if form.role.data is None:
+        # suggest the role the event is short of
+        form.role.data = min(
+            roles,
+            key=lambda role: event.leaders if role == "Leader" else event.followers,
+        )
+    return form
+
+
+@bookings.route("/events")
+def events():
+    page = request.args.get("page", 1, type=int)
+    # one row more than shown tells whether there is a next page
+    upcoming = (
+        Event.query.filter(Event.starts_at >= datetime.utcnow())
+        .order_by(Event.starts_at, Event.id)
+        .offset((page - 1) * EVENTS_PER_PAGE)
+        .limit(EVENTS_PER_PAGE + 1)
+        .all()
+    )
+    return render_template(
+        "bookings/events.html",
+        title="Events",
+        events=upcoming[:EVENTS_PER_PAGE],
+        page=page,
+        has_next=len(upcoming) > EVENTS_PER_PAGE,
+    )
+
+
+@bookings.route("/events.json")
+def events_json():
+    # open events in a date range, see flaskblog.bookings.calendar
+    start, end, role = range_from_request()
+    query = open_events(start, end, role)
+    if request.args.get("after"):
+        query = after_cursor(query, request.args["after"])
+    rows = query.limit(EVENTS_PER_RESPONSE + 1).all()
+    more = len(rows) > EVENTS_PER_RESPONSE
+    rows = rows[:EVENTS_PER_RESPONSE]
+    next_url = None
+    if more:
+        args = {**request.args, "after": encode_key(rows[-1].starts_at, rows[-1].id)}
+        next_url = url_for("bookings.events_json", **args, _external=True)
+    return jsonify(
+        events=[
+            {
+                "id": row.id,
+                "title": row.title,
+                "starts_at": row.starts_at.isoformat(),
+                "location": row.location,
+                "leaders": row.leaders,
+                "followers": row.followers,
+                "places_left": row.capacity - row.leaders - row.followers,
+                "url": url_for("bookings.event", event_id=row.id, _external=True),
+            }
+            for row in rows
+        ],
+        next=next_url,
+    )
+
+
+@bookings.route("/events.ics")
+def events_ics():
+    # the same events as an iCalendar feed, streamed as it is read
+    start, end, role = range_from_request()
+    rows = open_events(start, end, role).yield_per(500)
+
+    def event_url(event_id):
+        return url_for("bookings.event", event_id=event_id, _external=True)
+
+    return Response(
+        stream_with_context(ical_feed(rows, request.host, event_url)),
+        mimetype="text/calendar",
+        headers={"Content-Disposition": "inline; filename=events.ics"},
+    )
+
+
+@bookings.route("/event/new", methods=["GET", "POST"])
+@login_required
+def new_event():
+    form = EventForm()
+    if form.validate_on_submit():
+        event = Event(
+            title=form.title.data,
+            description=form.description.data or "",
+            location=form.location.data,
+            starts_at=form.starts_at.data,
+            capacity=form.capacity.data,
+            max_imbalance=form.max_imbalance.data,
+            organizer=current_user,
+        )
+        db.session.add(event)
+        db.session.commit()
+        flash("Your event has been created.", "success")
+        return redirect(url_for("bookings.event", event_id=event.id))
+    return render_template(
+        "bookings/create_event.html", title="New Event", form=form, legend="New Event"
+    )
+
+
+@bookings.route("/event/<int:event_id>")
+def event(event_id):
+    event = Event.query.get_or_404(event_id)
+    booking = entry = position = form = None
+    if current_user.is_authenticated:
+        booking = find_booking(event, current_user)
+        if booking is None:
+            form = booking_form(event)
+            entry = find_waitlist_entry(event, current_user)
+            if entry is not None:
+                position = waitlist_position(entry)
+    return render_template(
+        "bookings/event.html",
+        title=event.title,
+        event=event,
+        booking=booking,
+        entry=entry,
+        position=position,
+        form=form,
+    )
+
+
+@bookings.route("/event/<int:event_id>/book", methods=["POST"])
+@login_required
+def book_event(event_id):
+    event = Event.query.get_or_404(event_id)
+    form = booking_form(event)
+    if form.validate_on_submit():
+        try:
+            booking = book(event, current_user, form.role.data)
+        except BookingRefused as refusal:
+            flash(str(refusal), "danger")
+        else:
+            flash(f"You are booked as {booking.role}.", "success")
+    else:
+        flash("Please choose the role you are dancing.", "danger")
+    return redirect(url_for("bookings.event", event_id=event_id))
+
+
+@bookings.route("/event/<int:event_id>/cancel", methods=["POST"])
+@login_required
+def cancel_booking(event_id):
+    event = Event.query.get_or_404(event_id)
+    try:
+        cancel(event, current_user)
+    except BookingRefused as refusal:
+        flash(str(refusal), "danger")
+    else:
+        flash("Your booking has been cancelled.", "success")
+    return redirect(url_for("bookings.event", event_id=event_id))
+
+
+@bookings.route("/event/<int:event_id>/waitlist", methods=["POST"])
+@login_required
+def join_event_waitlist(event_id):
+    event = Event.query.get_or_404(event_id)
+    form = booking_form(event)
+    if form.validate_on_submit():
+        try:
+            join_waitlist(event, current_user, form.role.data)
+        except BookingRefused as refusal:
+            flash(str(refusal), "danger")
+        else:
+            flash(
+                "You are on the waitlist, we will email you when a place comes free.",
+                "success",
+            )
+    else:
+        flash("Please choose the role you are dancing.", "danger")
+    return redirect(url_for("bookings.event", event_id=event_id))
+
+
+@bookings.route("/event/<int:event_id>/waitlist/leave", methods=["POST"])
+@login_required
+def leave_event_waitlist(event_id):
+    event = Event.query.get_or_404(event_id)
+    try:
+        leave_waitlist(event, current_user)
+    except BookingRefused as refusal:
+        flash(str(refusal), "danger")
+    else:
+        flash("You have left the waitlist.", "success")
+    return redirect(url_for("bookings.event", event_id=event_id))
+
+
+@bookings.route("/event/<int:event_id>/pairings")
+@login_required
+def pairings(event_id):
+    event = Event.query.get_or_404(event_id)
+    if event.organizer != current_user:
+        abort(403)
+    rounds = min(max(request.args.get("rounds", 5, type=int), 1), MAX_ROUNDS)
+    return render_template(
+        "bookings/pairings.html",
+        title="Pairings",
+        event=event,
+        rounds=rotation(event_attendees(event), rounds),
+    )
@@ -0,0 +1,240 @@
+from datetime import datetime
+from sqlalchemy import and_, exists, update
+from sqlalchemy.exc import IntegrityError
+from flaskblog import db
+from flaskblog.models import Booking, Event, WaitlistEntry
+from flaskblog.users.utils import send_waitlist_promotion_email
+
+# The roles danced at an event. A user whose profile role is "Both" picks one
+# per booking.
+ROLES = ("Leader", "Follower")
+
+
+class BookingRefused(Exception):
+    # the message is shown to the user as is
+    pass
+
+
+def roles_for(user):
+    return ROLES if user.role == "Both" else (user.role,)
+
+
+def counters(role):
+    # the role's own counter and the other role's
+    if role == "Leader":
+        return Event.leaders, Event.followers
+    return Event.followers, Event.leaders
+
+
+# Places are taken and released with a single conditional UPDATE on the event
+# row. The WHERE clause re-checks capacity and balance against the row as the
+# database locks it, so two workers racing for the last place cannot both get
+# it: one UPDATE matches, the other matches no row. Booking rows are never
+# counted.
+def place_free(role):
+    # the condition for one more dancer in role, capacity and balance
+    mine, other = counters(role)
+    return and_(
+        Event.leaders + Event.followers < Event.capacity,
+        mine + 1 - other <= Event.max_imbalance,
+    )
+
+
+def take_place(event_id, role):
+    mine, _ = counters(role)
+    result = db.session.execute(
+        update(Event)
+        .where(Event.id == event_id, place_free(role))
+        .values({mine: mine + 1})
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def release_place(event_id, role):
+    mine, _ = counters(role)
+    db.session.execute(
+        update(Event)
+        .where(Event.id == event_id, mine > 0)
+        .values({mine: mine - 1})
+        .execution_options(synchronize_session=False)
+    )
+
+
+def refusal_reason(event, role):
+    # only used to explain a failed UPDATE, so it may read a stale row
+    db.session.refresh(event)
+    if event.booked >= event.capacity:
+        return "Sorry, this event is full."
+    plural = "leaders" if role == "Leader" else "followers"
+    return (
+        f"There are enough {plural} for now to keep the dance floor balanced, "
+        "please try again later."
+    )
+
+
+def find_booking(event, user):
+    return Booking.query.filter_by(event_id=event.id, user_id=user.id).first()
+
+
+def check_can_sign_up(event, user, role):
+    # the checks shared by booking and joining the waitlist
+    if role not in roles_for(user):
+        raise BookingRefused(f"You are registered as {user.role}.")
+    if event.starts_at <= datetime.utcnow():
+        raise BookingRefused("This event has already started.")
+    if find_booking(event, user) is not None:
+        raise BookingRefused("You have already booked this event.")
+
+
+def book(event, user, role):
+    check_can_sign_up(event, user, role)
+    # a place freed by a cancellation belongs to the waitlist, not to whoever
+    # asks first; the promotion job hands it out
+    entry = find_waitlist_entry(event, user)
+    if waiting_ahead(event.id, role, entry):
+        raise BookingRefused(
+            f"Others are already waiting for a place as {role}, "
+            "please join the waitlist."
+        )
+    # Once full, most sign-ups are refused on the row as read, without taking
+    # the write lock. The UPDATE alone decides the ones that get through.
+    if event.booked >= event.capacity:
+        raise BookingRefused("Sorry, this event is full.")
+    if not take_place(event.id, role):
+        db.session.rollback()
+        raise BookingRefused(refusal_reason(event, role))
+    booking = Booking(event_id=event.id, user_id=user.id, role=role)
+    db.session.add(booking)
+    if entry is not None:
+        db.session.delete(entry)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # a second request by the same user got in first; the rollback also
+        # gives the place back
+        db.session.rollback()
+        raise BookingRefused("You have already booked this event.")
+    return booking
+
+
+def cancel(event, user):
+    booking = find_booking(event, user)
+    if booking is None:
+        raise BookingRefused("You have not booked this event.")
+    # the DELETE decides who releases the place when two cancels race
+    deleted = db.session.execute(
+        Booking.__table__.delete().where(Booking.id == booking.id)
+    ).rowcount
+    if deleted:
+        release_place(event.id, booking.role)
+    db.session.commit()
+    return booking
+
+
+# Waitlists are first come first served per role. When places come free the
+# promotion job (flaskblog.jobs) moves people up, never the cancelling request.
+def find_waitlist_entry(event, user):
+    return WaitlistEntry.query.filter_by(event_id=event.id, user_id=user.id).first()
+
+
+def waitlist_head(event_id, role):
+    # one seek on ix_waitlist_event_role_id, however long the queue is
+    return (
+        WaitlistEntry.query.filter_by(event_id=event_id, role=role)
+        .order_by(WaitlistEntry.id)
+        .first()
+    )
+
+
+def waiting_ahead(event_id, role, entry=None):
+    # whether anyone queues for the role before entry (or at all, without one)
+    query = WaitlistEntry.query.filter_by(event_id=event_id, role=role)
+    if entry is not None:
+        query = query.filter(WaitlistEntry.id < entry.id)
+    return query.first() is not None
+
+
+def has_free_place(event_id, role):
+    return (
+        db.session.query(Event.id)
+        .filter(Event.id == event_id, place_free(role))
+        .first()
+        is not None
+    )
+
+
+def waitlist_position(entry):
+    return WaitlistEntry.query.filter(
+        WaitlistEntry.event_id == entry.event_id,
+        WaitlistEntry.role == entry.role,
+        WaitlistEntry.id <= entry.id,
+    ).count()
+
+
+def join_waitlist(event, user, role):
+    check_can_sign_up(event, user, role)
+    if find_waitlist_entry(event, user) is not None:
+        raise BookingRefused("You are already on the waitlist.")
+    # only for a place book() would refuse: with a free place and nobody
+    # waiting, an entry would hold up every direct booking for the role until
+    # the next promotion run
+    if not waiting_ahead(event.id, role) and has_free_place(event.id, role):
+        raise BookingRefused(f"There is a place for you as {role}, please book it.")
+    entry = WaitlistEntry(event_id=event.id, user_id=user.id, role=role)
+    db.session.add(entry)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        raise BookingRefused("You are already on the waitlist.")
+    return entry
+
+
+def leave_waitlist(event, user):
+    entry = find_waitlist_entry(event, user)
+    if entry is None:
+        raise BookingRefused("You are not on the waitlist.")
+    db.session.delete(entry)
+    db.session.commit()
+
+
+def events_to_promote():
+    # upcoming events with a free place and somebody waiting for one
+    return Event.query.filter(
+        Event.starts_at > datetime.utcnow(),
+        Event.leaders + Event.followers < Event.capacity,
+        exists().where(WaitlistEntry.event_id == Event.id),
+    ).all()
+
+
+def promote(event):
+    # Fills free places from the heads of the role queues, the earlier entry
+    # first, until neither head fits. A head the ratio keeps out stays first
+    # in its queue. Each promotion commits with its notification email in the
+    # outbox. Returns the new bookings.
+    promoted = []
+    while True:
+        heads = [waitlist_head(event.id, role) for role in ROLES]
+        heads = sorted((entry for entry in heads if entry), key=lambda e: e.id)
+        for entry in heads:
+            if take_place(event.id, entry.role):
+                break
+        else:
+            db.session.rollback()
+            return promoted
+        entry_id, user, role = entry.id, entry.user, entry.role
+        booking = Booking(event_id=event.id, user_id=user.id, role=role)
+        db.session.add(booking)
+        db.session.delete(entry)
+        try:
+            db.session.flush()
+        except IntegrityError:
+            # booked in the meantime: give the place back and drop the entry
+            db.session.rollback()
+            WaitlistEntry.query.filter_by(id=entry_id).delete()
+            db.session.commit()
+            continue
+        # enqueue commits the promotion and the email together
+        send_waitlist_promotion_email(user, event, role)
+        promoted.append(booking)
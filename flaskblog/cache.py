@@ -0,0 +1,252 @@
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, g, render_template
+from markupsafe import Markup
+
+
+class LRUCache:
+    # In-process cache. Entries expire after ttl seconds and the least recently
+    # used entries are evicted once there are more than max_entries of them or,
+    # when max_bytes is set, once the stored values (sized with len()) add up
+    # to more than max_bytes. Thread safe.
+    def __init__(self, max_entries=1024, ttl=300, max_bytes=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at, _ = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        size = len(value) if self.max_bytes is not None else 0
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (value, expires_at, size)
+            self.size += size
+            while len(self._entries) > self.max_entries or (
+                self.max_bytes is not None and self.size > self.max_bytes
+            ):
+                self._remove(next(iter(self._entries)))
+
+    def delete(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DictBackend:
+    # Local stand-in for a shared cache server (Redis, memcached) with the same
+    # get/set/delete surface. One instance shared between apps behaves like one
+    # server shared between worker processes. Values must be picklable for a real
+    # shared backend.
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value, expires_at = self._data.get(key, (None, None))
+            if expires_at is not None and expires_at < time.time():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (value, None if ttl is None else time.time() + ttl)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class IdentityCache:
+    # Caches the logged in user's columns so load_user does not hit the database
+    # on every request. Flask-Login already memoizes current_user for the length
+    # of one request, this covers the requests in between.
+    #
+    # By default the cache lives in each process (USER_CACHE_SIZE entries,
+    # USER_CACHE_TTL seconds). Setting USER_CACHE_BACKEND to a shared backend
+    # makes invalidations visible to every worker process.
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions["identity_cache"] = {}
+
+    @property
+    def backend(self):
+        state = current_app.extensions["identity_cache"]
+        config = current_app.config
+        if config["USER_CACHE_BACKEND"] is not None:
+            return config["USER_CACHE_BACKEND"]
+        if "local" not in state:
+            state["local"] = LRUCache(
+                config["USER_CACHE_SIZE"], config["USER_CACHE_TTL"]
+            )
+        return state["local"]
+
+    def load(self, user_id):
+        from sqlalchemy.orm import make_transient_to_detached
+        from flaskblog import db
+        from flaskblog.models import User
+
+        key = f"user:{user_id}"
+        data = self.backend.get(key)
+        if data is None:
+            user = db.session.get(User, user_id)
+            if user is not None:
+                self.backend.set(
+                    key,
+                    {column: getattr(user, column) for column in CACHED_USER_COLUMNS},
+                    ttl=current_app.config["USER_CACHE_TTL"],
+                )
+            return user
+        # rebuild the row as if it had just been loaded, then attach it to the
+        # session without a SELECT; columns that are not cached load on access
+        user = User(**data)
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
+
+    def invalidate(self, user_id):
+        self.backend.delete(f"user:{user_id}")
+
+
+class FragmentCache:
+    # Cache for rendered HTML fragments: whole feed pages and single post cards.
+    # Every key includes the feed version, a counter that the post
+    # create/update/delete handlers increment through bump(), so one write
+    # retires every cached fragment at once and the old entries age out of the
+    # LRU. The version is also part of the feed pages' ETags.
+    #
+    # Fragments are kept per process in an LRU capped at FEED_CACHE_MAX_BYTES,
+    # or in FEED_CACHE_BACKEND when one is configured. The version is a row in
+    # the cache_version table, read once per request, so every worker and
+    # every restart agrees on it, and ETags built from it stay valid.
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions["fragment_cache"] = {}
+        app.add_template_global(self.post_card, "post_card")
+
+    @property
+    def enabled(self):
+        return current_app.config["FEED_CACHE_ENABLED"]
+
+    @property
+    def backend(self):
+        state = current_app.extensions["fragment_cache"]
+        config = current_app.config
+        if config["FEED_CACHE_BACKEND"] is not None:
+            return config["FEED_CACHE_BACKEND"]
+        if "local" not in state:
+            state["local"] = LRUCache(
+                max_entries=config["FEED_CACHE_MAX_ENTRIES"],
+                ttl=config["FEED_CACHE_TTL"],
+                max_bytes=config["FEED_CACHE_MAX_BYTES"],
+            )
+        return state["local"]
+
+    @property
+    def version(self):
+        # read once per request
+        if "feed_version" not in g:
+            g.feed_version = stored_version("feed")
+        return g.feed_version
+
+    def bump(self):
+        g.feed_version = bump_stored_version("feed")
+        return g.feed_version
+
+    def cached(self, name, render):
+        # return the fragment stored under name for the current feed version,
+        # calling render() to build and store it on a miss
+        if not self.enabled:
+            return Markup(render())
+        key = f"{name}:{self.version}"
+        html = self.backend.get(key)
+        if html is None:
+            html = render()
+            self.backend.set(key, html, ttl=current_app.config["FEED_CACHE_TTL"])
+        return Markup(html)
+
+    def post_card(self, post):
+        return self.cached(
+            f"card:{post.id}",
+            lambda: render_template("post_card.html", post=post),
+        )
+
+
+def stored_version(name):
+    from flaskblog import db
+    from flaskblog.models import CacheVersion
+
+    version = db.session.query(CacheVersion.version).filter_by(name=name).scalar()
+    return version or 0
+
+
+def bump_stored_version(name):
+    # Increments the counter in its own transaction and returns the new value.
+    # The UPDATE never loses a concurrent bump; the first bump inserts the row
+    # instead, and the primary key settles a race between two of them.
+    from sqlalchemy.exc import IntegrityError
+    from flaskblog import db
+    from flaskblog.models import CacheVersion
+
+    updated = CacheVersion.query.filter_by(name=name).update(
+        {CacheVersion.version: CacheVersion.version + 1}, synchronize_session=False
+    )
+    if not updated:
+        db.session.add(CacheVersion(name=name, version=1))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return bump_stored_version(name)
+        return 1
+    version = stored_version(name)
+    db.session.commit()
+    return version
+
+
+# everything the layout and account pages read, the password hash stays out
+CACHED_USER_COLUMNS = (
+    "id",
+    "username",
+    "email",
+    "email_verified",
+    "first_name",
+    "last_name",
+    "role",
+    "image_file",
+    "created_at",
+)
@@ -0,0 +1,170 @@
+import click
+from flask import current_app
+from flask.cli import AppGroup, ScriptInfo
+
+
+class MigrateCommands(click.Group):
+    # "flask db": Flask-Migrate pulls in all of Alembic, so it is only set up
+    # when one of its commands is actually used
+    def _commands(self, ctx):
+        from flask_migrate import Migrate
+        from flask_migrate.cli import db as db_cli_group
+        from flaskblog import db
+
+        app = ctx.ensure_object(ScriptInfo).load_app()
+        if "migrate" not in app.extensions:
+            Migrate(app, db)
+        return db_cli_group
+
+    def list_commands(self, ctx):
+        return self._commands(ctx).list_commands(ctx)
+
+    def get_command(self, ctx, name):
+        return self._commands(ctx).get_command(ctx, name)
+
+
+jobs_cli = AppGroup("jobs", help="Run and inspect the scheduled jobs.")
+
+
+@jobs_cli.command("run")
+def run_jobs():
+    """Run the scheduled jobs in this process until interrupted."""
+    from flaskblog.jobs import start_scheduler
+
+    start_scheduler(current_app._get_current_object(), blocking=True)
+
+
+@jobs_cli.command("status")
+def jobs_status():
+    """Show who leads each job and how long its last run took."""
+    from flaskblog.jobs import JOBS
+    from flaskblog.models import JobLease
+
+    leases = {lease.name: lease for lease in JobLease.query.all()}
+    for name in JOBS:
+        lease = leases.get(name)
+        if lease is None:
+            click.echo(f"{name}: never ran")
+            continue
+        click.echo(
+            f"{name}: held by {lease.holder} until {lease.expires_at:%Y-%m-%d %H:%M:%S}, "
+            f"{lease.runs} runs, last took {lease.last_duration or 0:.3f}s"
+            + (f", failed with {lease.last_error}" if lease.last_error else "")
+        )
+
+
+search_cli = AppGroup("search", help="Maintain the post search index.")
+
+
+@search_cli.command("rebuild")
+def rebuild_search_index():
+    """Re-index every post, e.g. after a bulk import."""
+    from flaskblog.search import rebuild_index
+
+    rebuild_index()
+    click.echo("Search index rebuilt.")
+
+
+users_cli = AppGroup("users", help="Maintain user accounts.")
+
+
+@users_cli.command("recount-posts")
+def recount_user_posts():
+    """Recompute every user's post count and last post date."""
+    from flaskblog.posts.utils import recount_posts
+
+    recount_posts()
+    click.echo("Post counters recomputed.")
+
+
+def set_admin(email, is_admin):
+    from flaskblog import db
+    from flaskblog.models import User
+
+    user = User.query.filter_by(email=email).first()
+    if user is None:
+        raise click.ClickException(f"There is no user with email {email}.")
+    user.is_admin = is_admin
+    db.session.commit()
+    return user
+
+
+@users_cli.command("grant-admin")
+@click.argument("email")
+def grant_admin(email):
+    """Let a user download the exports once their email is verified."""
+    user = set_admin(email, True)
+    click.echo(f"{user.username} is now an admin.")
+    if not user.email_verified:
+        click.echo(f"This applies once {email} has been verified.")
+
+
+@users_cli.command("revoke-admin")
+@click.argument("email")
+def revoke_admin(email):
+    """Take a user's admin rights away."""
+    user = set_admin(email, False)
+    click.echo(f"{user.username} is no longer an admin.")
+
+
+events_cli = AppGroup("events", help="Organise events.")
+
+
+@events_cli.command("pairings")
+@click.argument("event_id", type=int)
+@click.option("--rounds", default=5, show_default=True, help="Rounds to rotate.")
+def event_pairings(event_id, rounds):
+    """Print partner rotations for an event's attendees."""
+    from flaskblog import db
+    from flaskblog.bookings.pairing import event_attendees, rotation
+    from flaskblog.models import Event
+
+    event = db.session.get(Event, event_id)
+    if event is None:
+        raise click.ClickException(f"There is no event {event_id}.")
+    schedule = rotation(event_attendees(event), rounds)
+    for number, (pairs, sitting_out) in enumerate(schedule, 1):
+        click.echo(f"Round {number}:")
+        for lead, follow in pairs:
+            click.echo(f"  {lead} leads {follow}")
+        if sitting_out:
+            click.echo(f"  sitting out: {', '.join(sitting_out)}")
+
+
+export_cli = AppGroup("export", help="Export whole tables.")
+
+
+def export_command(table):
+    @export_cli.command(table, help=f"Write all {table} as CSV or NDJSON.")
+    @click.option(
+        "--format",
+        "format_",
+        type=click.Choice(["csv", "ndjson"]),
+        default="csv",
+        show_default=True,
+    )
+    @click.option(
+        "--output",
+        "-o",
+        type=click.File("w", encoding="utf-8"),
+        default="-",
+        help="File to write, standard output by default.",
+    )
+    def export_table(format_, output):
+        from flaskblog.export import export_chunks
+
+        for chunk in export_chunks(table, format_):
+            output.write(chunk)
+
+
+for table in ("posts", "users", "bookings"):
+    export_command(table)
+
+
+def init_app(app):
+    app.cli.add_command(MigrateCommands("db", help="Perform database migrations."))
+    app.cli.add_command(jobs_cli)
+    app.cli.add_command(search_cli)
+    app.cli.add_command(users_cli)
+    app.cli.add_command(events_cli)
+    app.cli.add_command(export_cli)
@@ -0,0 +1,58 @@
+import hashlib
+import time
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+
+# uploaded avatars are named after their content, so they never change
+UPLOAD_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def conditional_response(render, validators, last_modified=None):
+    # Build the ETag from validators (plus who is looking, since the navbar
+    # differs per user) and answer 304 Not Modified when the browser's
+    # If-None-Match / If-Modified-Since still match, without calling render().
+    # Browsers revalidate every time (no-cache), so a change shows immediately.
+    parts = [str(part) for part in validators]
+    parts.append(current_user.get_id() or "anonymous")
+    etag = hashlib.sha1("|".join(parts).encode()).hexdigest()
+
+    # flashed messages are shown once, a 304 would swallow them
+    fresh = "_flashes" not in session and not request_is_modified(etag, last_modified)
+    if fresh:
+        response = current_app.response_class(status=304)
+    else:
+        response = make_response(render())
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    response.vary.add("Cookie")
+    return response
+
+
+def request_is_modified(etag, last_modified):
+    if request.if_none_match:
+        # If-None-Match wins over If-Modified-Since when both are sent
+        return not request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified is not None:
+        return last_modified.replace(microsecond=0) > request.if_modified_since.replace(
+            tzinfo=None
+        )
+    return True
+
+
+def cache_uploads_forever(response):
+    # after_request hook: long lived, immutable caching for uploaded avatars
+    filename = (request.view_args or {}).get("filename", "")
+    if (
+        request.endpoint == "static"
+        and filename.startswith("profile_pics/")
+        and filename != "profile_pics/default.png"
+        and response.status_code == 200
+    ):
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = UPLOAD_MAX_AGE
+        response.cache_control.immutable = True
+        response.expires = int(time.time() + UPLOAD_MAX_AGE)
+    return response
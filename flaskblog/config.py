@@ -4,6 +4,31 @@ import os
 class Config:
     SECRET_KEY = os.environ.get("SECRET_KEY")
     SQLALCHEMY_DATABASE_URI = os.environ.get("SQLALCHEMY_DATABASE_URI")
+    # read-only GET traffic is spread over these, see flaskblog.replicas;
+    # comma separated in the environment
+    SQLALCHEMY_REPLICA_URIS = [
+        uri for uri in os.environ.get("SQLALCHEMY_REPLICA_URIS", "").split(",") if uri
+    ]
+    # after a request that wrote, the client reads from the primary this long
+    REPLICA_STICKY_SECONDS = int(os.environ.get("REPLICA_STICKY_SECONDS", 10))
+    # connection pool per process, see flaskblog.engine; an in-memory SQLite
+    # database always uses one shared connection instead
+    DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+    DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+    # seconds a request waits for a free connection before failing
+    DB_POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", 10))
+    # connections older than this many seconds are replaced, -1 never
+    DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+    # test each connection with a round trip before handing it out
+    DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "1") == "1"
+    # statements running longer are aborted, 0 never
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get("DB_STATEMENT_TIMEOUT_MS", 0))
+    # PRAGMAs set on every new SQLite connection
+    SQLITE_JOURNAL_MODE = os.environ.get("SQLITE_JOURNAL_MODE", "wal")
+    SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "normal")
+    # how long a writer waits for another one before "database is locked"
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000))
+    SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
     MAIL_SERVER = "smtp.gmail.com"
     MAIL_PORT = 587
     MAIL_USE_TLS = True
@@ -11,3 +36,64 @@ class Config:
     MAIL_USERNAME = os.environ.get("EMAIL_USER")
     MAIL_PASSWORD = os.environ.get("EMAIL_PASS")
     PASSWORD_SALT = os.environ.get("PASSWORD_SALT")
+    # signs email verification links; it must differ from PASSWORD_SALT so
+    # that a verification link can never be used as a password reset link
+    EMAIL_VERIFY_SALT = os.environ.get("EMAIL_VERIFY_SALT", "email-verify")
+    # number of page-number links shown under a feed, deeper pages use cursors
+    FEED_PAGE_LINKS = 5
+    # rows removed per DELETE by the pending-user cleanup job
+    PENDING_USER_CLEANUP_BATCH_SIZE = 500
+    # outbound mail queue: "smtp" or "local" (keeps messages in memory, for tests)
+    MAIL_QUEUE_TRANSPORT = os.environ.get("MAIL_QUEUE_TRANSPORT", "smtp")
+    # background threads draining the outbox, 0 leaves it to the scheduled drain
+    MAIL_QUEUE_WORKERS = 2
+    MAIL_QUEUE_BATCH_SIZE = 50
+    MAIL_QUEUE_MAX_ATTEMPTS = 5
+    # first retry delay, doubled after every failed attempt
+    MAIL_QUEUE_BACKOFF_SECONDS = 30
+    # a claimed batch not finished within this is picked up again
+    MAIL_QUEUE_CLAIM_SECONDS = 300
+    # bcrypt work factor, existing hashes are upgraded on the next login
+    BCRYPT_LOG_ROUNDS = 12
+    AUTH_HASH_WORKERS = 2
+    # hashes allowed to wait for or use the hashing pool before requests are refused
+    AUTH_HASH_MAX_PENDING = 16
+    AUTH_IP_ATTEMPTS_PER_MINUTE = 30
+    AUTH_ACCOUNT_ATTEMPTS_PER_MINUTE = 10
+    # logged in user cache, see flaskblog.cache.IdentityCache
+    USER_CACHE_SIZE = 1024
+    USER_CACHE_TTL = 60
+    # None keeps the cache per process, or an object with get/set/delete shared
+    # by every worker
+    USER_CACHE_BACKEND = None
+    # rendered feed pages and post cards, see flaskblog.cache.FragmentCache
+    FEED_CACHE_ENABLED = True
+    FEED_CACHE_TTL = 300
+    FEED_CACHE_MAX_ENTRIES = 10000
+    FEED_CACHE_MAX_BYTES = 8 * 1024 * 1024
+    FEED_CACHE_BACKEND = None
+    # request timings, see flaskblog.instrumentation; the Server-Timing header
+    # shows every client the SQL counts and timings, so it is off by default
+    SERVER_TIMING_ENABLED = os.environ.get("SERVER_TIMING_ENABLED", "0") == "1"
+    # SQL statements slower than this are logged to "flaskblog.slow_queries"
+    SLOW_QUERY_MS = int(os.environ.get("SLOW_QUERY_MS", 200))
+    # /metrics is only served when this is set, and then requires an
+    # "Authorization: Bearer <token>" header
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+    # rows fetched and written per batch by the exports
+    EXPORT_BATCH_SIZE = 1000
+    # run the scheduled jobs inside web workers (leader elected per job); set
+    # to 0 when a separate "flask jobs run" process runs them instead
+    JOBS_IN_WEB_PROCESS = os.environ.get("JOBS_IN_WEB_PROCESS", "1") == "1"
+    # processes resizing profile picture uploads, 0 resizes inside the request
+    AVATAR_PROCESS_WORKERS = 2
+    # uploads whose header reports more pixels are refused before decoding
+    AVATAR_MAX_PIXELS = 40_000_000
+    # square sizes stored per profile picture, offered to browsers via srcset
+    AVATAR_SIZES = [32, 64, 125, 250]
+    # stored formats, preferred first; the last one is the <img> fallback.
+    # "avif" needs a Pillow build with AVIF support
+    AVATAR_FORMATS = ["webp", "jpeg"]
+    # shared picture variants an upload claimed this recently are not deleted,
+    # as its reference may not be committed yet; far longer than any request
+    AVATAR_CLAIM_SECONDS = 3600
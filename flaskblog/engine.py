@@ -0,0 +1,119 @@
+import time
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+from flaskblog.metrics import REGISTRY
+
+# Engine and connection pool setup from the DB_* and SQLITE_* settings, see
+# flaskblog.config. engine_options() becomes SQLALCHEMY_ENGINE_OPTIONS before
+# Flask-SQLAlchemy builds the engine, init_app() then hooks the new engine's
+# connections.
+
+POOL_CHECKOUT_SECONDS = REGISTRY.histogram(
+    "flaskblog_db_pool_checkout_seconds",
+    "Time spent waiting for a database connection from the pool.",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30),
+)
+POOL_CHECKOUT_TIMEOUTS = REGISTRY.counter(
+    "flaskblog_db_pool_checkout_timeouts",
+    "Checkouts that gave up after DB_POOL_TIMEOUT seconds.",
+)
+
+
+class TimedQueuePool(QueuePool):
+    # QueuePool recording how long each checkout waited for a free connection,
+    # or to open a new one
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except Exception:
+            POOL_CHECKOUT_TIMEOUTS.inc()
+            raise
+        finally:
+            POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - started)
+
+
+def is_memory_sqlite(url):
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def engine_options(config, uri=None):
+    # for the primary, or for the database at uri (a replica)
+    uri = uri or config.get("SQLALCHEMY_DATABASE_URI")
+    if not uri:
+        # left to Flask-SQLAlchemy to complain about
+        return config.get("SQLALCHEMY_ENGINE_OPTIONS") or {}
+    url = make_url(uri)
+    options = {
+        "pool_pre_ping": config["DB_POOL_PRE_PING"],
+        "pool_recycle": config["DB_POOL_RECYCLE"],
+    }
+    # an in-memory SQLite database is a single shared connection (StaticPool),
+    # there is nothing to size or wait for
+    if not is_memory_sqlite(url):
+        options.update(
+            poolclass=TimedQueuePool,
+            pool_size=config["DB_POOL_SIZE"],
+            max_overflow=config["DB_MAX_OVERFLOW"],
+            pool_timeout=config["DB_POOL_TIMEOUT"],
+        )
+    timeout = config["DB_STATEMENT_TIMEOUT_MS"]
+    if timeout and url.get_backend_name() == "postgresql":
+        options["connect_args"] = {"options": f"-c statement_timeout={timeout}"}
+    # explicit SQLALCHEMY_ENGINE_OPTIONS win
+    options.update(config.get("SQLALCHEMY_ENGINE_OPTIONS") or {})
+    return options
+
+
+def init_app(app):
+    from flaskblog import db
+
+    with app.app_context():
+        engines = list(db.engines.values())
+        primary = db.engine
+    for engine in engines:
+        if engine.dialect.name == "sqlite":
+            tune_sqlite(engine, app.config)
+    # read through engine.pool each time, dispose() replaces the pool
+    REGISTRY.gauge(
+        "flaskblog_db_pool_checked_out",
+        "Primary database connections currently handed out by the pool.",
+        lambda: getattr(primary.pool, "checkedout", lambda: 0)(),
+    )
+
+
+def tune_sqlite(engine, config):
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        # WAL lets readers carry on while the scheduler or another worker
+        # writes; NORMAL only syncs at checkpoints, which is safe with WAL
+        if not is_memory_sqlite(engine.url):
+            cursor.execute(f"PRAGMA journal_mode = {config['SQLITE_JOURNAL_MODE']}")
+        cursor.execute(f"PRAGMA synchronous = {config['SQLITE_SYNCHRONOUS']}")
+        # wait for a lock instead of failing with "database is locked"
+        cursor.execute(f"PRAGMA busy_timeout = {int(config['SQLITE_BUSY_TIMEOUT_MS'])}")
+        cursor.execute(f"PRAGMA mmap_size = {int(config['SQLITE_MMAP_SIZE'])}")
+        cursor.close()
+        timeout = config["DB_STATEMENT_TIMEOUT_MS"]
+        if timeout:
+            # SQLite has no statement timeout; the progress handler runs every
+            # 1000 VM instructions and aborts the statement once it is overdue
+            info = connection_record.info
+            dbapi_connection.set_progress_handler(
+                lambda: time.monotonic() > info.get("deadline", float("inf")), 1000
+            )
+
+    if config["DB_STATEMENT_TIMEOUT_MS"]:
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def start_statement_clock(conn, cursor, statement, parameters, context, many):
+            conn.info["deadline"] = (
+                time.monotonic() + config["DB_STATEMENT_TIMEOUT_MS"] / 1000
+            )
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def stop_statement_clock(conn, cursor, statement, parameters, context, many):
+            # fetching the rows and committing are not timed
+            conn.info.pop("deadline", None)
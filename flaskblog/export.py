@@ -0,0 +1,128 @@
+import csv
+import io
+import json
+from datetime import datetime
+from flask import Blueprint, Response, abort, current_app, stream_with_context
+from flask_login import current_user, login_required
+from sqlalchemy import select
+from flaskblog import db
+from flaskblog.models import Booking, Post, User
+
+# Bulk exports of whole tables as CSV or NDJSON (one JSON object per line),
+# for "flask export <table>" and GET /admin/export/<table>.<format>.
+#
+# Rows are fetched EXPORT_BATCH_SIZE at a time with yield_per, which also
+# makes the driver use a server-side cursor where it has one (PostgreSQL;
+# SQLite steps through the result anyway), and each batch is written out
+# before the next is fetched. Nothing ever holds the whole table, so an
+# export of millions of rows runs in the memory of one batch.
+
+# columns exported per table, in file order; never the password hash
+EXPORTS = {
+    "posts": (
+        Post.id,
+        Post.title,
+        Post.date_posted,
+        Post.user_id,
+        Post.revision,
+        Post.content,
+    ),
+    "users": (
+        User.id,
+        User.username,
+        User.email,
+        User.email_verified,
+        User.first_name,
+        User.last_name,
+        User.role,
+        User.created_at,
+        User.post_count,
+        User.last_posted_at,
+    ),
+    "bookings": (
+        Booking.id,
+        Booking.event_id,
+        Booking.user_id,
+        Booking.role,
+        Booking.created_at,
+    ),
+}
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+admin = Blueprint("admin", __name__)
+
+# spreadsheets run cells starting with these as formulas
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def export_batches(table):
+    columns = EXPORTS[table]
+    statement = (
+        select(*columns)
+        .order_by(columns[0])
+        .execution_options(yield_per=current_app.config["EXPORT_BATCH_SIZE"])
+    )
+    return db.session.execute(statement).partitions()
+
+
+def csv_cell(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        # user-written text is data, not a formula
+        return "'" + value
+    return value
+
+
+def csv_chunks(names, batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    yield buffer.getvalue()
+    for batch in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([csv_cell(value) for value in row] for row in batch)
+        yield buffer.getvalue()
+
+
+def ndjson_chunks(names, batches):
+    for batch in batches:
+        yield "".join(
+            json.dumps(dict(zip(names, row)), default=datetime.isoformat) + "\n"
+            for row in batch
+        )
+
+
+def export_chunks(table, format):
+    # the export as a generator of str chunks, one per batch of rows
+    names = [column.key for column in EXPORTS[table]]
+    chunks = csv_chunks if format == "csv" else ndjson_chunks
+    return chunks(names, export_batches(table))
+
+
+def is_admin():
+    # read from the database rather than the cached current_user, so that a
+    # revoke applies at once
+    return (
+        db.session.query(User.id)
+        .filter(User.id == current_user.id, User.is_admin, User.email_verified)
+        .first()
+        is not None
+    )
+
+
+@admin.route(
+    "/admin/export/<any({}):table>.<any({}):format>".format(
+        ", ".join(EXPORTS), ", ".join(FORMATS)
+    )
+)
+@login_required
+def export(table, format):
+    if not is_admin():
+        abort(403)
+    response = Response(
+        stream_with_context(export_chunks(table, format)), mimetype=FORMATS[format]
+    )
+    response.headers["Content-Disposition"] = f'attachment; filename="{table}.{format}"'
+    return response
@@ -0,0 +1,201 @@
+import logging
+import re
+import time
+from contextlib import contextmanager
+from flask import (
+    Blueprint,
+    abort,
+    before_render_template,
+    current_app,
+    g,
+    has_app_context,
+    has_request_context,
+    request,
+    template_rendered,
+)
+from sqlalchemy import event
+from flaskblog.metrics import REGISTRY
+
+# Per request: wall time, SQL statement count and time, template rendering
+# time, and the time spent hashing passwords (bcrypt), sending mail (mail) and
+# processing uploads (image). Published three ways:
+#   - GET /metrics, the process's metrics in the Prometheus text format, only
+#     when METRICS_TOKEN is set and the scraper sends it
+#   - with SERVER_TIMING_ENABLED, a Server-Timing header on every response,
+#     shown by browser dev tools
+#   - the "flaskblog.slow_queries" log, one line per statement slower than
+#     SLOW_QUERY_MS, naming the blueprint and endpoint that ran it
+# Work outside a request (jobs, mail workers) is labelled with endpoint "-".
+
+slow_query_logger = logging.getLogger("flaskblog.slow_queries")
+
+metrics = Blueprint("metrics", __name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+PHASES = ("sql", "template", "bcrypt", "mail", "image")
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    "flaskblog_http_request_duration_seconds",
+    "Wall time of a request.",
+    LATENCY_BUCKETS,
+    labelnames=("endpoint", "method"),
+)
+REQUESTS = REGISTRY.counter(
+    "flaskblog_http_requests",
+    "Requests served.",
+    labelnames=("endpoint", "method", "status"),
+)
+PHASE_SECONDS = REGISTRY.histogram(
+    "flaskblog_request_phase_seconds",
+    "Time one request spent in SQL, templates, bcrypt, mail or image work.",
+    LATENCY_BUCKETS,
+    labelnames=("endpoint", "phase"),
+)
+SQL_STATEMENTS = REGISTRY.counter(
+    "flaskblog_sql_statements",
+    "SQL statements executed.",
+    labelnames=("endpoint",),
+)
+SQL_SECONDS = REGISTRY.histogram(
+    "flaskblog_sql_statement_duration_seconds",
+    "Time spent executing one SQL statement.",
+    LATENCY_BUCKETS,
+    labelnames=("endpoint",),
+)
+SLOW_QUERIES = REGISTRY.counter(
+    "flaskblog_sql_slow_statements",
+    "SQL statements slower than SLOW_QUERY_MS.",
+    labelnames=("endpoint",),
+)
+WORK_SECONDS = REGISTRY.histogram(
+    "flaskblog_work_seconds",
+    "One bcrypt, mail or image operation, inside a request or not.",
+    LATENCY_BUCKETS,
+    labelnames=("phase",),
+)
+
+
+def current_endpoint():
+    if not has_request_context():
+        return "-"
+    return request.endpoint or "none"
+
+
+def add_to_request(phase, seconds):
+    if has_request_context() and "timings" in g:
+        g.timings[phase] += seconds
+
+
+@contextmanager
+def timed(phase):
+    # also usable as a decorator: @timed("bcrypt")
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        WORK_SECONDS.observe(elapsed, phase=phase)
+        add_to_request(phase, elapsed)
+
+
+def start_statement(conn, cursor, statement, parameters, context, executemany):
+    conn.info["statement_started"] = time.perf_counter()
+
+
+def finish_statement(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop("statement_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    endpoint = current_endpoint()
+    SQL_STATEMENTS.inc(endpoint=endpoint)
+    SQL_SECONDS.observe(elapsed, endpoint=endpoint)
+    add_to_request("sql", elapsed)
+    if has_request_context() and "timings" in g:
+        g.sql_statements += 1
+    if has_app_context() and elapsed * 1000 >= current_app.config["SLOW_QUERY_MS"]:
+        SLOW_QUERIES.inc(endpoint=endpoint)
+        # the statement only, parameters may hold personal data
+        slow_query_logger.warning(
+            "%.1fms in %s (blueprint %s): %s",
+            elapsed * 1000,
+            endpoint,
+            request.blueprint if has_request_context() else "-",
+            re.sub(r"\s+", " ", statement)[:500],
+        )
+
+
+def template_started(sender, template, context, **extra):
+    # templates render inside each other (feed, post cards), only the
+    # outermost one is timed
+    if "timings" not in g:
+        return
+    if g.template_depth == 0:
+        g.template_started = time.perf_counter()
+    g.template_depth += 1
+
+
+def template_finished(sender, template, context, **extra):
+    if "timings" not in g or g.template_depth == 0:
+        return
+    g.template_depth -= 1
+    if g.template_depth == 0:
+        g.timings["template"] += time.perf_counter() - g.template_started
+
+
+def start_request():
+    g.request_started = time.perf_counter()
+    g.timings = dict.fromkeys(PHASES, 0.0)
+    g.sql_statements = 0
+    g.template_depth = 0
+
+
+def finish_request(response):
+    if "timings" not in g:
+        return response
+    total = time.perf_counter() - g.request_started
+    endpoint = current_endpoint()
+    REQUEST_SECONDS.observe(total, endpoint=endpoint, method=request.method)
+    REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    for phase, seconds in g.timings.items():
+        if seconds or phase == "sql":
+            PHASE_SECONDS.observe(seconds, endpoint=endpoint, phase=phase)
+    if current_app.config["SERVER_TIMING_ENABLED"]:
+        entries = [f"total;dur={total * 1000:.1f}"]
+        for phase, seconds in g.timings.items():
+            if phase == "sql":
+                entries.append(
+                    f'sql;dur={seconds * 1000:.1f};desc="{g.sql_statements} queries"'
+                )
+            elif seconds:
+                entries.append(f"{phase};dur={seconds * 1000:.1f}")
+        response.headers["Server-Timing"] = ", ".join(entries)
+    return response
+
+
+@metrics.route("/metrics")
+def scrape():
+    token = current_app.config["METRICS_TOKEN"]
+    if not token:
+        abort(404)
+    if request.headers.get("Authorization") != f"Bearer {token}":
+        abort(403)
+    return (
+        REGISTRY.render(),
+        200,
+        {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+    )
+
+
+def init_app(app):
+    from flaskblog import db
+
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines + app.extensions["replicas"]:
+        event.listen(engine, "before_cursor_execute", start_statement)
+        event.listen(engine, "after_cursor_execute", finish_statement)
+    before_render_template.connect(template_started, app)
+    template_rendered.connect(template_finished, app)
+    app.before_request(start_request)
+    app.after_request(finish_request)
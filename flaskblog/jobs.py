@@ -0,0 +1,224 @@
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import delete, or_, update
+from sqlalchemy.exc import IntegrityError
+from flaskblog import db, mail_queue
+
+logger = logging.getLogger(__name__)
+
+# one scheduler per process, created on first use
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def holder_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+# identifies this process as a lease holder
+HOLDER = holder_id()
+
+
+def _after_fork():
+    # A pre-forking server (gunicorn --preload) imports this module once in
+    # the master; each worker must still be a holder of its own, or every
+    # worker would pass the "holder is me" check and run every job. Scheduler
+    # threads do not survive a fork either.
+    global HOLDER, _scheduler, _scheduler_lock
+    HOLDER = holder_id()
+    _scheduler = None
+    _scheduler_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+# Every process may run a scheduler (web workers after their first request,
+# or a dedicated "flask jobs run" process), but each job only runs where its
+# lease is held. A lease lasts two intervals and the holder renews it on every
+# run, so when the leader dies another process takes over within two intervals.
+def init_app(app):
+    if not app.config["JOBS_IN_WEB_PROCESS"]:
+        return
+
+    # started by the first request, so after any pre-fork and never for CLI
+    # commands or plain create_app() calls; test clients run without jobs
+    def start_on_first_request():
+        if not app.testing:
+            start_scheduler(app)
+
+    app.before_request(start_on_first_request)
+
+
+def start_scheduler(app, blocking=False):
+    # APScheduler is only imported here; the jobs run against the app that
+    # starts the scheduler. With blocking=True this runs until interrupted.
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is not None:
+            return
+        if blocking:
+            from apscheduler.schedulers.blocking import BlockingScheduler as Scheduler
+        else:
+            from apscheduler.schedulers.background import (
+                BackgroundScheduler as Scheduler,
+            )
+
+        _scheduler = Scheduler()
+        for name, (job, interval) in JOBS.items():
+            _scheduler.add_job(
+                func=run_job,
+                args=[app, name],
+                trigger="interval",
+                seconds=interval,
+                id=name,
+                name=name,
+                coalesce=True,
+                max_instances=1,
+            )
+        logger.info(f"Starting the job scheduler as {HOLDER}.")
+    _scheduler.start()
+
+
+def run_job(app, name):
+    # runs one job if this process holds (or can take) its lease and records
+    # how long it took; returns whether the job ran here
+    job, interval = JOBS[name]
+    with app.app_context():
+        if not acquire_lease(name, timedelta(seconds=2 * interval)):
+            return False
+        started_at = datetime.utcnow()
+        started = time.perf_counter()
+        error = None
+        try:
+            job()
+        except Exception as exception:
+            db.session.rollback()
+            error = repr(exception)
+            logger.exception(f"Job {name} failed.")
+        duration = time.perf_counter() - started
+        record_run(name, started_at, duration, error)
+        logger.info(f"Job {name} finished in {duration:.3f}s.")
+        return True
+
+
+def acquire_lease(name, duration):
+    from flaskblog.models import JobLease
+
+    now = datetime.utcnow()
+    # one conditional UPDATE, so two processes can never both take the lease
+    taken = db.session.execute(
+        update(JobLease)
+        .where(
+            JobLease.name == name,
+            or_(JobLease.holder == HOLDER, JobLease.expires_at < now),
+        )
+        .values(holder=HOLDER, expires_at=now + duration)
+    ).rowcount
+    if taken:
+        db.session.commit()
+        return True
+    if db.session.get(JobLease, name) is not None:
+        # somebody else leads this job
+        db.session.rollback()
+        return False
+    # first run ever, the primary key settles a race between processes
+    db.session.add(JobLease(name=name, holder=HOLDER, expires_at=now + duration))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return False
+    return True
+
+
+def record_run(name, started_at, duration, error):
+    from flaskblog.models import JobLease
+
+    _, interval = JOBS[name]
+    # also renews the lease, counted from the end of the run
+    db.session.execute(
+        update(JobLease)
+        .where(JobLease.name == name, JobLease.holder == HOLDER)
+        .values(
+            expires_at=datetime.utcnow() + timedelta(seconds=2 * interval),
+            runs=JobLease.runs + 1,
+            last_started_at=started_at,
+            last_duration=duration,
+            last_error=error,
+        )
+    )
+    db.session.commit()
+
+
+def delete_old_pending_users():
+    from flaskblog.models import User
+    from flaskblog.users.utils import expired_pending_users
+
+    logger.info("Running delete_old_pending_users task.")
+    cutoff_time = datetime.utcnow() - timedelta(minutes=30)
+    batch_size = current_app.config["PENDING_USER_CLEANUP_BATCH_SIZE"]
+    total_deleted = 0
+    # Delete in set-based batches so no User rows are loaded into memory and
+    # each transaction stays short, however large the backlog is.
+    while True:
+        batch = (
+            expired_pending_users(cutoff_time).with_entities(User.id).limit(batch_size)
+        )
+        deleted = db.session.execute(
+            delete(User)
+            .where(User.id.in_(batch.scalar_subquery()))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if deleted:
+            db.session.commit()
+            total_deleted += deleted
+            logger.info(f"Deleted a batch of {deleted} old pending users.")
+        if deleted < batch_size:
+            break
+    # the last statement matched nothing, end its empty transaction
+    db.session.rollback()
+    if total_deleted:
+        logger.info(f"Deleted {total_deleted} old pending users.")
+    else:
+        logger.info("No old pending users to delete.")
+
+
+def drain_mail_outbox():
+    # picks up retries and anything the request-time workers did not get to
+    mail_queue.drain()
+
+
+def promote_waitlists():
+    from flaskblog.bookings.utils import events_to_promote, promote
+
+    for event in events_to_promote():
+        promoted = promote(event)
+        if promoted:
+            logger.info(
+                f"Promoted {len(promoted)} from the waitlist of event {event.id}."
+            )
+
+
+def sweep_profile_pictures():
+    from flaskblog.users.utils import sweep_pictures
+
+    removed = sweep_pictures()
+    if removed:
+        logger.info(f"Removed {removed} unused profile pictures.")
+
+
+# job name -> (function, interval in seconds)
+JOBS = {
+    "delete_old_pending_users": (delete_old_pending_users, 60),
+    "drain_mail_outbox": (drain_mail_outbox, 30),
+    "promote_waitlists": (promote_waitlists, 10),
+    "sweep_profile_pictures": (sweep_profile_pictures, 3600),
+}
@@ -0,0 +1,193 @@
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from flask import current_app
+from flaskblog.instrumentation import timed
+
+logger = logging.getLogger(__name__)
+
+
+class SMTPTransport:
+    # sends through Flask-Mail, one SMTP connection per batch. Flask-Mail is
+    # only imported once the app actually sends mail.
+    def __init__(self):
+        from flask_mail import Mail
+
+        self.mail = Mail(current_app._get_current_object())
+
+    def connect(self):
+        return self.mail.connect()
+
+
+class LocalTransport:
+    # stand-in transport for tests and local development, keeps what it "sends"
+    def __init__(self):
+        self.sent = []
+
+    @contextmanager
+    def connect(self):
+        yield self
+
+    def send(self, message):
+        self.sent.append(message)
+
+
+TRANSPORTS = {"smtp": SMTPTransport, "local": LocalTransport}
+
+
+class MailQueue:
+    # Outbound mail goes through a persistent outbox table. Requests only insert
+    # a row, a small thread pool (and the scheduler, for retries) drains the
+    # outbox in batches over one reused transport connection.
+    def __init__(self, app=None):
+        self._executor = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions["mail_queue"] = {}
+
+    @property
+    def transport(self):
+        # MAIL_QUEUE_TRANSPORT is either a name from TRANSPORTS or a transport class
+        transports = current_app.extensions["mail_queue"]
+        name = current_app.config["MAIL_QUEUE_TRANSPORT"]
+        if name not in transports:
+            transport_class = TRANSPORTS[name] if isinstance(name, str) else name
+            transports[name] = transport_class()
+        return transports[name]
+
+    def enqueue(self, message):
+        from flaskblog import db
+        from flaskblog.models import OutboxEmail
+
+        email = OutboxEmail(
+            subject=message.subject,
+            sender=message.sender,
+            recipients=",".join(message.recipients),
+            body=message.body,
+        )
+        db.session.add(email)
+        db.session.commit()
+        self.notify()
+        return email
+
+    def notify(self):
+        # wake a background worker, the request does not wait for it
+        workers = current_app.config["MAIL_QUEUE_WORKERS"]
+        if not workers:
+            return
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=workers, thread_name_prefix="mail-queue"
+                )
+        self._executor.submit(self._drain_in_app, current_app._get_current_object())
+
+    def _drain_in_app(self, app):
+        with app.app_context():
+            try:
+                self.drain()
+            except Exception:
+                logger.exception("Draining the mail outbox failed.")
+
+    def drain(self):
+        # send everything that is due, batch by batch; returns the number sent
+        sent = 0
+        while True:
+            batch = self._claim_batch()
+            if not batch:
+                return sent
+            sent += self._send_batch(batch)
+
+    def _claim_batch(self):
+        from flaskblog import db
+        from flaskblog.models import OutboxEmail
+
+        config = current_app.config
+        now = datetime.utcnow()
+        token = uuid.uuid4().hex
+        # rows left in "sending" past their claim deadline belong to a dead worker
+        due = (
+            OutboxEmail.status.in_(("pending", "sending")),
+            OutboxEmail.next_attempt_at <= now,
+        )
+        batch = (
+            db.session.query(OutboxEmail.id)
+            .filter(*due)
+            .order_by(OutboxEmail.id)
+            .limit(config["MAIL_QUEUE_BATCH_SIZE"])
+        )
+        # the claim is one conditional UPDATE, so concurrent workers never share a row
+        claimed = OutboxEmail.query.filter(
+            OutboxEmail.id.in_(batch.scalar_subquery()), *due
+        ).update(
+            {
+                OutboxEmail.status: "sending",
+                OutboxEmail.claim_token: token,
+                OutboxEmail.next_attempt_at: now
+                + timedelta(seconds=config["MAIL_QUEUE_CLAIM_SECONDS"]),
+            },
+            synchronize_session=False,
+        )
+        if not claimed:
+            db.session.rollback()
+            return []
+        db.session.commit()
+        return (
+            OutboxEmail.query.filter_by(claim_token=token)
+            .order_by(OutboxEmail.id)
+            .all()
+        )
+
+    @timed("mail")
+    def _send_batch(self, emails):
+        from flask_mail import Message
+        from flaskblog import db
+
+        sent = 0
+        try:
+            with self.transport.connect() as connection:
+                for email in emails:
+                    message = Message(
+                        email.subject,
+                        sender=email.sender,
+                        recipients=email.recipients.split(","),
+                        body=email.body,
+                    )
+                    try:
+                        connection.send(message)
+                    except Exception as error:
+                        self._record_failure(email, error)
+                    else:
+                        email.status = "sent"
+                        email.sent_at = datetime.utcnow()
+                        email.claim_token = None
+                        sent += 1
+        except Exception as error:
+            # the connection itself failed, every unsent message in the batch is retried
+            for email in emails:
+                if email.status == "sending":
+                    self._record_failure(email, error)
+        db.session.commit()
+        logger.info(f"Mail outbox batch: {sent} of {len(emails)} sent.")
+        return sent
+
+    def _record_failure(self, email, error):
+        config = current_app.config
+        email.attempts += 1
+        email.last_error = str(error)[:500]
+        email.claim_token = None
+        if email.attempts >= config["MAIL_QUEUE_MAX_ATTEMPTS"]:
+            email.status = "failed"
+            logger.error(
+                f"Giving up on email {email.id} after {email.attempts} attempts."
+            )
+        else:
+            email.status = "pending"
+            delay = config["MAIL_QUEUE_BACKOFF_SECONDS"] * 2 ** (email.attempts - 1)
+            email.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
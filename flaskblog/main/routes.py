@@ -1,5 +1,9 @@
 from flask import render_template, request, Blueprint
-from flaskblog.models import Post
+from flaskblog import fragment_cache
+from flaskblog.conditional import conditional_response
+from flaskblog.pagination import paginate_feed
+from flaskblog.posts.utils import feed_query
+from flaskblog.search import search_posts
 
 main = Blueprint("main", __name__, template_folder="templates")
 
@@ -7,11 +11,38 @@ main = Blueprint("main", __name__, template_folder="templates")
 @main.route("/")
 @main.route("/home")
 def home():
-    page = request.args.get("page", 1, type=int)
-    posts = Post.query.order_by(Post.date_posted.desc()).paginate(page=page, per_page=7)
-    return render_template("main/home.html", posts=posts)
+    # the feed is the same for every visitor, only the layout around it is not
+    key = "feed:{}:{}:{}".format(
+        request.args.get("page", ""),
+        request.args.get("after", ""),
+        request.args.get("before", ""),
+    )
+
+    def render_feed():
+        return fragment_cache.cached(
+            key,
+            lambda: render_template(
+                "main/feed.html", posts=paginate_feed(feed_query(), per_page=7)
+            ),
+        )
+
+    # the feed version is stored in the database, so every worker builds the
+    # same ETag and none of them answers 304 for a feed it has not seen change
+    return conditional_response(
+        lambda: render_template("main/home.html", feed=render_feed()),
+        ["home", fragment_cache.version, request.query_string],
+    )
 
 
 @main.route("/about")
 def about():
     return render_template("main/about.html", title="About")
+
+
+@main.route("/search")
+def search():
+    terms = request.args.get("q", "").strip()
+    results = search_posts(terms, per_page=10) if terms else None
+    return render_template(
+        "main/search.html", title="Search", terms=terms, results=results
+    )
@@ -0,0 +1,150 @@
+import bisect
+import math
+import threading
+
+# Process-wide metrics in the Prometheus data model. Each worker process keeps
+# its own numbers; the scraper adds them up across workers. Metrics are
+# created once at import time of the module that records them and are safe to
+# update from any thread, including pool and job threads outside a request.
+#
+# Counters and histograms may have labels: declare their names with labelnames
+# and pass the values as keyword arguments, inc(endpoint="main.home"). Label
+# values must come from a small fixed set (endpoint names, phases), never from
+# user input.
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    @property
+    def value(self):
+        with self._lock:
+            return sum(self._values.values())
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [
+            (self.name + "_total", dict(zip(self.labelnames, key)), value)
+            for key, value in values
+        ]
+
+
+class Histogram:
+    def __init__(self, name, help, buckets, labelnames=()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self.labelnames = tuple(labelnames)
+        # label values -> [per bucket counts, sum]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0]
+            series[1] += value
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+
+    @property
+    def count(self):
+        with self._lock:
+            return sum(sum(counts) for counts, _ in self._series.values())
+
+    @property
+    def sum(self):
+        with self._lock:
+            return sum(total for _, total in self._series.values())
+
+    def samples(self):
+        # buckets are cumulative in the exposition format
+        with self._lock:
+            series = sorted(
+                (key, list(counts), total)
+                for key, (counts, total) in self._series.items()
+            )
+        samples = []
+        for key, counts, total in series:
+            labels = dict(zip(self.labelnames, key))
+            running = 0
+            for bound, count in zip(self.buckets, counts):
+                running += count
+                le = "+Inf" if bound == math.inf else repr(float(bound))
+                samples.append((self.name + "_bucket", {**labels, "le": le}, running))
+            samples.append((self.name + "_sum", labels, total))
+            samples.append((self.name + "_count", labels, running))
+        return samples
+
+
+class Gauge:
+    # read when scraped, from a function returning the current value
+    def __init__(self, name, help, function):
+        self.name = name
+        self.help = help
+        self.function = function
+
+    def samples(self):
+        return [(self.name, {}, self.function())]
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        # a metric registered again under the same name replaces the old one,
+        # e.g. a gauge reading the pool of the most recently built app
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, buckets, labelnames=()):
+        return self.register(Histogram(name, help, buckets, labelnames))
+
+    def gauge(self, name, help, function):
+        return self.register(Gauge(name, help, function))
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def render(self):
+        # Prometheus text exposition format, version 0.0.4
+        types = {Counter: "counter", Histogram: "histogram", Gauge: "gauge"}
+        lines = []
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {types[type(metric)]}")
+            for name, labels, value in metric.samples():
+                label_text = ",".join(
+                    f'{key}="{escape_label(val)}"' for key, val in labels.items()
+                )
+                lines.append(
+                    f"{name}{{{label_text}}} {value}" if labels else f"{name} {value}"
+                )
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
@@ -1,13 +1,17 @@
 from datetime import datetime
-from itsdangerous import URLSafeTimedSerializer
-from flaskblog import db, login_manager
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from flaskblog import db, login_manager, user_cache
 from flask import current_app
 from flask_login import UserMixin
+from sqlalchemy.orm import validates
+
+# longest post excerpt shown on listing cards, in characters
+EXCERPT_LENGTH = 300
 
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return user_cache.load(int(user_id))
 
 
 class User(db.Model, UserMixin):
@@ -15,6 +19,9 @@ class User(db.Model, UserMixin):
     username = db.Column(db.String(20), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     email_verified = db.Column(db.Boolean, nullable=False, default=False)
+    # a new address asked for on the account page; email stays in use, and
+    # verified, until the link mailed to the new address is followed
+    pending_email = db.Column(db.String(120))
     password = db.Column(db.LargeBinary, nullable=False)
     first_name = db.Column(db.String(25), nullable=False)
     last_name = db.Column(db.String(50), nullable=False)
@@ -22,6 +29,20 @@ class User(db.Model, UserMixin):
     image_file = db.Column(db.String(20), nullable=False, default="default.png")
     posts = db.relationship("Post", backref="author", lazy=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # denormalized from the user's posts by flaskblog.posts.utils, in the same
+    # transaction as the post change; "flask users recount-posts" repairs them
+    post_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    last_posted_at = db.Column(db.DateTime)
+    # may download the exports, see flaskblog.export; only ever set with
+    # "flask users grant-admin", never from a form
+    is_admin = db.Column(
+        db.Boolean, nullable=False, default=False, server_default=db.false()
+    )
+
+    # backs the cleanup scan for expired unverified accounts
+    __table_args__ = (
+        db.Index("ix_user_email_verified_created_at", "email_verified", "created_at"),
+    )
 
     def get_reset_token(self):
         serializer = URLSafeTimedSerializer(current_app.config["SECRET_KEY"])
@@ -42,6 +63,30 @@ class User(db.Model, UserMixin):
             return None
         return User.query.get(user_id)
 
+    def get_verify_token(self, email=None):
+        # names the address it is mailed to, the account's own by default
+        serializer = URLSafeTimedSerializer(current_app.config["SECRET_KEY"])
+        return serializer.dumps(
+            {"user_id": self.id, "email": email or self.email},
+            salt=current_app.config["EMAIL_VERIFY_SALT"],
+        )
+
+    @staticmethod
+    def verify_email_token(token):
+        # (user, email) while email is still the account's address or its
+        # pending one, otherwise None
+        serializer = URLSafeTimedSerializer(current_app.config["SECRET_KEY"])
+        try:
+            data = serializer.loads(
+                token, salt=current_app.config["EMAIL_VERIFY_SALT"], max_age=1800
+            )
+        except BadSignature:
+            return None
+        user = db.session.get(User, data["user_id"])
+        if user is None or data["email"] not in (user.email, user.pending_email):
+            return None
+        return user, data["email"]
+
     def __repr__(self):
         return f"User('{self.username}', '{self.email}', '{self.image_file}')"
 
@@ -51,7 +96,174 @@ class Post(db.Model):
     title = db.Column(db.String(100), nullable=False)
     date_posted = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     content = db.Column(db.Text, nullable=False)
+    # what listings show instead of the unbounded content, kept in step by
+    # the validator below so listings can leave content unloaded
+    excerpt = db.Column(db.String(EXCERPT_LENGTH + 1), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"))
+    # bumped on every edit, part of the post page's ETag
+    revision = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
+    # back the (date_posted, id) keyset used by the home feed and the per-author feed
+    __table_args__ = (
+        db.Index("ix_post_date_posted_id", "date_posted", "id"),
+        db.Index("ix_post_user_id_date_posted_id", "user_id", "date_posted", "id"),
+    )
+
+    @validates("content")
+    def set_excerpt(self, key, content):
+        self.excerpt = make_excerpt(content)
+        return content
 
     def __repr__(self):
         return f"Post('{self.title}', '{self.date_posted}')"
+
+
+def make_excerpt(content):
+    # whitespace collapsed like the browser would, cut at a word boundary
+    text = " ".join(content.split())
+    if len(text) <= EXCERPT_LENGTH:
+        return text
+    cut = text[:EXCERPT_LENGTH]
+    if " " in cut:
+        cut = cut[: cut.rindex(" ")]
+    return cut.rstrip(".,;:!?") + "…"
+
+
+class Event(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    title = db.Column(db.String(100), nullable=False)
+    description = db.Column(db.Text, nullable=False, default="")
+    location = db.Column(db.String(120), nullable=False)
+    starts_at = db.Column(db.DateTime, nullable=False)
+    organizer_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    organizer = db.relationship("User")
+    # places in total, shared by both roles
+    capacity = db.Column(db.Integer, nullable=False)
+    # the most leaders may outnumber followers by, or the other way round
+    max_imbalance = db.Column(db.Integer, nullable=False, default=2)
+    # confirmed bookings per role, only ever changed by the conditional
+    # UPDATEs in flaskblog.bookings.utils, never by counting Booking rows
+    leaders = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    followers = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # a last line of defence, the UPDATEs never get here
+        db.CheckConstraint("leaders >= 0 AND followers >= 0", name="ck_event_counts"),
+        db.CheckConstraint("leaders + followers <= capacity", name="ck_event_capacity"),
+        # Date range scans for the listing and the calendar. The availability
+        # columns ride along, so full events are skipped on the index entry
+        # without reading their rows.
+        db.Index(
+            "ix_event_calendar",
+            "starts_at",
+            "id",
+            "capacity",
+            "leaders",
+            "followers",
+            "max_imbalance",
+        ),
+    )
+
+    @property
+    def booked(self):
+        return self.leaders + self.followers
+
+    def __repr__(self):
+        return f"Event('{self.title}', '{self.starts_at}')"
+
+
+class Booking(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    event_id = db.Column(
+        db.Integer, db.ForeignKey("event.id", ondelete="CASCADE"), nullable=False
+    )
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    # the role danced at this event: "Leader" or "Follower"
+    role = db.Column(db.String(10), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    event = db.relationship("Event")
+    user = db.relationship("User")
+
+    # one booking per person and event, also the lookup for "my booking"
+    __table_args__ = (
+        db.UniqueConstraint("event_id", "user_id", name="uq_booking_event_user"),
+    )
+
+    def __repr__(self):
+        return f"Booking({self.event_id}, {self.user_id}, '{self.role}')"
+
+
+class WaitlistEntry(db.Model):
+    # a user waiting for a place at a full event, first come first served per role
+    id = db.Column(db.Integer, primary_key=True)
+    event_id = db.Column(
+        db.Integer, db.ForeignKey("event.id", ondelete="CASCADE"), nullable=False
+    )
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    # the role the user will dance once promoted: "Leader" or "Follower"
+    role = db.Column(db.String(10), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    event = db.relationship("Event")
+    user = db.relationship("User")
+
+    __table_args__ = (
+        db.UniqueConstraint("event_id", "user_id", name="uq_waitlist_event_user"),
+        # the head of a role's queue and a user's position are both one index
+        # range, however long the waitlist grows
+        db.Index("ix_waitlist_event_role_id", "event_id", "role", "id"),
+    )
+
+    def __repr__(self):
+        return f"WaitlistEntry({self.event_id}, {self.user_id}, '{self.role}')"
+
+
+class OutboxEmail(db.Model):
+    # queued outbound email, drained by flaskblog.mailqueue outside the request
+    id = db.Column(db.Integer, primary_key=True)
+    subject = db.Column(db.String(255), nullable=False)
+    sender = db.Column(db.String(120), nullable=False)
+    recipients = db.Column(db.Text, nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    # pending -> sending -> sent, or back to pending for a retry, or failed
+    status = db.Column(db.String(10), nullable=False, default="pending")
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    claim_token = db.Column(db.String(32))
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+    # backs the "what is due" scan of the outbox workers
+    __table_args__ = (
+        db.Index("ix_outbox_email_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+
+    def __repr__(self):
+        return f"OutboxEmail('{self.subject}', '{self.recipients}', '{self.status}')"
+
+
+class CacheVersion(db.Model):
+    # counters every process agrees on, bumped whenever the cached content
+    # they stand for changes, see flaskblog.cache.FragmentCache
+    name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
+    def __repr__(self):
+        return f"CacheVersion('{self.name}', {self.version})"
+
+
+class JobLease(db.Model):
+    # one row per scheduled job; the process holding an unexpired lease is the
+    # only one that runs the job, see flaskblog.jobs
+    name = db.Column(db.String(64), primary_key=True)
+    holder = db.Column(db.String(120), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    runs = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    last_started_at = db.Column(db.DateTime)
+    # seconds the last run took
+    last_duration = db.Column(db.Float)
+    last_error = db.Column(db.Text)
+
+    def __repr__(self):
+        return f"JobLease('{self.name}', '{self.holder}', '{self.expires_at}')"
@@ -0,0 +1,122 @@
+import base64
+from datetime import datetime
+from flask import abort, current_app, request
+from sqlalchemy import tuple_
+from flaskblog.models import Post
+
+
+# opaque cursor for a row in (datetime, id) order: base64 of "<moment>|<id>"
+def encode_key(moment, row_id):
+    raw = f"{moment.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def encode_cursor(post):
+    return encode_key(post.date_posted, post.id)
+
+
+def decode_cursor(token):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        moment, row_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(moment), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        abort(404)
+
+
+class FeedPage:
+    # One page of posts. Unlike flask_sqlalchemy's Pagination it never counts
+    # the rows, no COUNT(*) is issued; navigation uses cursors taken from the
+    # first and last post on the page, and page numbers up to a stored total.
+    def __init__(self, items, page=None, has_prev=False, has_next=False, pages=None):
+        self.items = items
+        self.page = page
+        self.has_prev = has_prev
+        self.has_next = has_next
+        # total number of pages, only when the caller has a stored row count
+        self.pages = pages
+
+    @property
+    def prev_cursor(self):
+        if self.has_prev and self.items:
+            return encode_cursor(self.items[0])
+        return None
+
+    @property
+    def next_cursor(self):
+        if self.has_next and self.items:
+            return encode_cursor(self.items[-1])
+        return None
+
+    # page-number links, only for shallow pages we have actually reached
+    def iter_pages(self):
+        if self.page is None:
+            return range(0)
+        if self.pages is not None:
+            last = self.pages
+        else:
+            last = self.page + 1 if self.has_next else self.page
+        return range(1, min(last, current_app.config["FEED_PAGE_LINKS"]) + 1)
+
+
+def paginate_feed(query, per_page=7, total=None):
+    # query must select Post rows and must not be ordered yet, the feed order
+    # (date_posted, id) newest first is applied here so it always matches the cursor.
+    # total is the number of rows the query returns when the caller already
+    # knows it (User.post_count), numbered pages then need no look-ahead row
+    after = request.args.get("after")
+    before = request.args.get("before")
+    newest_first = (Post.date_posted.desc(), Post.id.desc())
+    key = tuple_(Post.date_posted, Post.id)
+
+    if after:
+        items = (
+            query.filter(key < tuple_(*decode_cursor(after)))
+            .order_by(*newest_first)
+            .limit(per_page + 1)
+            .all()
+        )
+        return FeedPage(items[:per_page], has_prev=True, has_next=len(items) > per_page)
+
+    if before:
+        # walk backwards in ascending order, then flip the page back around
+        items = (
+            query.filter(key > tuple_(*decode_cursor(before)))
+            .order_by(Post.date_posted.asc(), Post.id.asc())
+            .limit(per_page + 1)
+            .all()
+        )
+        has_prev = len(items) > per_page
+        return FeedPage(
+            list(reversed(items[:per_page])), has_prev=has_prev, has_next=True
+        )
+
+    page = request.args.get("page", 1, type=int)
+    # only the linked pages are numbered; deeper ones are reached with cursors,
+    # so no request can ask for a deep OFFSET scan
+    if page < 1 or page > current_app.config["FEED_PAGE_LINKS"]:
+        abort(404)
+    if total is not None:
+        pages = max(1, -(-total // per_page))
+        if page > pages:
+            abort(404)
+        items = (
+            query.order_by(*newest_first)
+            .offset((page - 1) * per_page)
+            .limit(per_page)
+            .all()
+        )
+        return FeedPage(
+            items, page=page, has_prev=page > 1, has_next=page < pages, pages=pages
+        )
+    items = (
+        query.order_by(*newest_first)
+        .offset((page - 1) * per_page)
+        .limit(per_page + 1)
+        .all()
+    )
+    if page > 1 and not items:
+        abort(404)
+    return FeedPage(
+        items[:per_page], page=page, has_prev=page > 1, has_next=len(items) > per_page
+    )
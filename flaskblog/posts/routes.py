@@ -1,8 +1,12 @@
 from flask import render_template, url_for, flash, redirect, request, abort, Blueprint
 from flask_login import current_user, login_required
-from flaskblog import db
+from flaskblog import db, fragment_cache
+from flaskblog.conditional import conditional_response
 from flaskblog.models import Post
 from flaskblog.posts.forms import PostForm
+from flaskblog.posts.utils import count_deleted_post, count_new_post, get_post_or_404
+from flaskblog.search import index_post, remove_post
+from flaskblog.users.utils import avatar_url
 
 
 posts = Blueprint("posts", __name__, template_folder="templates")
@@ -18,7 +22,11 @@ def new_post():
             title=form.title.data, content=form.content.data, author=current_user
         )
         db.session.add(post)
+        db.session.flush()
+        index_post(post)
+        count_new_post(post)
         db.session.commit()
+        fragment_cache.bump()
         flash("Your post has been created.", "success")
         return redirect(url_for("main.home"))
     return render_template(
@@ -28,8 +36,22 @@ def new_post():
 
 @posts.route("/post/<int:post_id>")
 def post(post_id):
-    post = Post.query.get_or_404(post_id)
-    return render_template("posts/post.html", title=post.title, post=post)
+    post = get_post_or_404(post_id)
+    author = post.author
+    return conditional_response(
+        lambda: render_template("posts/post.html", title=post.title, post=post),
+        [
+            "post",
+            post.id,
+            post.revision,
+            author.username,
+            author.first_name,
+            author.last_name,
+            avatar_url(author.image_file),
+        ],
+        # once edited the post changed after date_posted, leave it to the ETag
+        last_modified=post.date_posted if post.revision == 0 else None,
+    )
 
 
 @posts.route("/post/<int:post_id>/update", methods=["GET", "POST"])
@@ -42,7 +64,10 @@ def update_post(post_id):
     if form.validate_on_submit():
         post.title = form.title.data
         post.content = form.content.data
+        post.revision += 1
+        index_post(post)
         db.session.commit()
+        fragment_cache.bump()
         flash("Your post has been updated!", "success")
         return redirect(url_for("posts.post", post_id=post.id))
     elif request.method == "GET":
@@ -59,7 +84,11 @@ def delete_post(post_id):
     post = Post.query.get_or_404(post_id)
     if post.author != current_user:
         abort(403)
+    remove_post(post.id)
     db.session.delete(post)
+    db.session.flush()
+    count_deleted_post(post)
     db.session.commit()
+    fragment_cache.bump()
     flash("Your post has been deleted!", "success")
     return redirect(url_for("main.home"))
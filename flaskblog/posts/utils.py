@@ -0,0 +1,91 @@
+from sqlalchemy import case, func, select, update
+from sqlalchemy.orm import defer, joinedload
+from flaskblog import db
+from flaskblog.models import User, Post
+
+
+# Post listings render the author's avatar, username and name on every card, so
+# the author is joined in with the post instead of being lazy loaded per post.
+# Only the columns the templates read are fetched.
+def with_author():
+    return joinedload(Post.author).load_only(
+        User.username, User.first_name, User.last_name, User.image_file
+    )
+
+
+# Cards show Post.excerpt, so listings leave the unbounded content column out
+# of the SELECT; raiseload makes a template that reaches for it fail loudly
+# instead of loading it one post at a time.
+def without_content():
+    return defer(Post.content, raiseload=True)
+
+
+def feed_query():
+    return Post.query.options(with_author(), without_content())
+
+
+def user_feed_query(user):
+    return Post.query.filter_by(author=user).options(with_author(), without_content())
+
+
+def get_post_or_404(post_id):
+    return Post.query.options(with_author()).get_or_404(post_id)
+
+
+# User.post_count and User.last_posted_at are changed with a single UPDATE
+# computed by the database, so concurrent posts by the same author cannot lose
+# an increment. Call them after the post change is flushed and before the
+# commit, the counters then commit or roll back together with the post.
+def count_new_post(post):
+    db.session.execute(
+        update(User)
+        .where(User.id == post.user_id)
+        .values(
+            post_count=User.post_count + 1,
+            last_posted_at=case(
+                (
+                    User.last_posted_at.is_(None)
+                    | (User.last_posted_at < post.date_posted),
+                    post.date_posted,
+                ),
+                else_=User.last_posted_at,
+            ),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def count_deleted_post(post):
+    # the newest remaining post is looked up by ix_post_user_id_date_posted_id
+    db.session.execute(
+        update(User)
+        .where(User.id == post.user_id)
+        .values(
+            post_count=User.post_count - 1,
+            last_posted_at=latest_post_date(User.id),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def latest_post_date(user_id):
+    return (
+        select(func.max(Post.date_posted))
+        .where(Post.user_id == user_id)
+        .scalar_subquery()
+    )
+
+
+def recount_posts():
+    # recompute every user's counters from the post table in one statement
+    db.session.execute(
+        update(User)
+        .values(
+            post_count=select(func.count(Post.id))
+            .where(Post.user_id == User.id)
+            .scalar_subquery(),
+            last_posted_at=latest_post_date(User.id),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
@@ -0,0 +1,85 @@
+import random
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine
+from sqlalchemy.sql.elements import TextClause
+from flaskblog.engine import engine_options, tune_sqlite
+
+# Read replicas. Each of SQLALCHEMY_REPLICA_URIS gets an engine of its own,
+# pooled and tuned like the primary's. RoutingSession, db.session's class,
+# sends a statement to one of them only when all of these hold:
+#   - it runs inside a GET or HEAD request
+#   - it reads (a SELECT, ORM loads included) and is not part of a flush
+#   - nothing has been written yet in this request
+#   - the client has not written within REPLICA_STICKY_SECONDS, so people see
+#     their own posts and profile changes while the replicas catch up
+# Everything else goes to the primary, as before. Without replicas configured
+# the session behaves exactly like Flask-SQLAlchemy's.
+#
+# The replicas are deliberately not Flask-SQLAlchemy binds: binds get their own
+# metadata, and create_all() would then try to create tables on them.
+
+# set on responses to requests that wrote, the client reads from the primary
+# until it expires
+STICKY_COOKIE = "read_primary"
+READ_METHODS = {"GET", "HEAD"}
+
+
+def is_read(clause):
+    if clause is None:
+        return False
+    if isinstance(clause, TextClause):
+        words = clause.text.split(None, 1)
+        return bool(words) and words[0].upper() in ("SELECT", "WITH")
+    return clause.is_select
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if bind is not None or engine is not self._db.engines.get(None):
+            # an explicit bind or a model with its own bind key
+            return engine
+        if self._flushing or not is_read(clause):
+            g.db_wrote = True
+            return engine
+        return self._replica() or engine
+
+    def _replica(self):
+        if not has_request_context() or request.method not in READ_METHODS:
+            return None
+        if g.get("db_wrote") or request.cookies.get(STICKY_COOKIE):
+            return None
+        if not hasattr(self, "_replica_engine"):
+            # one replica per session, so a request sees a single snapshot
+            replicas = current_app.extensions["replicas"]
+            self._replica_engine = random.choice(replicas) if replicas else None
+        return self._replica_engine
+
+    def close(self):
+        self.__dict__.pop("_replica_engine", None)
+        super().close()
+
+
+def stick_to_primary(response):
+    if g.get("db_wrote"):
+        response.set_cookie(
+            STICKY_COOKIE,
+            "1",
+            max_age=current_app.config["REPLICA_STICKY_SECONDS"],
+            httponly=True,
+            samesite="Lax",
+        )
+    return response
+
+
+def init_app(app):
+    replicas = []
+    for uri in app.config["SQLALCHEMY_REPLICA_URIS"]:
+        engine = create_engine(uri, **engine_options(app.config, uri))
+        if engine.dialect.name == "sqlite":
+            tune_sqlite(engine, app.config)
+        replicas.append(engine)
+    app.extensions["replicas"] = replicas
+    if replicas:
+        app.after_request(stick_to_primary)
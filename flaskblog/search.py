@@ -0,0 +1,233 @@
+import re
+from flask import abort, request
+from markupsafe import Markup, escape
+from sqlalchemy import DDL, event, text
+from flaskblog import db
+from flaskblog.models import Post
+from flaskblog.pagination import FeedPage
+from flaskblog.posts.utils import with_author, without_content
+
+# Full-text search over post titles and contents. The index lives next to the
+# post table and is kept up to date by the post routes (index_post and
+# remove_post run in the same transaction as the change), so it never needs a
+# full rebuild except after bulk loads: "flask search rebuild".
+#
+# SQLite: a standalone FTS5 table post_fts whose rowid is the post id.
+# PostgreSQL: a post_search table holding a weighted tsvector per post, GIN indexed.
+
+# match markers put around hits by the database, turned into <mark> after escaping
+START, STOP = "\x02", "\x03"
+# shortest last word that is also matched as a prefix, FTS5 keeps an index for it
+PREFIX_MIN_LENGTH = 3
+
+SQLITE_SCHEMA = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS post_fts USING fts5("
+    "title, content, tokenize = 'porter unicode61', prefix = '3')"
+]
+POSTGRES_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS post_search ("
+    "post_id INTEGER PRIMARY KEY REFERENCES post (id) ON DELETE CASCADE, "
+    "document TSVECTOR NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS ix_post_search_document "
+    "ON post_search USING GIN (document)",
+]
+
+# created and dropped with the post table, so db.create_all() sets it up too
+for statement in SQLITE_SCHEMA:
+    event.listen(
+        Post.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite")
+    )
+for statement in POSTGRES_SCHEMA:
+    event.listen(
+        Post.__table__, "after_create", DDL(statement).execute_if(dialect="postgresql")
+    )
+event.listen(
+    Post.__table__,
+    "before_drop",
+    DDL("DROP TABLE IF EXISTS post_fts").execute_if(dialect="sqlite"),
+)
+event.listen(
+    Post.__table__,
+    "before_drop",
+    DDL("DROP TABLE IF EXISTS post_search").execute_if(dialect="postgresql"),
+)
+
+
+class SQLiteIndex:
+    def index(self, post):
+        db.session.execute(
+            text("DELETE FROM post_fts WHERE rowid = :id"), {"id": post.id}
+        )
+        db.session.execute(
+            text(
+                "INSERT INTO post_fts (rowid, title, content) "
+                "VALUES (:id, :title, :content)"
+            ),
+            {"id": post.id, "title": post.title, "content": post.content},
+        )
+
+    def remove(self, post_id):
+        db.session.execute(
+            text("DELETE FROM post_fts WHERE rowid = :id"), {"id": post_id}
+        )
+
+    def rebuild(self):
+        db.session.execute(text("DELETE FROM post_fts"))
+        db.session.execute(
+            text(
+                "INSERT INTO post_fts (rowid, title, content) "
+                "SELECT id, title, content FROM post"
+            )
+        )
+        # merge the b-tree segments left by the bulk insert
+        db.session.execute(text("INSERT INTO post_fts (post_fts) VALUES ('optimize')"))
+
+    def query(self, terms):
+        # FTS5 has its own query syntax; quote every word so user input is only
+        # ever a list of terms. The last one also matches as a prefix while the
+        # user is still typing, once it is long enough not to match everything.
+        words = re.findall(r"\w+", terms)
+        if not words:
+            return None
+        query = " ".join(f'"{word}"' for word in words)
+        return query + "*" if len(words[-1]) >= PREFIX_MIN_LENGTH else query
+
+    def search(self, terms, limit, offset):
+        query = self.query(terms)
+        if query is None:
+            return []
+        # bm25 ranks lower is better, a title hit weighs as much as ten in the text
+        return db.session.execute(
+            text(
+                "SELECT rowid, highlight(post_fts, 0, :start, :stop), "
+                "snippet(post_fts, 1, :start, :stop, '…', 24) "
+                "FROM post_fts WHERE post_fts MATCH :query "
+                "ORDER BY bm25(post_fts, 10.0, 1.0), rowid DESC "
+                "LIMIT :limit OFFSET :offset"
+            ),
+            {
+                "query": query,
+                "start": START,
+                "stop": STOP,
+                "limit": limit,
+                "offset": offset,
+            },
+        ).all()
+
+
+class PostgresIndex:
+    DOCUMENT = (
+        "setweight(to_tsvector('english', {title}), 'A') || "
+        "setweight(to_tsvector('english', {content}), 'B')"
+    )
+    HEADLINE = f"StartSel={START}, StopSel={STOP}"
+
+    def index(self, post):
+        document = self.DOCUMENT.format(title=":title", content=":content")
+        db.session.execute(
+            text(
+                f"INSERT INTO post_search (post_id, document) VALUES (:id, {document}) "
+                "ON CONFLICT (post_id) DO UPDATE SET document = excluded.document"
+            ),
+            {"id": post.id, "title": post.title, "content": post.content},
+        )
+
+    def remove(self, post_id):
+        # also covered by ON DELETE CASCADE, explicit for symmetry with SQLite
+        db.session.execute(
+            text("DELETE FROM post_search WHERE post_id = :id"), {"id": post_id}
+        )
+
+    def rebuild(self):
+        document = self.DOCUMENT.format(title="title", content="content")
+        db.session.execute(text("TRUNCATE post_search"))
+        db.session.execute(
+            text(
+                f"INSERT INTO post_search (post_id, document) "
+                f"SELECT id, {document} FROM post"
+            )
+        )
+
+    def search(self, terms, limit, offset):
+        # websearch_to_tsquery accepts any user input without syntax errors;
+        # ts_headline only runs on the rows of the requested page
+        return db.session.execute(
+            text(
+                "WITH hits AS ("
+                " SELECT post_id, ts_rank_cd(document, query) AS rank, query"
+                " FROM post_search, websearch_to_tsquery('english', :terms) query"
+                " WHERE document @@ query"
+                " ORDER BY rank DESC, post_id DESC LIMIT :limit OFFSET :offset) "
+                "SELECT post.id,"
+                " ts_headline('english', post.title, hits.query,"
+                " :title_options),"
+                " ts_headline('english', post.content, hits.query, :options) "
+                "FROM hits JOIN post ON post.id = hits.post_id "
+                "ORDER BY hits.rank DESC, post.id DESC"
+            ),
+            {
+                "terms": terms,
+                "limit": limit,
+                "offset": offset,
+                "title_options": self.HEADLINE + ", HighlightAll=true",
+                "options": self.HEADLINE + ", MaxWords=30, MinWords=12",
+            },
+        ).all()
+
+
+INDEXES = {"sqlite": SQLiteIndex, "postgresql": PostgresIndex}
+
+
+def search_index():
+    return INDEXES[db.engine.dialect.name]()
+
+
+def index_post(post):
+    # call before committing a new or edited post; new posts need a flush first
+    # so they have an id
+    search_index().index(post)
+
+
+def remove_post(post_id):
+    search_index().remove(post_id)
+
+
+def rebuild_index():
+    search_index().rebuild()
+    db.session.commit()
+
+
+def highlight(fragment):
+    # escape the text first, then turn the database's markers into <mark> tags
+    return Markup(
+        str(escape(fragment)).replace(START, "<mark>").replace(STOP, "</mark>")
+    )
+
+
+class SearchResult:
+    def __init__(self, post, title, snippet):
+        self.post = post
+        self.title = highlight(title)
+        self.snippet = highlight(snippet)
+
+
+def search_posts(terms, per_page=10):
+    # ranked results, one page at a time; like the feed, no COUNT(*) is issued
+    page = request.args.get("page", 1, type=int)
+    if page < 1:
+        abort(404)
+    rows = search_index().search(terms, per_page + 1, (page - 1) * per_page)
+    hits = rows[:per_page]
+    posts = {
+        post.id: post
+        for post in Post.query.options(with_author(), without_content()).filter(
+            Post.id.in_([post_id for post_id, _, _ in hits])
+        )
+    }
+    items = [
+        SearchResult(posts[post_id], title, snippet)
+        for post_id, title, snippet in hits
+        # a post deleted between the two queries
+        if post_id in posts
+    ]
+    return FeedPage(items, page=page, has_prev=page > 1, has_next=len(rows) > per_page)
@@ -10,6 +10,7 @@ from wtforms import (
 )
 from wtforms.validators import DataRequired, Length, Email, EqualTo, ValidationError
 from flask_login import current_user
+from flaskblog import db
 from flaskblog.models import User
 
 # ROLE_CHOICES is for both RegistrationForm and UpdateAccountForm
@@ -46,7 +47,42 @@ def name_check(form, field):
         raise ValidationError("Can not contain numbers, spaces, or special characters.")
 
 
-class RegistrationForm(FlaskForm):
+# username and email are unique; one query answers both with EXISTS projections
+def taken_account_fields(username, email, user_id=None):
+    others = User.query
+    if user_id is not None:
+        # the user's own row doesn't count when they edit their account
+        others = others.filter(User.id != user_id)
+    username_taken, email_taken = db.session.query(
+        others.filter(User.username == username).exists(),
+        others.filter(User.email == email).exists(),
+    ).one()
+    return username_taken, email_taken
+
+
+# The unique constraints on user have the final say: routes that commit one of
+# these forms catch IntegrityError and call validate_unique again, which then
+# puts the error on the field a concurrent request took in the meantime.
+class UniqueAccountForm(FlaskForm):
+    def validate(self, extra_validators=None):
+        valid = super().validate(extra_validators)
+        return self.validate_unique() and valid
+
+    def account_user_id(self):
+        return None
+
+    def validate_unique(self):
+        username_taken, email_taken = taken_account_fields(
+            self.username.data, self.email.data, self.account_user_id()
+        )
+        if username_taken:
+            self.username.errors.append("Username already taken, please choose another")
+        if email_taken:
+            self.email.errors.append("email already taken, please choose another")
+        return not (username_taken or email_taken)
+
+
+class RegistrationForm(UniqueAccountForm):
     username = StringField(
         "Username:", validators=[DataRequired(), Length(min=4, max=20)]
     )
@@ -71,18 +107,6 @@ class RegistrationForm(FlaskForm):
     )
     submit = SubmitField("Sign Up")
 
-    # make sure username entered is not already in the data base
-    def validate_username(form, username):
-        user = User.query.filter_by(username=username.data).first()
-        if user:
-            raise ValidationError("Username already taken, please choose another")
-
-    # make sure email entered is not already in the data base
-    def validate_email(form, email):
-        user = User.query.filter_by(email=email.data).first()
-        if user:
-            raise ValidationError("email already taken, please choose another")
-
 
 class LoginForm(FlaskForm):
     email = StringField("Email", validators=[DataRequired(), Email()])
@@ -91,7 +115,7 @@ class LoginForm(FlaskForm):
     submit = SubmitField("Login")
 
 
-class UpdateAccountForm(FlaskForm):
+class UpdateAccountForm(UniqueAccountForm):
     username = StringField(
         "Username:", validators=[DataRequired(), Length(min=4, max=20)]
     )
@@ -113,19 +137,17 @@ class UpdateAccountForm(FlaskForm):
     )
     submit = SubmitField("update")
 
-    # make sure username entered is not already in the data base unless it is the current user's username
-    def validate_username(form, username):
-        if username.data != current_user.username:
-            user = User.query.filter_by(username=username.data).first()
-            if user:
-                raise ValidationError("Username already taken, please choose another")
-
-    # make sure email entered is not already in the data base unless it is the current user's email
-    def validate_email(form, email):
-        if email.data != current_user.email:
-            user = User.query.filter_by(email=email.data).first()
-            if user:
-                raise ValidationError("email already taken, please choose another")
+    def account_user_id(self):
+        return current_user.id
+
+    def validate_unique(self):
+        # keeping the current username and email needs no query
+        if (
+            self.username.data == current_user.username
+            and self.email.data == current_user.email
+        ):
+            return True
+        return super().validate_unique()
 
 
 class RequestResetForm(FlaskForm):
@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt
+from flask import current_app
+from flaskblog.instrumentation import timed
+
+
+class AuthThrottled(Exception):
+    # raised before any hashing when a caller or the hashing pool is over its limit
+    pass
+
+
+class RateLimiter:
+    # Token bucket per key (an IP or an account), refilled continuously at
+    # per_minute / 60 tokens a second. Only the most recently seen max_keys keys
+    # are remembered so a flood of distinct keys cannot grow it without bound.
+    def __init__(self, per_minute, max_keys=10000):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def allow(self, key):
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.pop(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - last) * self.rate)
+            allowed = tokens >= 1
+            self._buckets[key] = (tokens - 1 if allowed else tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return allowed
+
+
+class PasswordHasher:
+    # bcrypt is CPU bound, so all hashing runs on a small dedicated thread pool
+    # (bcrypt releases the GIL while it works). At most AUTH_HASH_MAX_PENDING
+    # hashes may be queued or running; past that callers are turned away instead
+    # of piling up behind the pool.
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions["password_hasher"] = {}
+
+    @property
+    def _state(self):
+        return current_app.extensions["password_hasher"]
+
+    def _limiter(self, kind):
+        with self._lock:
+            if kind not in self._state:
+                per_minute = current_app.config[
+                    f"AUTH_{kind.upper()}_ATTEMPTS_PER_MINUTE"
+                ]
+                self._state[kind] = RateLimiter(per_minute)
+            return self._state[kind]
+
+    def admit(self, ip, account=None):
+        # per-IP and per-account admission control, checked before any hashing
+        if not self._limiter("ip").allow(ip):
+            raise AuthThrottled()
+        if account is not None and not self._limiter("account").allow(account.lower()):
+            raise AuthThrottled()
+
+    def _run(self, func, *args):
+        config = current_app.config
+        state = self._state
+        with self._lock:
+            if "executor" not in state:
+                state["executor"] = ThreadPoolExecutor(
+                    max_workers=config["AUTH_HASH_WORKERS"],
+                    thread_name_prefix="password-hash",
+                )
+                state["slots"] = threading.BoundedSemaphore(
+                    config["AUTH_HASH_MAX_PENDING"]
+                )
+        if not state["slots"].acquire(blocking=False):
+            raise AuthThrottled()
+        try:
+            return state["executor"].submit(func, *args).result()
+        finally:
+            state["slots"].release()
+
+    @timed("bcrypt")
+    def hash_password(self, password):
+        rounds = current_app.config["BCRYPT_LOG_ROUNDS"]
+        return self._run(_hash, password.encode("utf-8"), rounds)
+
+    @timed("bcrypt")
+    def check_password(self, password_hash, password):
+        return self._run(_check, password_hash, password.encode("utf-8"))
+
+    def needs_rehash(self, password_hash):
+        # bcrypt hashes look like $2b$12$..., the 12 being the work factor
+        return int(password_hash[4:6]) != current_app.config["BCRYPT_LOG_ROUNDS"]
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+
+def _check(password_hash, password):
+    try:
+        return bcrypt.checkpw(password, password_hash)
+    except ValueError:
+        return False
@@ -8,8 +8,12 @@ from flask import (
     Blueprint,
 )
 from flask_login import login_user, current_user, logout_user, login_required
-from flaskblog import db, bcrypt
-from flaskblog.models import User, Post
+from sqlalchemy.exc import IntegrityError
+from flaskblog import db, password_hasher, user_cache, fragment_cache
+from flaskblog.conditional import conditional_response
+from flaskblog.models import User
+from flaskblog.pagination import paginate_feed
+from flaskblog.posts.utils import user_feed_query
 from flaskblog.users.forms import (
     RegistrationForm,
     LoginForm,
@@ -17,7 +21,11 @@ from flaskblog.users.forms import (
     RequestResetForm,
     ResetPasswordForm,
 )
+from flaskblog.users.hashing import AuthThrottled
 from flaskblog.users.utils import (
+    InvalidImage,
+    avatar_sources,
+    avatar_url,
     save_picture,
     remove_old_picture,
     send_reset_email,
@@ -25,6 +33,8 @@ from flaskblog.users.utils import (
 )
 
 users = Blueprint("users", __name__, template_folder="templates")
+users.add_app_template_global(avatar_url)
+users.add_app_template_global(avatar_sources)
 
 
 @users.route("/register", methods=["GET", "POST"])
@@ -33,7 +43,15 @@ def register():
         return redirect(url_for("main.home"))
     form = RegistrationForm()
     if form.validate_on_submit():
-        hashed_password = bcrypt.generate_password_hash(form.password.data)
+        try:
+            password_hasher.admit(request.remote_addr)
+            hashed_password = password_hasher.hash_password(form.password.data)
+        except AuthThrottled:
+            flash("Too many attempts, please wait a minute and try again.", "danger")
+            return (
+                render_template("users/register.html", title="Register", form=form),
+                429,
+            )
         user = User(
             username=form.username.data,
             email=form.email.data,
@@ -43,7 +61,14 @@ def register():
             role=form.role.data,
         )
         db.session.add(user)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # a concurrent signup took the username or email after validation
+            db.session.rollback()
+            if form.validate_unique():
+                raise
+            return render_template("users/register.html", title="Register", form=form)
         send_verify_email(user)
         flash(
             f"{form.first_name.data}, a verification email has been sent to your inbox. Please check your email to complete the registration process. In case you do not see the verification email in your inbox, please also check your spam folder.",
@@ -59,21 +84,28 @@ def login():
         return redirect(url_for("main.home"))
     form = LoginForm()
     if form.validate_on_submit():
-        user = User.query.filter_by(email=form.email.data).first()
-        if (
-            user
-            and bcrypt.check_password_hash(user.password, form.password.data)
-            and user.email_verified
-        ):
+        try:
+            password_hasher.admit(request.remote_addr, form.email.data)
+            user = User.query.filter_by(email=form.email.data).first()
+            # exactly one bcrypt verification per attempt
+            password_ok = user is not None and password_hasher.check_password(
+                user.password, form.password.data
+            )
+            if password_ok and password_hasher.needs_rehash(user.password):
+                # the work factor changed since this hash was made
+                user.password = password_hasher.hash_password(form.password.data)
+                db.session.commit()
+        except AuthThrottled:
+            flash(
+                "Too many login attempts, please wait a minute and try again.", "danger"
+            )
+            return render_template("users/login.html", title="Login", form=form), 429
+        if password_ok and user.email_verified:
             login_user(user, remember=form.remember.data)
             flash(f"You are logged in.", "success")
             next_page = request.args.get("next")
             return redirect(next_page) if next_page else redirect(url_for("main.home"))
-        elif (
-            user
-            and bcrypt.check_password_hash(user.password, form.password.data)
-            and not user.email_verified
-        ):
+        elif password_ok:
             flash(
                 "Please verify your email in your inbox and then login again", "danger"
             )
@@ -94,19 +126,48 @@ def logout():
 def account():
     form = UpdateAccountForm()
     if form.validate_on_submit():
+        old_pic = picture_file = current_user.image_file
         if form.picture.data:
-            old_pic = current_user.image_file
-            picture_file = save_picture(form.picture.data)
+            try:
+                picture_file = save_picture(form.picture.data)
+            except InvalidImage as error:
+                form.picture.errors.append(str(error))
+                return render_template("users/account.html", title="Account", form=form)
             current_user.image_file = picture_file
-            remove_old_picture(old_pic)
 
         current_user.username = form.username.data
-        current_user.email = form.email.data
+        new_email = form.email.data if form.email.data != current_user.email else None
+        if new_email:
+            # only switched over once the new address is verified
+            current_user.pending_email = new_email
         current_user.first_name = form.first_name.data
         current_user.last_name = form.last_name.data
         current_user.role = form.role.data
-        db.session.commit()
-        flash("Your account has been updated!", "success")
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # another account took the username or email after validation
+            db.session.rollback()
+            if old_pic != picture_file:
+                # nobody refers to the new upload now
+                remove_old_picture(picture_file)
+            if form.validate_unique():
+                raise
+            return render_template("users/account.html", title="Account", form=form)
+        if old_pic != picture_file:
+            # only once committed, so the old picture's reference count is final
+            remove_old_picture(old_pic)
+        user_cache.invalidate(current_user.id)
+        # post cards show the author's name and picture
+        fragment_cache.bump()
+        if new_email:
+            send_verify_email(current_user, new_email)
+            flash(
+                f"Your account has been updated! Your email address changes to {new_email} once you follow the link we sent there.",
+                "info",
+            )
+        else:
+            flash("Your account has been updated!", "success")
         return redirect(url_for("users.account"))
     elif request.method == "GET":
         form.username.data = current_user.username
@@ -114,22 +175,24 @@ def account():
         form.first_name.data = current_user.first_name
         form.last_name.data = current_user.last_name
         form.role.data = current_user.role
-    image_file = url_for("static", filename="profile_pics/" + current_user.image_file)
-    return render_template(
-        "users/account.html", title="Account", image_file=image_file, form=form
-    )
+    return render_template("users/account.html", title="Account", form=form)
 
 
 @users.route("/user/<string:username>")
 def user_posts(username):
-    page = request.args.get("page", 1, type=int)
     user = User.query.filter_by(username=username).first_or_404()
-    posts = (
-        Post.query.filter_by(author=user)
-        .order_by(Post.date_posted.desc())
-        .paginate(page=page, per_page=7)
+    return conditional_response(
+        lambda: render_template(
+            "users/user_posts.html",
+            # the stored post count sizes the page links, no COUNT(*) needed
+            posts=paginate_feed(
+                user_feed_query(user), per_page=7, total=user.post_count
+            ),
+            user=user,
+        ),
+        # the feed version changes with any post or profile edit
+        ["user_posts", user.id, fragment_cache.version, request.query_string],
     )
-    return render_template("users/user_posts.html", posts=posts, user=user)
 
 
 @users.route("/reset_password", methods=["GET", "POST"])
@@ -161,9 +224,20 @@ def reset_token(token):
         return redirect(url_for("users.reset_request"))
     form = ResetPasswordForm()
     if form.validate_on_submit():
-        hashed_password = bcrypt.generate_password_hash(form.password.data)
+        try:
+            password_hasher.admit(request.remote_addr, user.email)
+            hashed_password = password_hasher.hash_password(form.password.data)
+        except AuthThrottled:
+            flash("Too many attempts, please wait a minute and try again.", "danger")
+            return (
+                render_template(
+                    "users/reset_token.html", title="Reset Password", form=form
+                ),
+                429,
+            )
         user.password = hashed_password
         db.session.commit()
+        user_cache.invalidate(user.id)
         flash(
             f"{user.first_name} your password has been updated!",
             "success",
@@ -174,17 +248,39 @@ def reset_token(token):
 
 @users.route("/verify_email/<token>", methods=["GET", "POST"])
 def verify_token(token):
-    if current_user.is_authenticated:
-        return redirect(url_for("main.home"))
-    user = User.verify_token(token)
-    if user is None:
+    verified = User.verify_email_token(token)
+    if verified is None:
         flash("Invalid or expired token", "warning")
         return redirect(url_for("users.reset_request"))
+    user, email = verified
+    if email == user.pending_email:
+        return confirm_email_change(user)
+    if current_user.is_authenticated:
+        return redirect(url_for("main.home"))
 
     user.email_verified = True
     db.session.commit()
+    user_cache.invalidate(user.id)
     flash(
         f"{user.first_name} your account has been successfully created. you can not login!",
         "success",
     )
     return redirect(url_for("users.login"))
+
+
+def confirm_email_change(user):
+    next_page = url_for(
+        "users.account" if current_user.is_authenticated else "users.login"
+    )
+    user.email = user.pending_email
+    user.pending_email = None
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # another account registered the address in the meantime
+        db.session.rollback()
+        flash("That email address is already in use by another account.", "warning")
+        return redirect(next_page)
+    user_cache.invalidate(user.id)
+    flash(f"Your email address is now {user.email}.", "success")
+    return redirect(next_page)
@@ -1,32 +1,297 @@
+import hashlib
+import multiprocessing
 import os
-import secrets
-from PIL import Image
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
 from flask import url_for
-from flask_mail import Message
-from flaskblog import mail
+from flaskblog import db, mail_queue, fragment_cache, user_cache
+from flaskblog.instrumentation import timed
+from flaskblog.models import User
 from flask import current_app
 
+# file extension, MIME type and encoder options per output format
+AVATAR_FORMATS = {
+    "avif": ("avif", "image/avif", {"quality": 60}),
+    "webp": ("webp", "image/webp", {"quality": 80, "method": 4}),
+    "jpeg": (
+        "jpg",
+        "image/jpeg",
+        {"quality": 85, "optimize": True, "progressive": True},
+    ),
+    "png": ("png", "image/png", {"optimize": True}),
+}
 
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+# Profile pictures are stored by content: the upload's hash is the key and
+# static/profile_pics/<key>/ holds one square variant per AVATAR_SIZES entry
+# and AVATAR_FORMATS entry. Identical uploads share a key, so image_file holds
+# the key. Older users still have a single "<hex>.<ext>" file, as does the
+# default.png placeholder.
+@timed("image")
 def save_picture(form_picture):
-    random_hex = secrets.token_hex(8)
-    _, f_ext = os.path.splitext(form_picture.filename)
-    picture_file_name = random_hex + f_ext
-    picture_path = os.path.join(
-        current_app.root_path, "static/profile_pics", picture_file_name
+    from PIL import Image, UnidentifiedImageError
+
+    max_pixels = current_app.config["AVATAR_MAX_PIXELS"]
+
+    # stream the upload to disk instead of holding it in memory, hashing as we go
+    digest = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(delete=False) as upload:
+        for chunk in iter(lambda: form_picture.stream.read(64 * 1024), b""):
+            digest.update(chunk)
+            upload.write(chunk)
+    key = digest.hexdigest()[:16]
+    if avatar_ready(key) and _claim(key):
+        # somebody uploaded the same file before, share its variants
+        os.remove(upload.name)
+        return key
+
+    # Image.open only reads the header, so the size is checked before any decode
+    try:
+        with Image.open(upload.name) as image:
+            width, height = image.size
+    except (UnidentifiedImageError, OSError):
+        os.remove(upload.name)
+        raise InvalidImage("That file is not an image we can read.")
+    if width * height > max_pixels:
+        os.remove(upload.name)
+        raise InvalidImage("That image is too large.")
+
+    args = (
+        upload.name,
+        _avatar_path(key),
+        current_app.config["AVATAR_SIZES"],
+        current_app.config["AVATAR_FORMATS"],
+        max_pixels,
+    )
+    workers = current_app.config["AVATAR_PROCESS_WORKERS"]
+    if not workers:
+        try:
+            make_variants(*args)
+        except OSError:
+            # a broken file can get past the header check, e.g. a cut-off JPEG
+            raise InvalidImage("That file is not an image we can read.")
+        return key
+
+    # resize in a worker process, avatar_url serves the placeholder meanwhile
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawned, not forked: this process runs other pools and threads
+            # whose locks a forked child would inherit in whatever state
+            _executor = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        executor = _executor
+    try:
+        future = executor.submit(make_variants, *args)
+    except Exception:
+        # e.g. a broken pool, which stays broken; the next upload starts anew
+        os.remove(upload.name)
+        with _executor_lock:
+            if _executor is executor:
+                _executor = None
+        raise
+    app = current_app._get_current_object()
+    future.add_done_callback(lambda future: _thumbnail_done(app, key, future))
+    return key
+
+
+def make_variants(source_path, directory, sizes, formats, max_pixels):
+    # Runs in a worker process. Every variant is written to a .part file first
+    # and renamed into place afterwards; the largest variant in the last
+    # (fallback) format is renamed last and marks the set as complete.
+    from PIL import Image, ImageOps
+
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    largest = max(sizes)
+    os.makedirs(directory, exist_ok=True)
+    written = []
+    try:
+        with Image.open(source_path) as image:
+            if image.format == "JPEG":
+                # let the JPEG decoder downscale while decoding
+                image.draft(image.mode, (largest, largest))
+            image = image.convert("RGB")
+        for size in sorted(sizes):
+            variant = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+            for image_format in formats:
+                extension, _, options = AVATAR_FORMATS[image_format]
+                path = os.path.join(directory, f"{size}.{extension}")
+                variant.save(path + ".part", format=image_format, **options)
+                written.append(path)
+        written.sort(key=lambda path: path == _marker_path(directory, sizes, formats))
+        for path in written:
+            os.replace(path + ".part", path)
+    except BaseException:
+        # leave no half-written variant set behind
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+    finally:
+        os.remove(source_path)
+
+
+def _thumbnail_done(app, key, future):
+    with app.app_context():
+        if future.exception() is not None:
+            app.logger.error(
+                "Creating a profile picture failed.", exc_info=future.exception()
+            )
+            # the variants will never appear, so rather than showing the
+            # placeholder forever, users of the picture go back to the default
+            users = User.query.filter_by(image_file=key)
+            user_ids = [user_id for (user_id,) in users.with_entities(User.id)]
+            users.update({"image_file": "default.png"})
+            db.session.commit()
+            for user_id in user_ids:
+                user_cache.invalidate(user_id)
+        # cached post cards still point at the placeholder
+        fragment_cache.bump()
+
+
+def _avatar_path(image_file):
+    return os.path.join(current_app.root_path, "static/profile_pics", image_file)
+
+
+def _marker_path(directory, sizes, formats):
+    extension = AVATAR_FORMATS[formats[-1]][0]
+    return os.path.join(directory, f"{max(sizes)}.{extension}")
+
+
+def _is_single_file(image_file):
+    # default.png and pictures uploaded before variants existed
+    return "." in image_file
+
+
+def avatar_ready(image_file):
+    if _is_single_file(image_file):
+        return os.path.exists(_avatar_path(image_file))
+    config = current_app.config
+    return os.path.exists(
+        _marker_path(
+            _avatar_path(image_file), config["AVATAR_SIZES"], config["AVATAR_FORMATS"]
+        )
     )
-    output_size = (125, 125)
-    image = Image.open(form_picture)
-    image.thumbnail(output_size)
-    image.save(picture_path)
-    return picture_file_name
+
+
+def avatar_url(image_file, size=None):
+    # URL of the smallest fallback format variant at least `size` pixels wide;
+    # the default picture stands in until a new upload has been resized
+    if not avatar_ready(image_file):
+        image_file = "default.png"
+    if _is_single_file(image_file):
+        return url_for("static", filename="profile_pics/" + image_file)
+    sizes = sorted(current_app.config["AVATAR_SIZES"])
+    size = next((width for width in sizes if width >= (size or 0)), sizes[-1])
+    extension = AVATAR_FORMATS[current_app.config["AVATAR_FORMATS"][-1]][0]
+    return url_for("static", filename=f"profile_pics/{image_file}/{size}.{extension}")
+
+
+def avatar_sources(image_file):
+    # (MIME type, srcset) per stored format, preferred formats first, for the
+    # <source> elements of the avatar macro; nothing for single file pictures
+    if _is_single_file(image_file) or not avatar_ready(image_file):
+        return []
+    sizes = sorted(current_app.config["AVATAR_SIZES"])
+    sources = []
+    for image_format in current_app.config["AVATAR_FORMATS"]:
+        extension, mime_type, _ = AVATAR_FORMATS[image_format]
+        srcset = ", ".join(
+            url_for("static", filename=f"profile_pics/{image_file}/{size}.{extension}")
+            + f" {size}w"
+            for size in sizes
+        )
+        sources.append((mime_type, srcset))
+    return sources
+
+
+def _claim(key):
+    # Marks shared variants as just taken by an upload that has yet to commit
+    # its reference, see remove_old_picture. False once they are being removed.
+    try:
+        os.utime(_avatar_path(key))
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def _recently_claimed(path):
+    age = time.time() - os.stat(path).st_mtime
+    return age < current_app.config["AVATAR_CLAIM_SECONDS"]
 
 
 def remove_old_picture(old_pic):
-    if old_pic != "default.png":
-        os.remove(os.path.join(current_app.root_path, "static/profile_pics", old_pic))
+    # Call after committing the new picture. Identical uploads share their
+    # variants, so they are only deleted once no user refers to them anymore.
+    # Another upload may have claimed them without having committed yet, so
+    # variants claimed within AVATAR_CLAIM_SECONDS are left for the
+    # sweep_profile_pictures job. Returns whether anything was deleted.
+    if old_pic == "default.png":
+        return False
+    in_use = db.session.query(
+        db.session.query(User).filter_by(image_file=old_pic).exists()
+    ).scalar()
+    if in_use:
+        return False
+    path = _avatar_path(old_pic)
+    if _is_single_file(old_pic):
+        # never shared, nothing claims these
+        os.remove(path)
+        return True
+    try:
+        if _recently_claimed(path):
+            return False
+        # moved out of the way first: a claim after the rename fails and its
+        # upload makes new variants, one just before it shows in the mtime
+        doomed = f"{path}.{uuid.uuid4().hex[:8]}.removing"
+        os.rename(path, doomed)
+    except FileNotFoundError:
+        return False
+    if _recently_claimed(doomed):
+        try:
+            os.rename(doomed, path)
+        except OSError:
+            # an upload has already made them again
+            shutil.rmtree(doomed, ignore_errors=True)
+        return False
+    shutil.rmtree(doomed, ignore_errors=True)
+    return True
+
+
+def sweep_pictures():
+    # Deletes stored pictures no user refers to, such as variants that
+    # remove_old_picture left because they had just been claimed, and
+    # returns how many went.
+    root = _avatar_path("")
+    removed = 0
+    for name in os.listdir(root):
+        if name.endswith(".removing"):
+            # left by a removal that was interrupted
+            if not _recently_claimed(os.path.join(root, name)):
+                shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+        elif remove_old_picture(name):
+            removed += 1
+    return removed
+
+
+# unverified accounts created before the cutoff, swept by the cleanup job
+def expired_pending_users(cutoff):
+    return User.query.filter(User.email_verified == False, User.created_at < cutoff)
 
 
 def send_reset_email(user):
+    from flask_mail import Message
+
     token = user.get_reset_token()
     msg = Message(
         "Password Reset Request", sender="shu151343@gmail.com", recipients=[user.email]
@@ -35,16 +300,36 @@ def send_reset_email(user):
 {url_for('users.reset_token', token=token, _external=True)}
 If you did NOT make the request please ignore this email.
     """
-    mail.send(msg)
+    mail_queue.enqueue(msg)
 
 
-def send_verify_email(user):
-    token = user.get_reset_token()
+def send_verify_email(user, email=None):
+    from flask_mail import Message
+
+    # to the account's address after registering, or to a new address it asked for
+    email = email or user.email
+    token = user.get_verify_token(email)
     msg = Message(
-        "Email Verification", sender="shu151343@gmail.com", recipients=[user.email]
+        "Email Verification", sender="shu151343@gmail.com", recipients=[email]
     )
-    msg.body = f"""To complete your registration, please verify your email by visit the following link:
+    msg.body = f"""To verify this email address for your account, please visit the following link:
 {url_for('users.verify_token', token=token, _external=True)}
 If you did NOT make the request please ignore this email.
     """
-    mail.send(msg)
+    mail_queue.enqueue(msg)
+
+
+def send_waitlist_promotion_email(user, event, role):
+    from flask_mail import Message
+
+    # sent from the promotion job, outside any request, so without a link
+    msg = Message(
+        "You have a place at " + event.title,
+        sender="shu151343@gmail.com",
+        recipients=[user.email],
+    )
+    msg.body = f"""A place has become free and you have moved up from the waitlist:
+{event.title}, {event.starts_at:%Y-%m-%d %H:%M} at {event.location}, dancing as {role}.
+If you can no longer come, please cancel your booking so the next person on the waitlist gets the place.
+    """
+    mail_queue.enqueue(msg)
@@ -90,9 +90,16 @@ def run_migrations_online():
                 directives[:] = []
                 logger.info('No changes in schema detected.')
 
+    # the search index tables are managed by flaskblog.search, not the models
+    def include_name(name, type_, parent_names):
+        if type_ == 'table':
+            return not name.startswith(('post_fts', 'post_search'))
+        return True
+
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    conf_args.setdefault("include_name", include_name)
 
     connectable = get_engine()
 
@@ -0,0 +1,30 @@
+"""index event calendar
+
+Revision ID: 0b6e3d94f7a2
+Revises: 5f2c8a91d3e6
+Create Date: 2026-10-18 22:14:09.337620
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0b6e3d94f7a2'
+down_revision = '5f2c8a91d3e6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # the availability columns join the date range index, full events are
+    # then skipped without reading their rows
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.drop_index('ix_event_starts_at_id')
+        batch_op.create_index('ix_event_calendar', ['starts_at', 'id', 'capacity', 'leaders', 'followers', 'max_imbalance'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.drop_index('ix_event_calendar')
+        batch_op.create_index('ix_event_starts_at_id', ['starts_at', 'id'], unique=False)
@@ -0,0 +1,39 @@
+"""add waitlist entry table
+
+Revision ID: 5f2c8a91d3e6
+Revises: e4b9d2a7c5f1
+Create Date: 2026-10-18 21:26:44.902118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5f2c8a91d3e6'
+down_revision = 'e4b9d2a7c5f1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('waitlist_entry',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('event_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('role', sa.String(length=10), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['event_id'], ['event.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('event_id', 'user_id', name='uq_waitlist_event_user')
+    )
+    with op.batch_alter_table('waitlist_entry', schema=None) as batch_op:
+        batch_op.create_index('ix_waitlist_event_role_id', ['event_id', 'role', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('waitlist_entry', schema=None) as batch_op:
+        batch_op.drop_index('ix_waitlist_event_role_id')
+
+    op.drop_table('waitlist_entry')
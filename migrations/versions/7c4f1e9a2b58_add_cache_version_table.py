@@ -0,0 +1,28 @@
+"""add cache version table
+
+Revision ID: 7c4f1e9a2b58
+Revises: 0b6e3d94f7a2
+Create Date: 2026-10-18 23:06:41.518304
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c4f1e9a2b58'
+down_revision = '0b6e3d94f7a2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('cache_version',
+    sa.Column('name', sa.String(length=64), nullable=False),
+    sa.Column('version', sa.Integer(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('cache_version')
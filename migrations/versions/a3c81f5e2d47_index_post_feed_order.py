@@ -0,0 +1,26 @@
+"""index post feed order
+
+Revision ID: a3c81f5e2d47
+Revises: 6416bf1fa3ac
+Create Date: 2026-10-18 10:12:41.318207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c81f5e2d47'
+down_revision = '6416bf1fa3ac'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.create_index('ix_post_date_posted_id', ['date_posted', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.drop_index('ix_post_date_posted_id')
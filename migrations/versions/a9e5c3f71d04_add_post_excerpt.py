@@ -0,0 +1,66 @@
+"""add post excerpt
+
+Revision ID: a9e5c3f71d04
+Revises: d46e8f1a2b39
+Create Date: 2026-10-18 19:05:12.630417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9e5c3f71d04'
+down_revision = 'd46e8f1a2b39'
+branch_labels = None
+depends_on = None
+
+# a frozen copy of flaskblog.models.make_excerpt, so this revision does not
+# change when the application code does
+EXCERPT_LENGTH = 300
+BATCH = 1000
+
+
+def make_excerpt(content):
+    text = " ".join(content.split())
+    if len(text) <= EXCERPT_LENGTH:
+        return text
+    cut = text[:EXCERPT_LENGTH]
+    if " " in cut:
+        cut = cut[: cut.rindex(" ")]
+    return cut.rstrip(".,;:!?") + "…"
+
+
+def upgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('excerpt', sa.String(length=EXCERPT_LENGTH + 1), nullable=True))
+
+    # backfill in id order, a batch at a time, so the post bodies are never
+    # all in memory at once
+    post = sa.table('post', sa.column('id', sa.Integer), sa.column('content', sa.Text),
+                    sa.column('excerpt', sa.String))
+    connection = op.get_bind()
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(post.c.id, post.c.content)
+            .where(post.c.id > last_id)
+            .order_by(post.c.id)
+            .limit(BATCH)
+        ).all()
+        if not rows:
+            break
+        connection.execute(
+            post.update().where(post.c.id == sa.bindparam('post_id')),
+            [{'post_id': id, 'excerpt': make_excerpt(content)} for id, content in rows],
+        )
+        last_id = rows[-1].id
+
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.alter_column('excerpt', existing_type=sa.String(length=EXCERPT_LENGTH + 1),
+                              nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.drop_column('excerpt')
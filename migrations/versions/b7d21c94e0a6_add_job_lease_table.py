@@ -0,0 +1,33 @@
+"""add job lease table
+
+Revision ID: b7d21c94e0a6
+Revises: f3a07c2e61b5
+Create Date: 2026-10-18 16:05:12.318240
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d21c94e0a6'
+down_revision = 'f3a07c2e61b5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('job_lease',
+    sa.Column('name', sa.String(length=64), nullable=False),
+    sa.Column('holder', sa.String(length=120), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.Column('runs', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('last_started_at', sa.DateTime(), nullable=True),
+    sa.Column('last_duration', sa.Float(), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('job_lease')
@@ -0,0 +1,42 @@
+"""add user post counters
+
+Revision ID: c18f6d0a7e52
+Revises: a9e5c3f71d04
+Create Date: 2026-10-18 19:48:31.274906
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c18f6d0a7e52'
+down_revision = 'a9e5c3f71d04'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('post_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('last_posted_at', sa.DateTime(), nullable=True))
+
+    # the counters start out from the posts that already exist
+    user = sa.table('user', sa.column('id'), sa.column('post_count'), sa.column('last_posted_at'))
+    post = sa.table('post', sa.column('id'), sa.column('user_id'), sa.column('date_posted'))
+    op.execute(
+        user.update().values(
+            post_count=sa.select(sa.func.count(post.c.id))
+            .where(post.c.user_id == user.c.id)
+            .scalar_subquery(),
+            last_posted_at=sa.select(sa.func.max(post.c.date_posted))
+            .where(post.c.user_id == user.c.id)
+            .scalar_subquery(),
+        )
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('last_posted_at')
+        batch_op.drop_column('post_count')
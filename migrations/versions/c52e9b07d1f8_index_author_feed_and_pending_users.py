@@ -0,0 +1,32 @@
+"""index author feed and pending users
+
+Revision ID: c52e9b07d1f8
+Revises: a3c81f5e2d47
+Create Date: 2026-10-18 11:02:15.774310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c52e9b07d1f8'
+down_revision = 'a3c81f5e2d47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.create_index('ix_post_user_id_date_posted_id', ['user_id', 'date_posted', 'id'], unique=False)
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.create_index('ix_user_email_verified_created_at', ['email_verified', 'created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_email_verified_created_at')
+
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.drop_index('ix_post_user_id_date_posted_id')
@@ -0,0 +1,43 @@
+"""add post search index
+
+Revision ID: d46e8f1a2b39
+Revises: b7d21c94e0a6
+Create Date: 2026-10-18 17:32:48.904115
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd46e8f1a2b39'
+down_revision = 'b7d21c94e0a6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # the index is filled with the posts that already exist
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute("CREATE VIRTUAL TABLE IF NOT EXISTS post_fts USING fts5("
+                   "title, content, tokenize = 'porter unicode61', prefix = '3')")
+        op.execute("INSERT INTO post_fts (rowid, title, content) "
+                   "SELECT id, title, content FROM post")
+    elif dialect == 'postgresql':
+        op.execute("CREATE TABLE IF NOT EXISTS post_search ("
+                   "post_id INTEGER PRIMARY KEY REFERENCES post (id) ON DELETE CASCADE, "
+                   "document TSVECTOR NOT NULL)")
+        op.execute("CREATE INDEX IF NOT EXISTS ix_post_search_document "
+                   "ON post_search USING GIN (document)")
+        op.execute("INSERT INTO post_search (post_id, document) "
+                   "SELECT id, setweight(to_tsvector('english', title), 'A') || "
+                   "setweight(to_tsvector('english', content), 'B') FROM post")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute('DROP TABLE IF EXISTS post_fts')
+    elif dialect == 'postgresql':
+        op.execute('DROP TABLE IF EXISTS post_search')
@@ -0,0 +1,26 @@
+"""add user admin flag
+
+Revision ID: e2a9d6b04c71
+Revises: 7c4f1e9a2b58
+Create Date: 2026-10-18 23:58:12.904417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2a9d6b04c71'
+down_revision = '7c4f1e9a2b58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('is_admin', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('is_admin')
@@ -0,0 +1,58 @@
+"""add event and booking tables
+
+Revision ID: e4b9d2a7c5f1
+Revises: c18f6d0a7e52
+Create Date: 2026-10-18 20:41:07.581362
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b9d2a7c5f1'
+down_revision = 'c18f6d0a7e52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('event',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('title', sa.String(length=100), nullable=False),
+    sa.Column('description', sa.Text(), nullable=False),
+    sa.Column('location', sa.String(length=120), nullable=False),
+    sa.Column('starts_at', sa.DateTime(), nullable=False),
+    sa.Column('organizer_id', sa.Integer(), nullable=False),
+    sa.Column('capacity', sa.Integer(), nullable=False),
+    sa.Column('max_imbalance', sa.Integer(), nullable=False),
+    sa.Column('leaders', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('followers', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.CheckConstraint('leaders >= 0 AND followers >= 0', name='ck_event_counts'),
+    sa.CheckConstraint('leaders + followers <= capacity', name='ck_event_capacity'),
+    sa.ForeignKeyConstraint(['organizer_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.create_index('ix_event_starts_at_id', ['starts_at', 'id'], unique=False)
+
+    op.create_table('booking',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('event_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('role', sa.String(length=10), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['event_id'], ['event.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('event_id', 'user_id', name='uq_booking_event_user')
+    )
+
+
+def downgrade():
+    op.drop_table('booking')
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.drop_index('ix_event_starts_at_id')
+
+    op.drop_table('event')
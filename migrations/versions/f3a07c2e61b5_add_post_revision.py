@@ -0,0 +1,26 @@
+"""add post revision
+
+Revision ID: f3a07c2e61b5
+Revises: e81d4a6b9c03
+Create Date: 2026-10-18 14:21:37.502118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a07c2e61b5'
+down_revision = 'e81d4a6b9c03'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('revision', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.drop_column('revision')
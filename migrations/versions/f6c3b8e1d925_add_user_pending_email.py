@@ -0,0 +1,26 @@
+"""add user pending email
+
+Revision ID: f6c3b8e1d925
+Revises: e2a9d6b04c71
+Create Date: 2026-10-19 10:14:37.280951
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f6c3b8e1d925'
+down_revision = 'e2a9d6b04c71'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('pending_email', sa.String(length=120), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('pending_email')
@@ -0,0 +1,424 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import url_for
+from sqlalchemy import func
+from flaskblog import create_app, db, bcrypt
+from flaskblog.bookings.utils import (
+    BookingRefused,
+    book,
+    cancel,
+    join_waitlist,
+    leave_waitlist,
+)
+from flaskblog.config import Config
+from flaskblog.jobs import promote_waitlists
+from flaskblog.models import Booking, Event, OutboxEmail, User, WaitlistEntry
+
+
+class TestBase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config["TESTING"] = True
+        self.app.config["WTF_CSRF_ENABLED"] = False
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        self.app.config["SERVER_NAME"] = "localhost.localdomain"
+        self.app.config["BCRYPT_LOG_ROUNDS"] = 4
+        self.app.config["MAIL_QUEUE_TRANSPORT"] = "local"
+        self.app.config["MAIL_QUEUE_WORKERS"] = 0
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            hashed_password = bcrypt.generate_password_hash("password")
+            for name, role in (
+                ("leader", "Leader"),
+                ("follower", "Follower"),
+                ("both", "Both"),
+                ("leader2", "Leader"),
+                ("follower2", "Follower"),
+            ):
+                db.session.add(
+                    User(
+                        username=name,
+                        email=f"{name}@example.com",
+                        password=hashed_password,
+                        email_verified=True,
+                        first_name="Test_first_name",
+                        last_name="Test_last_name",
+                        role=role,
+                    )
+                )
+            db.session.add(
+                Event(
+                    title="Milonga",
+                    location="Town hall",
+                    starts_at=datetime.utcnow() + timedelta(days=7),
+                    capacity=2,
+                    max_imbalance=1,
+                    organizer_id=1,
+                )
+            )
+            db.session.commit()
+
+    def tearDown(self) -> None:
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def login(self, name):
+        self.client.post(
+            url_for("users.login"),
+            data={"email": f"{name}@example.com", "password": "password"},
+        )
+
+    def event(self):
+        return db.session.get(Event, 1)
+
+    def user(self, name):
+        return User.query.filter_by(username=name).one()
+
+
+class TestBooking(TestBase):
+    def test_book_counts_the_role(self):
+        with self.app.app_context():
+            booking = book(self.event(), self.user("leader"), "Leader")
+            self.assertEqual(booking.role, "Leader")
+            event = self.event()
+            self.assertEqual((event.leaders, event.followers), (1, 0))
+
+    def test_role_must_match_the_profile(self):
+        with self.app.app_context():
+            with self.assertRaises(BookingRefused):
+                book(self.event(), self.user("leader"), "Follower")
+            book(self.event(), self.user("both"), "Follower")
+            self.assertEqual(self.event().followers, 1)
+
+    def test_ratio_is_kept(self):
+        with self.app.app_context():
+            self.event().capacity = 10
+            db.session.commit()
+            book(self.event(), self.user("leader"), "Leader")
+            with self.assertRaisesRegex(BookingRefused, "enough leaders"):
+                book(self.event(), self.user("both"), "Leader")
+            self.assertEqual(self.event().leaders, 1)
+            self.assertEqual(Booking.query.count(), 1)
+
+    def test_full_event_refuses(self):
+        with self.app.app_context():
+            book(self.event(), self.user("leader"), "Leader")
+            book(self.event(), self.user("follower"), "Follower")
+            with self.assertRaisesRegex(BookingRefused, "full"):
+                book(self.event(), self.user("both"), "Follower")
+            self.assertEqual(self.event().booked, 2)
+
+    def test_booking_twice_refuses(self):
+        with self.app.app_context():
+            self.event().capacity = 10
+            db.session.commit()
+            book(self.event(), self.user("both"), "Leader")
+            with self.assertRaisesRegex(BookingRefused, "already booked"):
+                book(self.event(), self.user("both"), "Follower")
+            event = self.event()
+            self.assertEqual((event.leaders, event.followers), (1, 0))
+
+    def test_cancel_gives_the_place_back(self):
+        with self.app.app_context():
+            book(self.event(), self.user("leader"), "Leader")
+            cancel(self.event(), self.user("leader"))
+            self.assertEqual(self.event().booked, 0)
+            self.assertEqual(Booking.query.count(), 0)
+            with self.assertRaises(BookingRefused):
+                cancel(self.event(), self.user("leader"))
+            self.assertEqual(self.event().leaders, 0)
+
+    def test_past_events_refuse(self):
+        with self.app.app_context():
+            self.event().starts_at = datetime.utcnow() - timedelta(hours=1)
+            db.session.commit()
+            with self.assertRaisesRegex(BookingRefused, "started"):
+                book(self.event(), self.user("leader"), "Leader")
+
+
+class TestBookingRoutes(TestBase):
+    def test_events_list(self):
+        with self.app.app_context():
+            response = self.client.get(url_for("bookings.events"))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"Milonga", response.data)
+        self.assertIn(b"2 of 2 places left", response.data)
+
+    def test_create_event(self):
+        with self.app.app_context():
+            self.login("leader")
+            response = self.client.post(
+                url_for("bookings.new_event"),
+                data={
+                    "title": "Practica",
+                    "location": "Studio",
+                    "starts_at": "2099-01-01T20:00",
+                    "capacity": "20",
+                    "max_imbalance": "2",
+                },
+                follow_redirects=True,
+            )
+            self.assertIn(b"Your event has been created.", response.data)
+            event = Event.query.filter_by(title="Practica").one()
+            self.assertEqual(event.organizer.username, "leader")
+            self.assertEqual(event.starts_at, datetime(2099, 1, 1, 20, 0))
+
+    def test_book_and_cancel(self):
+        with self.app.app_context():
+            self.login("follower")
+            response = self.client.post(
+                url_for("bookings.book_event", event_id=1),
+                data={"role": "Follower"},
+                follow_redirects=True,
+            )
+            self.assertIn(b"You are booked as Follower.", response.data)
+            self.assertIn(b"Cancel booking", response.data)
+            response = self.client.post(
+                url_for("bookings.cancel_booking", event_id=1), follow_redirects=True
+            )
+            self.assertIn(b"Your booking has been cancelled.", response.data)
+            self.assertEqual(self.event().followers, 0)
+
+    def test_refusal_is_flashed(self):
+        with self.app.app_context():
+            self.event().starts_at = datetime.utcnow() - timedelta(hours=1)
+            db.session.commit()
+            self.login("leader")
+            response = self.client.post(
+                url_for("bookings.book_event", event_id=1),
+                data={"role": "Leader"},
+                follow_redirects=True,
+            )
+            self.assertIn(b"This event has already started.", response.data)
+            self.assertEqual(self.event().booked, 0)
+
+    def test_booking_needs_login(self):
+        with self.app.app_context():
+            response = self.client.post(url_for("bookings.book_event", event_id=1))
+        self.assertEqual(response.status_code, 302)
+
+
+class TestWaitlist(TestBase):
+    def fill(self):
+        book(self.event(), self.user("leader"), "Leader")
+        book(self.event(), self.user("follower"), "Follower")
+
+    def test_promotion_after_cancel(self):
+        with self.app.app_context():
+            self.fill()
+            join_waitlist(self.event(), self.user("leader2"), "Leader")
+            cancel(self.event(), self.user("leader"))
+            # the cancelling request leaves the place to the job
+            self.assertEqual(self.event().leaders, 0)
+            promote_waitlists()
+            event = self.event()
+            self.assertEqual((event.leaders, event.followers), (1, 1))
+            booking = Booking.query.filter_by(user_id=self.user("leader2").id).one()
+            self.assertEqual(booking.role, "Leader")
+            self.assertEqual(WaitlistEntry.query.count(), 0)
+            email = OutboxEmail.query.one()
+            self.assertEqual(email.recipients, "leader2@example.com")
+            self.assertIn("Milonga", email.subject)
+
+    def test_first_come_first_served(self):
+        with self.app.app_context():
+            self.fill()
+            join_waitlist(self.event(), self.user("both"), "Follower")
+            join_waitlist(self.event(), self.user("follower2"), "Follower")
+            cancel(self.event(), self.user("follower"))
+            promote_waitlists()
+            self.assertIsNotNone(
+                Booking.query.filter_by(user_id=self.user("both").id).first()
+            )
+            self.assertEqual(WaitlistEntry.query.one().user, self.user("follower2"))
+
+    def test_ratio_skips_to_the_compatible_role(self):
+        with self.app.app_context():
+            self.event().capacity = 3
+            db.session.commit()
+            self.fill()
+            book(self.event(), self.user("both"), "Leader")
+            join_waitlist(self.event(), self.user("leader2"), "Leader")
+            join_waitlist(self.event(), self.user("follower2"), "Follower")
+            cancel(self.event(), self.user("follower"))
+            promote_waitlists()
+            event = self.event()
+            self.assertEqual((event.leaders, event.followers), (2, 1))
+            self.assertIsNotNone(
+                Booking.query.filter_by(user_id=self.user("follower2").id).first()
+            )
+            # still first in line for leaders
+            self.assertEqual(WaitlistEntry.query.one().user, self.user("leader2"))
+
+    def test_booking_does_not_jump_the_queue(self):
+        with self.app.app_context():
+            self.fill()
+            join_waitlist(self.event(), self.user("leader2"), "Leader")
+            cancel(self.event(), self.user("leader"))
+            with self.assertRaisesRegex(BookingRefused, "waiting"):
+                book(self.event(), self.user("both"), "Leader")
+            # the head of the queue may take the place itself
+            book(self.event(), self.user("leader2"), "Leader")
+            self.assertEqual(WaitlistEntry.query.count(), 0)
+
+    def test_leave_and_rejoin(self):
+        with self.app.app_context():
+            self.fill()
+            join_waitlist(self.event(), self.user("leader2"), "Leader")
+            with self.assertRaisesRegex(BookingRefused, "already on the waitlist"):
+                join_waitlist(self.event(), self.user("leader2"), "Leader")
+            leave_waitlist(self.event(), self.user("leader2"))
+            self.assertEqual(WaitlistEntry.query.count(), 0)
+            with self.assertRaises(BookingRefused):
+                join_waitlist(self.event(), self.user("leader"), "Leader")
+
+    def test_no_waitlist_while_a_place_is_free(self):
+        with self.app.app_context():
+            with self.assertRaisesRegex(BookingRefused, "please book it"):
+                join_waitlist(self.event(), self.user("leader"), "Leader")
+            book(self.event(), self.user("leader"), "Leader")
+            # a place is left, but the ratio keeps a second leader out
+            join_waitlist(self.event(), self.user("leader2"), "Leader")
+            with self.assertRaisesRegex(BookingRefused, "please book it"):
+                join_waitlist(self.event(), self.user("follower"), "Follower")
+            self.assertEqual(WaitlistEntry.query.count(), 1)
+
+    def test_joining_behind_others_for_a_freed_place(self):
+        with self.app.app_context():
+            self.fill()
+            join_waitlist(self.event(), self.user("leader2"), "Leader")
+            cancel(self.event(), self.user("leader"))
+            # the place is free but leader2 queues for it, so both may wait
+            join_waitlist(self.event(), self.user("both"), "Leader")
+            self.assertEqual(WaitlistEntry.query.count(), 2)
+
+    def test_nothing_to_promote(self):
+        with self.app.app_context():
+            self.fill()
+            join_waitlist(self.event(), self.user("leader2"), "Leader")
+            promote_waitlists()
+            self.assertEqual(WaitlistEntry.query.count(), 1)
+            self.assertEqual(OutboxEmail.query.count(), 0)
+
+    def test_join_and_leave_routes(self):
+        with self.app.app_context():
+            self.fill()
+            self.login("leader2")
+            response = self.client.post(
+                url_for("bookings.join_event_waitlist", event_id=1),
+                data={"role": "Leader"},
+                follow_redirects=True,
+            )
+            self.assertIn(b"You are on the waitlist", response.data)
+            self.assertIn(b"number 1 on the waitlist as Leader", response.data)
+            response = self.client.post(
+                url_for("bookings.leave_event_waitlist", event_id=1),
+                follow_redirects=True,
+            )
+            self.assertIn(b"You have left the waitlist.", response.data)
+
+
+class TestConcurrentBooking(unittest.TestCase):
+    # Thousands of sign-ups race for one event from many threads, each with its
+    # own connection to a shared SQLite file, as separate workers would.
+    USERS = 1500
+    THREADS = 16
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        directory = self.directory
+
+        class StressConfig(Config):
+            SQLALCHEMY_DATABASE_URI = "sqlite:///" + os.path.join(
+                directory, "stress.db"
+            )
+            TESTING = True
+            DB_POOL_SIZE = 16
+
+        self.app = create_app(StressConfig)
+        with self.app.app_context():
+            db.create_all()
+            roles = ("Leader", "Follower", "Both")
+            db.session.execute(
+                User.__table__.insert(),
+                [
+                    {
+                        "username": f"dancer{number}",
+                        "email": f"dancer{number}@example.com",
+                        "password": b"x",
+                        "email_verified": True,
+                        "first_name": "Test_first_name",
+                        "last_name": "Test_last_name",
+                        "role": roles[number % 3],
+                    }
+                    for number in range(self.USERS)
+                ],
+            )
+            db.session.add(
+                Event(
+                    title="Marathon",
+                    location="Town hall",
+                    starts_at=datetime.utcnow() + timedelta(days=7),
+                    capacity=101,
+                    max_imbalance=3,
+                    organizer_id=1,
+                )
+            )
+            db.session.commit()
+
+    def tearDown(self) -> None:
+        with self.app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        shutil.rmtree(self.directory)
+
+    def attempt(self, user_id):
+        with self.app.app_context():
+            try:
+                user = db.session.get(User, user_id)
+                role = user.role
+                if role == "Both":
+                    role = random.choice(("Leader", "Follower"))
+                book(db.session.get(Event, 1), user, role)
+                return "booked"
+            except BookingRefused:
+                return "refused"
+            finally:
+                db.session.remove()
+
+    def test_no_oversell(self):
+        # every dancer tries twice, the second attempt always races the first
+        attempts = list(range(1, self.USERS + 1)) * 2
+        random.shuffle(attempts)
+        with ThreadPoolExecutor(self.THREADS) as pool:
+            outcomes = list(pool.map(self.attempt, attempts))
+
+        with self.app.app_context():
+            event = db.session.get(Event, 1)
+            per_role = dict(
+                db.session.query(Booking.role, func.count())
+                .group_by(Booking.role)
+                .all()
+            )
+            self.assertEqual(outcomes.count("booked"), event.capacity)
+            self.assertEqual(event.booked, event.capacity)
+            self.assertEqual(Booking.query.count(), event.capacity)
+            self.assertEqual(per_role.get("Leader", 0), event.leaders)
+            self.assertEqual(per_role.get("Follower", 0), event.followers)
+            self.assertLessEqual(
+                abs(event.leaders - event.followers), event.max_imbalance
+            )
+            self.assertEqual(
+                db.session.query(Booking.user_id).distinct().count(), event.capacity
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
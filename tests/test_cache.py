@@ -0,0 +1,143 @@
+import unittest
+from contextlib import contextmanager
+from unittest.mock import patch
+from flask import url_for
+from sqlalchemy import event
+from flaskblog import create_app, db, bcrypt, user_cache
+from flaskblog.cache import LRUCache, DictBackend
+from flaskblog.models import User
+
+
+class TestBase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config["TESTING"] = True
+        self.app.config["WTF_CSRF_ENABLED"] = False
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        self.app.config["SERVER_NAME"] = "localhost.localdomain"
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            hashed_password = bcrypt.generate_password_hash("password")
+            user = User(
+                username="testuser",
+                email="test@example.com",
+                password=hashed_password,
+                email_verified=True,
+                first_name="Test_first_name",
+                last_name="Test_last_name",
+                role="Follower",
+            )
+            db.session.add(user)
+            db.session.commit()
+
+    def tearDown(self) -> None:
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    @contextmanager
+    def count_statements(self):
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", record)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, "before_cursor_execute", record)
+
+    def login(self):
+        response = self.client.post(
+            url_for("users.login"),
+            data={"email": "test@example.com", "password": "password"},
+        )
+        self.assertEqual(response.status_code, 302)
+
+
+class TestIdentityCache(TestBase):
+    def test_cached_user_needs_no_query(self):
+        with self.app.app_context():
+            self.login()
+            self.client.get(url_for("main.about"))
+            with self.count_statements() as statements:
+                response = self.client.get(url_for("main.about"))
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(b"Logout", response.data)
+            self.assertEqual(statements, [])
+
+    def test_account_update_invalidates_cached_user(self):
+        with self.app.app_context():
+            self.login()
+            self.client.get(url_for("users.account"))
+            response = self.client.post(
+                url_for("users.account"),
+                data={
+                    "username": "renamed",
+                    "email": "test@example.com",
+                    "first_name": "New",
+                    "last_name": "Name",
+                    "role": "Leader",
+                },
+            )
+            self.assertEqual(response.status_code, 302)
+            response = self.client.get(url_for("users.account"))
+            self.assertIn(b"renamed", response.data)
+            self.assertIn(b"Leader", response.data)
+
+    def test_cached_user_can_be_updated(self):
+        with self.app.test_request_context():
+            user_id = User.query.first().id
+            user_cache.load(user_id)
+            db.session.remove()
+            user = user_cache.load(user_id)
+            user.first_name = "Changed"
+            db.session.commit()
+            db.session.remove()
+            self.assertEqual(db.session.get(User, user_id).first_name, "Changed")
+
+    def test_password_is_not_cached(self):
+        with self.app.app_context():
+            user = User.query.first()
+            user_cache.load(user.id)
+            cached = user_cache.backend.get(f"user:{user.id}")
+            self.assertNotIn("password", cached)
+
+    def test_shared_backend_invalidates_across_apps(self):
+        shared = DictBackend()
+        other_app = create_app()
+        for app in (self.app, other_app):
+            app.config["USER_CACHE_BACKEND"] = shared
+        with self.app.app_context():
+            user_id = User.query.first().id
+            user_cache.load(user_id)
+        with other_app.app_context():
+            user_cache.invalidate(user_id)
+        self.assertIsNone(shared.get(f"user:{user_id}"))
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
+
+    def test_entries_expire(self):
+        cache = LRUCache(ttl=10)
+        with patch("flaskblog.cache.time.monotonic", return_value=100):
+            cache.set("a", 1)
+        with patch("flaskblog.cache.time.monotonic", return_value=105):
+            self.assertEqual(cache.get("a"), 1)
+        with patch("flaskblog.cache.time.monotonic", return_value=111):
+            self.assertIsNone(cache.get("a"))
+
+
+if __name__ == "__main__":
+    unittest.main()
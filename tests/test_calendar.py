@@ -0,0 +1,158 @@
+import unittest
+import unittest.mock
+from datetime import datetime, timedelta
+from flask import url_for
+from flaskblog import create_app, db, bcrypt
+from flaskblog.bookings.calendar import ical_line, open_events
+from flaskblog.models import Event, User
+
+
+class TestBase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config["TESTING"] = True
+        self.app.config["WTF_CSRF_ENABLED"] = False
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        self.app.config["SERVER_NAME"] = "localhost.localdomain"
+        self.app.config["BCRYPT_LOG_ROUNDS"] = 4
+        self.client = self.app.test_client()
+        self.soon = datetime.utcnow().replace(microsecond=0) + timedelta(days=3)
+        with self.app.app_context():
+            db.create_all()
+            hashed_password = bcrypt.generate_password_hash("password")
+            db.session.add(
+                User(
+                    username="testuser",
+                    email="test@example.com",
+                    password=hashed_password,
+                    email_verified=True,
+                    first_name="Test_first_name",
+                    last_name="Test_last_name",
+                    role="Leader",
+                )
+            )
+            for title, days, leaders, followers in (
+                ("Open", 0, 1, 1),
+                ("Full", 1, 2, 2),
+                ("Too many leaders", 2, 2, 0),
+                ("Next month", 30, 0, 0),
+            ):
+                db.session.add(
+                    Event(
+                        title=title,
+                        description="Bring shoes; all levels, welcome",
+                        location="Town hall",
+                        starts_at=self.soon + timedelta(days=days),
+                        capacity=4,
+                        max_imbalance=2,
+                        leaders=leaders,
+                        followers=followers,
+                        organizer_id=1,
+                    )
+                )
+            db.session.commit()
+
+    def tearDown(self) -> None:
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def titles(self, rows):
+        return [row.title for row in rows]
+
+
+class TestOpenEvents(TestBase):
+    def test_only_events_with_room(self):
+        with self.app.app_context():
+            rows = open_events(datetime.utcnow()).all()
+            self.assertEqual(
+                self.titles(rows), ["Open", "Too many leaders", "Next month"]
+            )
+
+    def test_role_must_fit_the_ratio(self):
+        with self.app.app_context():
+            now = datetime.utcnow()
+            self.assertEqual(
+                self.titles(open_events(now, role="Leader")), ["Open", "Next month"]
+            )
+            self.assertEqual(
+                self.titles(open_events(now, role="Both")),
+                ["Open", "Too many leaders", "Next month"],
+            )
+
+    def test_date_range(self):
+        with self.app.app_context():
+            rows = open_events(self.soon, self.soon + timedelta(days=7)).all()
+            self.assertEqual(self.titles(rows), ["Open", "Too many leaders"])
+
+
+class TestCalendarEndpoints(TestBase):
+    def test_json(self):
+        with self.app.app_context():
+            response = self.client.get(url_for("bookings.events_json", role="Follower"))
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(
+            [event["title"] for event in data["events"]],
+            ["Open", "Too many leaders", "Next month"],
+        )
+        self.assertEqual(data["events"][0]["places_left"], 2)
+        self.assertIsNone(data["next"])
+
+    def test_json_defaults_to_the_users_role(self):
+        with self.app.app_context():
+            self.client.post(
+                url_for("users.login"),
+                data={"email": "test@example.com", "password": "password"},
+            )
+            response = self.client.get(url_for("bookings.events_json"))
+        titles = [event["title"] for event in response.get_json()["events"]]
+        self.assertEqual(titles, ["Open", "Next month"])
+
+    def test_json_pages_with_a_cursor(self):
+        with self.app.app_context(), unittest.mock.patch(
+            "flaskblog.bookings.routes.EVENTS_PER_RESPONSE", 2
+        ):
+            data = self.client.get(url_for("bookings.events_json")).get_json()
+            self.assertEqual(len(data["events"]), 2)
+            data = self.client.get(data["next"]).get_json()
+        self.assertEqual([event["title"] for event in data["events"]], ["Next month"])
+        self.assertIsNone(data["next"])
+
+    def test_bad_parameters(self):
+        with self.app.app_context():
+            for args in ({"from": "tomorrow"}, {"role": "Teacher"}):
+                response = self.client.get(url_for("bookings.events_json", **args))
+                self.assertEqual(response.status_code, 400)
+
+    def test_ics_feed(self):
+        with self.app.app_context():
+            response = self.client.get(
+                url_for(
+                    "bookings.events_ics",
+                    to=(self.soon + timedelta(days=7)).isoformat(),
+                )
+            )
+            self.assertTrue(response.is_streamed)
+            # streamed, so read while the request's context is still around
+            text = response.get_data(as_text=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "text/calendar")
+        self.assertTrue(text.startswith("BEGIN:VCALENDAR\r\n"))
+        self.assertTrue(text.endswith("END:VCALENDAR\r\n"))
+        self.assertEqual(text.count("BEGIN:VEVENT"), 2)
+        self.assertIn("SUMMARY:Open\r\n", text)
+        self.assertIn("UID:event-1@localhost.localdomain\r\n", text)
+        self.assertIn(f"DTSTART:{self.soon:%Y%m%dT%H%M%S}Z\r\n", text)
+        self.assertIn(r"DESCRIPTION:Bring shoes\; all levels\, welcome" + "\r\n", text)
+
+    def test_long_lines_are_folded(self):
+        line = ical_line("SUMMARY", "é" * 100)
+        parts = line[:-2].split("\r\n ")
+        self.assertEqual("".join(parts), "SUMMARY:" + "é" * 100)
+        for part in parts:
+            self.assertLessEqual(len(part.encode()), 75)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,211 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+from flask import url_for
+from flaskblog import create_app, db, bcrypt, fragment_cache
+from flaskblog.config import Config
+from flaskblog.models import User, Post
+
+
+class TestBase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config["TESTING"] = True
+        self.app.config["WTF_CSRF_ENABLED"] = False
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        self.app.config["SERVER_NAME"] = "localhost.localdomain"
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            hashed_password = bcrypt.generate_password_hash("password")
+            user = User(
+                username="testuser",
+                email="test@example.com",
+                password=hashed_password,
+                email_verified=True,
+                first_name="Test_first_name",
+                last_name="Test_last_name",
+                role="Follower",
+            )
+            db.session.add(user)
+            post = Post(
+                title="first post",
+                content="content",
+                author=user,
+                date_posted=datetime(2024, 6, 1, 12, 0, 0),
+            )
+            db.session.add(post)
+            db.session.commit()
+            self.post_id = post.id
+
+    def tearDown(self) -> None:
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def login(self):
+        self.client.post(
+            url_for("users.login"),
+            data={"email": "test@example.com", "password": "password"},
+        )
+        # consume the "logged in" flash message
+        self.client.get(url_for("main.about"))
+
+    def revalidate(self, url, response):
+        return self.client.get(url, headers={"If-None-Match": response.headers["ETag"]})
+
+
+class TestConditionalGet(TestBase):
+    def test_unchanged_pages_answer_304(self):
+        with self.app.app_context():
+            for url in (
+                url_for("main.home"),
+                url_for("posts.post", post_id=self.post_id),
+                url_for("users.user_posts", username="testuser"),
+            ):
+                first = self.client.get(url)
+                self.assertEqual(first.status_code, 200)
+                self.assertIn("no-cache", first.headers["Cache-Control"])
+                second = self.revalidate(url, first)
+                self.assertEqual(second.status_code, 304, url)
+                self.assertEqual(second.data, b"")
+
+    def test_post_edit_changes_the_etag(self):
+        with self.app.app_context():
+            url = url_for("posts.post", post_id=self.post_id)
+            first = self.client.get(url)
+            self.login()
+            self.client.post(
+                url_for("posts.update_post", post_id=self.post_id),
+                data={"title": "edited", "content": "content"},
+            )
+            self.client.get(url)  # shows the "updated" flash message
+            response = self.revalidate(url, first)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(b"edited", response.data)
+            self.assertNotIn("Last-Modified", response.headers)
+
+    def test_new_post_changes_the_feed_etag(self):
+        with self.app.app_context():
+            self.login()
+            first = self.client.get(url_for("main.home"))
+            self.client.post(
+                url_for("posts.new_post"),
+                data={"title": "second post", "content": "more"},
+            )
+            self.client.get(url_for("main.home"))  # shows the flash message
+            response = self.revalidate(url_for("main.home"), first)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(b"second post", response.data)
+
+    def test_etag_depends_on_the_viewer(self):
+        with self.app.app_context():
+            url = url_for("posts.post", post_id=self.post_id)
+            anonymous = self.client.get(url)
+            self.login()
+            response = self.revalidate(url, anonymous)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(b"Update", response.data)
+
+    def test_pending_flash_is_not_swallowed(self):
+        with self.app.app_context():
+            first = self.client.get(url_for("main.home"))
+            with self.client.session_transaction() as session:
+                session["_flashes"] = [("info", "hello there")]
+            response = self.revalidate(url_for("main.home"), first)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(b"hello there", response.data)
+
+    def test_if_modified_since(self):
+        with self.app.app_context():
+            url = url_for("posts.post", post_id=self.post_id)
+            first = self.client.get(url)
+            self.assertEqual(
+                first.headers["Last-Modified"], "Sat, 01 Jun 2024 12:00:00 GMT"
+            )
+            response = self.client.get(
+                url, headers={"If-Modified-Since": first.headers["Last-Modified"]}
+            )
+            self.assertEqual(response.status_code, 304)
+            response = self.client.get(
+                url, headers={"If-Modified-Since": "Fri, 31 May 2024 12:00:00 GMT"}
+            )
+            self.assertEqual(response.status_code, 200)
+
+
+class TestUploadCaching(TestBase):
+    def test_uploaded_avatars_are_immutable(self):
+        with self.app.app_context():
+            response = self.client.get(
+                url_for("static", filename="profile_pics/0f7683169355a8c0.jpeg")
+            )
+            self.assertEqual(response.status_code, 200)
+            cache_control = response.headers["Cache-Control"]
+            self.assertIn("immutable", cache_control)
+            self.assertIn("max-age=31536000", cache_control)
+            self.assertNotIn("no-cache", cache_control)
+            response.close()
+
+    def test_default_avatar_is_revalidated(self):
+        with self.app.app_context():
+            response = self.client.get(
+                url_for("static", filename="profile_pics/default.png")
+            )
+            self.assertNotIn("immutable", response.headers["Cache-Control"])
+            response.close()
+
+
+class TestEtagsAcrossWorkers(unittest.TestCase):
+    # two apps on one database file stand in for two worker processes
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+        class FileConfig(Config):
+            TESTING = True
+            SQLALCHEMY_DATABASE_URI = "sqlite:///" + os.path.join(
+                self.directory, "site.db"
+            )
+
+        self.apps = [create_app(FileConfig) for _ in range(2)]
+        with self.apps[0].app_context():
+            db.create_all()
+            user = User(
+                username="testuser",
+                email="test@example.com",
+                password=b"x",
+                email_verified=True,
+                first_name="Test_first_name",
+                last_name="Test_last_name",
+                role="Follower",
+            )
+            db.session.add(Post(title="first post", content="content", author=user))
+            db.session.commit()
+
+    def tearDown(self):
+        for app in self.apps:
+            with app.app_context():
+                db.session.remove()
+                db.engine.dispose()
+        shutil.rmtree(self.directory)
+
+    def test_workers_agree_on_etags(self):
+        first, second = self.apps
+        for url in ("/", "/user/testuser"):
+            etag = first.test_client().get(url).headers["ETag"]
+            response = second.test_client().get(url, headers={"If-None-Match": etag})
+            self.assertEqual(response.status_code, 304)
+
+    def test_a_change_in_one_worker_is_never_a_304_in_another(self):
+        first, second = self.apps
+        etag = first.test_client().get("/").headers["ETag"]
+        with second.app_context():
+            # what any post or profile edit in the second worker does
+            fragment_cache.bump()
+        response = first.test_client().get("/", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
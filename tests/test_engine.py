@@ -0,0 +1,103 @@
+import os
+import shutil
+import tempfile
+import unittest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import StaticPool
+from flaskblog import create_app, db
+from flaskblog.config import Config
+from flaskblog.engine import POOL_CHECKOUT_SECONDS, TimedQueuePool
+
+
+class TestBase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+        class FileConfig(Config):
+            SQLALCHEMY_DATABASE_URI = "sqlite:///" + os.path.join(
+                self.directory, "test.db"
+            )
+            DB_POOL_SIZE = 2
+            DB_MAX_OVERFLOW = 1
+
+        self.config_class = FileConfig
+        self.app = create_app(FileConfig)
+
+    def tearDown(self) -> None:
+        with self.app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        shutil.rmtree(self.directory)
+
+    def pragma(self, name):
+        with self.app.app_context():
+            return db.session.execute(text(f"PRAGMA {name}")).scalar()
+
+
+class TestEngineOptions(TestBase):
+    def test_sqlite_file_pragmas(self):
+        self.assertEqual(self.pragma("journal_mode"), "wal")
+        # NORMAL
+        self.assertEqual(self.pragma("synchronous"), 1)
+        self.assertEqual(self.pragma("busy_timeout"), 5000)
+        self.assertEqual(self.pragma("mmap_size"), 256 * 1024 * 1024)
+
+    def test_pool_is_sized_from_config(self):
+        with self.app.app_context():
+            pool = db.engine.pool
+        self.assertIsInstance(pool, TimedQueuePool)
+        self.assertEqual(pool.size(), 2)
+        self.assertEqual(pool._max_overflow, 1)
+
+    def test_checkouts_are_timed(self):
+        before = POOL_CHECKOUT_SECONDS.count
+        with self.app.app_context():
+            db.session.execute(text("SELECT 1"))
+        self.assertGreater(POOL_CHECKOUT_SECONDS.count, before)
+
+    def test_explicit_engine_options_win(self):
+        class PinnedConfig(self.config_class):
+            SQLALCHEMY_ENGINE_OPTIONS = {"pool_size": 7}
+
+        app = create_app(PinnedConfig)
+        with app.app_context():
+            self.assertEqual(db.engine.pool.size(), 7)
+            db.engine.dispose()
+
+    def test_memory_database_keeps_one_connection(self):
+        class MemoryConfig(Config):
+            SQLALCHEMY_DATABASE_URI = "sqlite:///:memory:"
+
+        app = create_app(MemoryConfig)
+        with app.app_context():
+            self.assertIsInstance(db.engine.pool, StaticPool)
+            self.assertEqual(
+                db.session.execute(text("PRAGMA busy_timeout")).scalar(), 5000
+            )
+
+    def test_statement_timeout(self):
+        class TimeoutConfig(self.config_class):
+            DB_STATEMENT_TIMEOUT_MS = 50
+
+        app = create_app(TimeoutConfig)
+        with app.app_context():
+            self.assertEqual(db.session.execute(text("SELECT 1")).scalar(), 1)
+            # counts to a billion, far longer than 50ms
+            with self.assertRaises(OperationalError):
+                db.session.execute(
+                    text(
+                        "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL "
+                        "SELECT i + 1 FROM n WHERE i < 1000000000) "
+                        "SELECT count(*) FROM n"
+                    )
+                ).scalar()
+            db.session.rollback()
+            # the connection is still usable afterwards
+            self.assertEqual(db.session.execute(text("SELECT 2")).scalar(), 2)
+            db.session.remove()
+            db.engine.dispose()
+
+
+if __name__ == "__main__":
+    unittest.main()
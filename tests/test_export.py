@@ -0,0 +1,237 @@
+import csv
+import io
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from flask import url_for
+from flaskblog import create_app, db, bcrypt
+from flaskblog.export import export_chunks
+from flaskblog.models import Booking, Event, Post, User
+
+
+class TestBase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config["TESTING"] = True
+        self.app.config["WTF_CSRF_ENABLED"] = False
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        self.app.config["SERVER_NAME"] = "localhost.localdomain"
+        self.app.config["BCRYPT_LOG_ROUNDS"] = 4
+        self.app.config["EXPORT_BATCH_SIZE"] = 2
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            hashed_password = bcrypt.generate_password_hash("password")
+            for name in ("admin", "testuser"):
+                db.session.add(
+                    User(
+                        username=name,
+                        email=f"{name}@example.com",
+                        password=hashed_password,
+                        email_verified=True,
+                        first_name="Test_first_name",
+                        last_name="Test_last_name",
+                        role="Leader",
+                        is_admin=name == "admin",
+                    )
+                )
+            author = db.session.get(User, 2)
+            for number in range(5):
+                db.session.add(
+                    Post(title=f"post {number}", content="content", author=author)
+                )
+            db.session.add(Post(title="=1+1", content="content", author=author))
+            db.session.add(
+                Event(
+                    title="Milonga",
+                    location="Town hall",
+                    starts_at=datetime.utcnow() + timedelta(days=3),
+                    capacity=10,
+                    organizer_id=1,
+                )
+            )
+            db.session.add(Booking(event_id=1, user_id=2, role="Leader"))
+            db.session.commit()
+
+    def tearDown(self) -> None:
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def login(self, name, email=None):
+        self.client.post(
+            url_for("users.login"),
+            data={"email": email or f"{name}@example.com", "password": "password"},
+        )
+
+    def change_email(self, name, email):
+        with patch("flaskblog.users.routes.send_verify_email") as send_verify_email:
+            response = self.client.post(
+                url_for("users.account"),
+                data={
+                    "username": name,
+                    "email": email,
+                    "first_name": "Test",
+                    "last_name": "User",
+                    "role": "Leader",
+                },
+            )
+        self.assertEqual(response.status_code, 302)
+        # follow the link mailed to the new address
+        user = User.query.filter_by(username=name).first()
+        token = user.get_verify_token(send_verify_email.call_args.args[1])
+        self.client.get(url_for("users.verify_token", token=token))
+
+
+class TestExport(TestBase):
+    def test_one_chunk_per_batch(self):
+        with self.app.app_context():
+            chunks = list(export_chunks("posts", "csv"))
+        # the header, then 6 posts in batches of 2
+        self.assertEqual(len(chunks), 4)
+        rows = list(csv.reader(io.StringIO("".join(chunks))))
+        self.assertEqual(
+            rows[0], ["id", "title", "date_posted", "user_id", "revision", "content"]
+        )
+        self.assertEqual([row[1] for row in rows[1:3]], ["post 0", "post 1"])
+
+    def test_csv_cells_are_never_formulas(self):
+        with self.app.app_context():
+            rows = list(csv.reader(io.StringIO("".join(export_chunks("posts", "csv")))))
+        self.assertEqual(rows[-1][1], "'=1+1")
+
+    def test_users_ndjson_without_passwords(self):
+        with self.app.app_context():
+            lines = "".join(export_chunks("users", "ndjson")).splitlines()
+        users = [json.loads(line) for line in lines]
+        self.assertEqual([user["username"] for user in users], ["admin", "testuser"])
+        self.assertNotIn("password", users[0])
+        # datetimes in ISO 8601
+        datetime.fromisoformat(users[0]["created_at"])
+
+    def test_empty_table(self):
+        with self.app.app_context():
+            Booking.query.delete()
+            self.assertEqual(
+                "".join(export_chunks("bookings", "csv")),
+                "id,event_id,user_id,role,created_at\r\n",
+            )
+            self.assertEqual("".join(export_chunks("bookings", "ndjson")), "")
+
+
+class TestExportEndpoint(TestBase):
+    def test_admin_download_is_streamed(self):
+        with self.app.app_context():
+            self.login("admin")
+            response = self.client.get(
+                url_for("admin.export", table="posts", format="csv")
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.is_streamed)
+            self.assertEqual(response.mimetype, "text/csv")
+            self.assertEqual(
+                response.headers["Content-Disposition"],
+                'attachment; filename="posts.csv"',
+            )
+            self.assertIn(b"post 4", response.get_data())
+
+    def test_bookings_ndjson(self):
+        with self.app.app_context():
+            self.login("admin")
+            response = self.client.get(
+                url_for("admin.export", table="bookings", format="ndjson")
+            )
+            self.assertEqual(response.mimetype, "application/x-ndjson")
+            booking = json.loads(response.get_data(as_text=True))
+        self.assertEqual((booking["user_id"], booking["role"]), (2, "Leader"))
+
+    def test_admins_only(self):
+        with self.app.app_context():
+            url = url_for("admin.export", table="users", format="csv")
+            self.assertEqual(self.client.get(url).status_code, 302)
+            self.login("testuser")
+            self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_email_change_does_not_make_an_admin(self):
+        # the address of an admin is nothing special, only the flag is
+        with self.app.app_context():
+            url = url_for("admin.export", table="users", format="csv")
+            db.session.get(User, 1).email = "boss@example.com"
+            db.session.commit()
+            self.login("testuser")
+            self.assertEqual(self.client.get(url).status_code, 403)
+            self.change_email("testuser", "admin@example.com")
+            self.assertEqual(db.session.get(User, 2).email, "admin@example.com")
+            self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_admins_need_a_verified_email(self):
+        with self.app.app_context():
+            url = url_for("admin.export", table="users", format="csv")
+            self.login("admin")
+            self.assertEqual(self.client.get(url).status_code, 200)
+            db.session.get(User, 1).email_verified = False
+            db.session.commit()
+            # applies to the signed-in session straight away
+            self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_unknown_table(self):
+        with self.app.app_context():
+            self.login("admin")
+            response = self.client.get("/admin/export/outbox_email.csv")
+        self.assertEqual(response.status_code, 404)
+
+
+class TestExportCli(TestBase):
+    def test_to_stdout(self):
+        result = self.app.test_cli_runner().invoke(
+            args=["export", "users", "--format", "ndjson"]
+        )
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual(len(result.output.splitlines()), 2)
+        self.assertIn('"username": "testuser"', result.output)
+
+    def test_to_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "posts.csv")
+            result = self.app.test_cli_runner().invoke(
+                args=["export", "posts", "--output", path]
+            )
+            self.assertEqual(result.exit_code, 0, result.output)
+            with open(path, newline="") as file:
+                rows = list(csv.reader(file))
+        self.assertEqual(len(rows), 7)
+
+
+class TestAdminCli(TestBase):
+    def test_grant_and_revoke(self):
+        runner = self.app.test_cli_runner()
+        url_args = {"table": "users", "format": "csv"}
+        result = runner.invoke(args=["users", "grant-admin", "testuser@example.com"])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn("testuser is now an admin.", result.output)
+        with self.app.app_context():
+            self.login("testuser")
+            self.assertEqual(
+                self.client.get(url_for("admin.export", **url_args)).status_code, 200
+            )
+        result = runner.invoke(args=["users", "revoke-admin", "testuser@example.com"])
+        self.assertEqual(result.exit_code, 0, result.output)
+        with self.app.app_context():
+            # applies to the running session straight away
+            self.assertEqual(
+                self.client.get(url_for("admin.export", **url_args)).status_code, 403
+            )
+
+    def test_unknown_email(self):
+        result = self.app.test_cli_runner().invoke(
+            args=["users", "grant-admin", "nobody@example.com"]
+        )
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn("There is no user with email nobody@example.com.", result.output)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,194 @@
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import contextmanager
+from flask import url_for
+from sqlalchemy import event
+from flaskblog import create_app, db, bcrypt, fragment_cache
+from flaskblog.cache import LRUCache, DictBackend
+from flaskblog.config import Config
+from flaskblog.models import User, Post
+
+
+class TestBase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config["TESTING"] = True
+        self.app.config["WTF_CSRF_ENABLED"] = False
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        self.app.config["SERVER_NAME"] = "localhost.localdomain"
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            hashed_password = bcrypt.generate_password_hash("password")
+            user = User(
+                username="testuser",
+                email="test@example.com",
+                password=hashed_password,
+                email_verified=True,
+                first_name="Test_first_name",
+                last_name="Test_last_name",
+                role="Follower",
+            )
+            db.session.add(user)
+            db.session.add(Post(title="first post", content="content", author=user))
+            db.session.commit()
+
+    def tearDown(self) -> None:
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    @contextmanager
+    def count_statements(self):
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        with self.app.app_context():
+            engine = db.engine
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+
+    def login(self):
+        self.client.post(
+            url_for("users.login"),
+            data={"email": "test@example.com", "password": "password"},
+        )
+
+
+class TestFeedCache(TestBase):
+    def test_cached_feed_only_reads_the_version(self):
+        # each request outside the test's app context, as in production
+        first = self.client.get("/")
+        with self.count_statements() as statements:
+            second = self.client.get("/")
+        self.assertEqual(len(statements), 1)
+        self.assertIn("cache_version", statements[0])
+        self.assertEqual(first.data, second.data)
+        self.assertIn(b"first post", second.data)
+
+    def test_cache_can_be_disabled(self):
+        self.app.config["FEED_CACHE_ENABLED"] = False
+        self.client.get("/")
+        with self.count_statements() as statements:
+            response = self.client.get("/")
+        # the version for the ETag, then the feed
+        self.assertEqual(len(statements), 2)
+        # fragments are still markup, not escaped again by the layout
+        self.assertIn(b'<article class="media content-section">', response.data)
+        self.assertNotIn(b"&lt;article", response.data)
+
+    def test_new_post_invalidates_feed(self):
+        with self.app.app_context():
+            self.login()
+            self.client.get(url_for("main.home"))
+            self.client.post(
+                url_for("posts.new_post"),
+                data={"title": "second post", "content": "more"},
+            )
+            self.assertIn(b"second post", self.client.get(url_for("main.home")).data)
+
+    def test_update_and_delete_invalidate_feed(self):
+        with self.app.app_context():
+            self.login()
+            post_id = Post.query.first().id
+            self.client.get(url_for("main.home"))
+            self.client.post(
+                url_for("posts.update_post", post_id=post_id),
+                data={"title": "edited post", "content": "content"},
+            )
+            response = self.client.get(url_for("main.home"))
+            self.assertIn(b"edited post", response.data)
+            self.assertNotIn(b"first post", response.data)
+
+            self.client.post(url_for("posts.delete_post", post_id=post_id))
+            self.assertNotIn(b"edited post", self.client.get(url_for("main.home")).data)
+
+    def test_feed_pages_are_cached_separately(self):
+        with self.app.app_context():
+            self.client.get(url_for("main.home"))
+            response = self.client.get(url_for("main.home", page=2))
+            self.assertEqual(response.status_code, 404)
+
+
+class TestFeedVersionAcrossProcesses(unittest.TestCase):
+    # two apps on one database file stand in for two worker processes
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+        class FileConfig(Config):
+            TESTING = True
+            SQLALCHEMY_DATABASE_URI = "sqlite:///" + os.path.join(
+                self.directory, "site.db"
+            )
+
+        self.config = FileConfig
+        self.apps = [create_app(FileConfig) for _ in range(2)]
+        with self.apps[0].app_context():
+            db.create_all()
+
+    def tearDown(self):
+        for app in self.apps:
+            with app.app_context():
+                db.session.remove()
+                db.engine.dispose()
+        shutil.rmtree(self.directory)
+
+    def test_a_bump_reaches_every_worker(self):
+        first, second = self.apps
+        with first.app_context():
+            version = fragment_cache.version
+        with second.app_context():
+            self.assertEqual(fragment_cache.version, version)
+            fragment_cache.bump()
+        with first.app_context():
+            self.assertEqual(fragment_cache.version, version + 1)
+
+    def test_shared_backend_shares_fragments(self):
+        shared = DictBackend()
+        first, second = self.apps
+        for app in self.apps:
+            app.config["FEED_CACHE_BACKEND"] = shared
+        with first.app_context():
+            fragment_cache.cached("feed:", lambda: "first")
+        with second.app_context():
+            self.assertEqual(fragment_cache.cached("feed:", lambda: "second"), "first")
+            fragment_cache.bump()
+        with first.app_context():
+            self.assertEqual(fragment_cache.cached("feed:", lambda: "third"), "third")
+
+    def test_version_survives_a_restart(self):
+        with self.apps[0].app_context():
+            fragment_cache.bump()
+            fragment_cache.bump()
+        with create_app(self.config).app_context():
+            self.assertEqual(fragment_cache.version, 2)
+            db.engine.dispose()
+
+
+class TestLRUCacheByteCap(unittest.TestCase):
+    def test_evicts_until_under_the_byte_cap(self):
+        cache = LRUCache(max_bytes=10)
+        cache.set("a", "12345")
+        cache.set("b", "12345")
+        self.assertEqual(cache.size, 10)
+        cache.set("c", "123")
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("b"), "12345")
+        self.assertEqual(cache.size, 8)
+
+    def test_replacing_an_entry_updates_the_size(self):
+        cache = LRUCache(max_bytes=10)
+        cache.set("a", "12345")
+        cache.set("a", "12")
+        self.assertEqual(cache.size, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
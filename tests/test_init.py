@@ -1,5 +1,13 @@
+import os
+import subprocess
+import sys
 import unittest
-from flaskblog import create_app
+from datetime import datetime, timedelta
+import flaskblog
+from flaskblog import create_app, db
+from flaskblog.config import Config
+from flaskblog.jobs import delete_old_pending_users
+from flaskblog.models import User
 
 
 class InitTest(unittest.TestCase):
@@ -7,6 +15,85 @@ class InitTest(unittest.TestCase):
         app = create_app()
         self.assertIsNotNone
 
+    def test_create_app_uses_config_class(self):
+        class TestConfig(Config):
+            FEED_PAGE_LINKS = 3
+
+        app = create_app(TestConfig)
+        self.assertEqual(app.config["FEED_PAGE_LINKS"], 3)
+
+    def test_importing_does_not_build_an_app(self):
+        self.assertFalse(hasattr(flaskblog, "app"))
+
+    def test_heavy_imports_are_deferred(self):
+        # a fresh interpreter, this process has imported everything already
+        code = (
+            "import sys; from flaskblog import create_app; create_app(); "
+            "print(' '.join(m for m in "
+            "('PIL', 'flask_mail', 'flask_migrate', 'apscheduler') "
+            "if m in sys.modules))"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        )
+        self.assertEqual(result.stdout.strip(), "")
+
+    def test_db_commands_load_flask_migrate(self):
+        app = create_app()
+        result = app.test_cli_runner().invoke(args=["db", "--help"])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn("upgrade", result.output)
+        self.assertIn("migrate", app.extensions)
+
+
+class TestDeleteOldPendingUsers(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config["TESTING"] = True
+        self.app.config["PENDING_USER_CLEANUP_BATCH_SIZE"] = 2
+        with self.app.app_context():
+            db.create_all()
+            old = datetime.utcnow() - timedelta(hours=1)
+            recent = datetime.utcnow()
+            for i, (verified, created_at) in enumerate(
+                [(False, old)] * 5 + [(True, old), (False, recent)]
+            ):
+                db.session.add(
+                    User(
+                        username=f"user{i}",
+                        email=f"user{i}@example.com",
+                        password=b"hash",
+                        email_verified=verified,
+                        first_name="Test",
+                        last_name="User",
+                        role="Follower",
+                        created_at=created_at,
+                    )
+                )
+            db.session.commit()
+
+    def tearDown(self) -> None:
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_deletes_only_expired_unverified_users(self):
+        with self.app.app_context():
+            delete_old_pending_users()
+            remaining = {user.username for user in User.query.all()}
+            self.assertEqual(remaining, {"user5", "user6"})
+
+    def test_logs_one_line_per_batch(self):
+        with self.app.app_context(), self.assertLogs("flaskblog", level="INFO") as logs:
+            delete_old_pending_users()
+        batches = [line for line in logs.output if "a batch of" in line]
+        self.assertEqual(len(batches), 3)
+        self.assertIn("Deleted 5 old pending users.", logs.output[-1])
+
 
 if __name__ == "__main__":
-    unittest.main( )
+    unittest.main()
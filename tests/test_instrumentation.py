@@ -0,0 +1,157 @@
+import unittest
+from flask import url_for
+from flaskblog import create_app, db, bcrypt
+from flaskblog.instrumentation import timed
+from flaskblog.metrics import REGISTRY, Counter, Histogram
+from flaskblog.models import User, Post
+
+
+class TestBase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config["TESTING"] = True
+        self.app.config["WTF_CSRF_ENABLED"] = False
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        self.app.config["SERVER_NAME"] = "localhost.localdomain"
+        self.app.config["BCRYPT_LOG_ROUNDS"] = 4
+        self.app.config["SERVER_TIMING_ENABLED"] = True
+        self.app.config["METRICS_TOKEN"] = "secret"
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            hashed_password = bcrypt.generate_password_hash("password")
+            user = User(
+                username="testuser",
+                email="test@example.com",
+                password=hashed_password,
+                email_verified=True,
+                first_name="Test_first_name",
+                last_name="Test_last_name",
+                role="Follower",
+            )
+            db.session.add(user)
+            db.session.add(Post(title="first post", content="content", author=user))
+            db.session.commit()
+
+    def tearDown(self) -> None:
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def server_timing(self, response):
+        entries = {}
+        for entry in response.headers["Server-Timing"].split(", "):
+            name, *params = entry.split(";")
+            entries[name] = dict(param.split("=", 1) for param in params)
+        return entries
+
+
+class TestRequestInstrumentation(TestBase):
+    def test_server_timing_header(self):
+        with self.app.app_context():
+            response = self.client.get(url_for("posts.post", post_id=1))
+        timings = self.server_timing(response)
+        self.assertIn("total", timings)
+        self.assertIn("template", timings)
+        self.assertEqual(timings["sql"]["desc"], '"1 queries"')
+        self.assertLessEqual(
+            float(timings["sql"]["dur"]) + float(timings["template"]["dur"]),
+            float(timings["total"]["dur"]),
+        )
+
+    def test_bcrypt_time_is_reported(self):
+        with self.app.app_context():
+            response = self.client.post(
+                url_for("users.login"),
+                data={"email": "test@example.com", "password": "password"},
+            )
+        self.assertIn("bcrypt", self.server_timing(response))
+
+    def test_server_timing_can_be_turned_off(self):
+        self.app.config["SERVER_TIMING_ENABLED"] = False
+        with self.app.app_context():
+            response = self.client.get(url_for("main.about"))
+        self.assertNotIn("Server-Timing", response.headers)
+
+    def test_nothing_is_published_by_default(self):
+        app = create_app()
+        self.assertFalse(app.config["SERVER_TIMING_ENABLED"])
+        self.assertIsNone(app.config["METRICS_TOKEN"])
+        app.config["TESTING"] = True
+        client = app.test_client()
+        self.assertNotIn("Server-Timing", client.get("/about").headers)
+        self.assertEqual(client.get("/metrics").status_code, 404)
+
+    def test_metrics_endpoint(self):
+        with self.app.app_context():
+            self.client.get(url_for("main.home"))
+            response = self.client.get(
+                url_for("metrics.scrape"), headers={"Authorization": "Bearer secret"}
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith("text/plain"))
+        text = response.get_data(as_text=True)
+        self.assertIn("# TYPE flaskblog_http_request_duration_seconds histogram", text)
+        self.assertIn(
+            'flaskblog_http_requests_total{endpoint="main.home",method="GET",status="200"}',
+            text,
+        )
+        self.assertIn('flaskblog_sql_statements_total{endpoint="main.home"}', text)
+        self.assertIn("flaskblog_db_pool_checkout_seconds", text)
+
+    def test_metrics_token(self):
+        with self.app.app_context():
+            self.assertEqual(
+                self.client.get(url_for("metrics.scrape")).status_code, 403
+            )
+            response = self.client.get(
+                url_for("metrics.scrape"), headers={"Authorization": "Bearer secret"}
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def test_slow_query_log_names_the_endpoint(self):
+        self.app.config["SLOW_QUERY_MS"] = 0
+        with self.app.app_context(), self.assertLogs(
+            "flaskblog.slow_queries", level="WARNING"
+        ) as logs:
+            self.client.get(url_for("users.user_posts", username="testuser"))
+        self.assertIn("in users.user_posts (blueprint users): SELECT", logs.output[0])
+
+    def test_timed_outside_a_request(self):
+        work = REGISTRY.get("flaskblog_work_seconds")
+        before = work.count
+        with timed("image"):
+            pass
+        self.assertEqual(work.count, before + 1)
+
+
+class TestMetrics(unittest.TestCase):
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram("test_seconds", "Test.", (0.1, 1), labelnames=("kind",))
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value, kind="a")
+        samples = {
+            (name, labels.get("le")): value
+            for name, labels, value in histogram.samples()
+        }
+        self.assertEqual(samples[("test_seconds_bucket", "0.1")], 1)
+        self.assertEqual(samples[("test_seconds_bucket", "1.0")], 2)
+        self.assertEqual(samples[("test_seconds_bucket", "+Inf")], 3)
+        self.assertEqual(samples[("test_seconds_count", None)], 3)
+        self.assertAlmostEqual(samples[("test_seconds_sum", None)], 5.55)
+
+    def test_counter_labels(self):
+        counter = Counter("test_events", "Test.", labelnames=("kind",))
+        counter.inc(kind="a")
+        counter.inc(2, kind="b")
+        self.assertEqual(
+            counter.samples(),
+            [
+                ("test_events_total", {"kind": "a"}, 1.0),
+                ("test_events_total", {"kind": "b"}, 2.0),
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+from flaskblog import create_app, db, jobs
+from flaskblog.config import Config
+from flaskblog.jobs import acquire_lease, run_job
+from flaskblog.models import JobLease
+
+
+class TestBase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config["TESTING"] = True
+        self.app.config["SERVER_NAME"] = "localhost.localdomain"
+        with self.app.app_context():
+            db.create_all()
+
+    def tearDown(self) -> None:
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+
+class TestJobLeases(TestBase):
+    def test_only_one_holder_at_a_time(self):
+        with self.app.app_context():
+            self.assertTrue(acquire_lease("cleanup", timedelta(minutes=2)))
+            # the holder keeps renewing its own lease
+            self.assertTrue(acquire_lease("cleanup", timedelta(minutes=2)))
+            with patch("flaskblog.jobs.HOLDER", "other-process"):
+                self.assertFalse(acquire_lease("cleanup", timedelta(minutes=2)))
+
+    def test_expired_lease_is_taken_over(self):
+        with self.app.app_context():
+            acquire_lease("cleanup", timedelta(minutes=2))
+            JobLease.query.filter_by(name="cleanup").update(
+                {JobLease.expires_at: datetime.utcnow() - timedelta(seconds=1)}
+            )
+            db.session.commit()
+            with patch("flaskblog.jobs.HOLDER", "other-process"):
+                self.assertTrue(acquire_lease("cleanup", timedelta(minutes=2)))
+            self.assertEqual(
+                db.session.get(JobLease, "cleanup").holder, "other-process"
+            )
+
+
+@unittest.skipUnless(hasattr(os, "fork"), "needs os.fork")
+class TestForkedWorkers(unittest.TestCase):
+    # like gunicorn --preload: the app is built once, then workers are forked
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+        class FileConfig(Config):
+            TESTING = True
+            SQLALCHEMY_DATABASE_URI = "sqlite:///" + os.path.join(
+                self.directory, "site.db"
+            )
+
+        self.app = create_app(FileConfig)
+        with self.app.app_context():
+            db.create_all()
+            db.session.remove()
+            db.engine.dispose()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_only_one_worker_wins_the_lease(self):
+        workers = []
+        for _ in range(4):
+            pid = os.fork()
+            if pid == 0:
+                won = False
+                try:
+                    with self.app.app_context():
+                        won = acquire_lease("cleanup", timedelta(minutes=2))
+                finally:
+                    os._exit(0 if won else 1)
+            workers.append(pid)
+        winners = 0
+        for pid in workers:
+            _, status = os.waitpid(pid, 0)
+            winners += os.waitstatus_to_exitcode(status) == 0
+        self.assertEqual(winners, 1)
+        with self.app.app_context():
+            holder = db.session.get(JobLease, "cleanup").holder
+            db.session.remove()
+            db.engine.dispose()
+        self.assertNotEqual(holder, jobs.HOLDER)
+
+
+class TestRunJob(TestBase):
+    def test_runs_once_and_records_the_run(self):
+        job = MagicMock()
+        with patch.dict("flaskblog.jobs.JOBS", {"noop": (job, 30)}):
+            self.assertTrue(run_job(self.app, "noop"))
+            with patch("flaskblog.jobs.HOLDER", "other-process"):
+                self.assertFalse(run_job(self.app, "noop"))
+        job.assert_called_once_with()
+        with self.app.app_context():
+            lease = db.session.get(JobLease, "noop")
+            self.assertEqual(lease.runs, 1)
+            self.assertIsNotNone(lease.last_started_at)
+            self.assertGreaterEqual(lease.last_duration, 0)
+            self.assertIsNone(lease.last_error)
+            self.assertGreater(lease.expires_at, datetime.utcnow())
+
+    def test_failures_are_recorded(self):
+        job = MagicMock(side_effect=RuntimeError("boom"))
+        with patch.dict("flaskblog.jobs.JOBS", {"broken": (job, 30)}):
+            with self.assertLogs("flaskblog.jobs", level="ERROR"):
+                self.assertTrue(run_job(self.app, "broken"))
+        with self.app.app_context():
+            lease = db.session.get(JobLease, "broken")
+            self.assertEqual(lease.runs, 1)
+            self.assertIn("boom", lease.last_error)
+
+    def test_status_command(self):
+        with patch.dict("flaskblog.jobs.JOBS", {"noop": (MagicMock(), 30)}):
+            run_job(self.app, "noop")
+            result = self.app.test_cli_runner().invoke(args=["jobs", "status"])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn("noop: held by", result.output)
+        self.assertIn("1 runs", result.output)
+
+
+class TestSchedulerStart(unittest.TestCase):
+    @patch("flaskblog.jobs.start_scheduler", autospec=True)
+    def test_starts_with_the_first_request(self, mock_start_scheduler):
+        app = create_app()
+        mock_start_scheduler.assert_not_called()
+        app.test_client().get("/about")
+        mock_start_scheduler.assert_called_once_with(app)
+
+    @patch("flaskblog.jobs.start_scheduler", autospec=True)
+    def test_not_started_while_testing(self, mock_start_scheduler):
+        app = create_app()
+        app.config["TESTING"] = True
+        app.test_client().get("/about")
+        mock_start_scheduler.assert_not_called()
+
+    @patch("flaskblog.jobs.start_scheduler", autospec=True)
+    def test_web_workers_can_leave_jobs_to_another_process(self, mock_start_scheduler):
+        class WebConfig(Config):
+            JOBS_IN_WEB_PROCESS = False
+
+        create_app(WebConfig).test_client().get("/about")
+        mock_start_scheduler.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from flask import url_for
+from flask_mail import Message
+from flaskblog import create_app, db, bcrypt, mail_queue
+from flaskblog.mailqueue import LocalTransport
+from flaskblog.models import User, OutboxEmail
+
+
+class TestBase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config["TESTING"] = True
+        self.app.config["WTF_CSRF_ENABLED"] = False
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        self.app.config["SERVER_NAME"] = "localhost.localdomain"
+        self.app.config["MAIL_QUEUE_TRANSPORT"] = "local"
+        self.app.config["MAIL_QUEUE_WORKERS"] = 0
+        self.app.config["MAIL_QUEUE_MAX_ATTEMPTS"] = 3
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            hashed_password = bcrypt.generate_password_hash("password")
+            user = User(
+                username="testuser",
+                email="test@example.com",
+                password=hashed_password,
+                email_verified=True,
+                first_name="Test_first_name",
+                last_name="Test_last_name",
+                role="Follower",
+            )
+            db.session.add(user)
+            db.session.commit()
+
+    def tearDown(self) -> None:
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def message(self, subject="Hello"):
+        return Message(
+            subject,
+            sender="shu151343@gmail.com",
+            recipients=["test@example.com"],
+            body="body",
+        )
+
+
+class TestMailQueue(TestBase):
+    def test_enqueue_does_not_send(self):
+        with self.app.app_context():
+            mail_queue.enqueue(self.message())
+            email = OutboxEmail.query.one()
+            self.assertEqual(email.status, "pending")
+            self.assertEqual(mail_queue.transport.sent, [])
+
+    def test_drain_sends_batches_over_one_connection(self):
+        self.app.config["MAIL_QUEUE_BATCH_SIZE"] = 2
+        with self.app.app_context():
+            for i in range(5):
+                mail_queue.enqueue(self.message(f"mail {i}"))
+            with patch.object(
+                LocalTransport, "connect", wraps=mail_queue.transport.connect
+            ) as mock_connect:
+                self.assertEqual(mail_queue.drain(), 5)
+            # 5 mails in batches of 2
+            self.assertEqual(mock_connect.call_count, 3)
+            self.assertEqual(
+                [message.subject for message in mail_queue.transport.sent],
+                [f"mail {i}" for i in range(5)],
+            )
+            self.assertEqual(OutboxEmail.query.filter_by(status="sent").count(), 5)
+
+    def test_failed_send_is_retried_with_backoff(self):
+        self.app.config["MAIL_QUEUE_BACKOFF_SECONDS"] = 60
+        with self.app.app_context():
+            mail_queue.enqueue(self.message())
+            with patch.object(LocalTransport, "send", side_effect=OSError("down")):
+                self.assertEqual(mail_queue.drain(), 0)
+            email = OutboxEmail.query.one()
+            self.assertEqual(email.status, "pending")
+            self.assertEqual(email.attempts, 1)
+            self.assertEqual(email.last_error, "down")
+            self.assertGreater(
+                email.next_attempt_at, datetime.utcnow() + timedelta(seconds=50)
+            )
+            # not due yet
+            self.assertEqual(mail_queue.drain(), 0)
+
+            email.next_attempt_at = datetime.utcnow()
+            db.session.commit()
+            self.assertEqual(mail_queue.drain(), 1)
+            self.assertEqual(OutboxEmail.query.one().status, "sent")
+
+    def test_gives_up_after_max_attempts(self):
+        with self.app.app_context():
+            mail_queue.enqueue(self.message())
+            with patch.object(LocalTransport, "send", side_effect=OSError("down")):
+                for _ in range(3):
+                    OutboxEmail.query.update({"next_attempt_at": datetime.utcnow()})
+                    db.session.commit()
+                    mail_queue.drain()
+            email = OutboxEmail.query.one()
+            self.assertEqual(email.status, "failed")
+            self.assertEqual(email.attempts, 3)
+
+    def test_stale_claim_is_picked_up_again(self):
+        with self.app.app_context():
+            mail_queue.enqueue(self.message())
+            OutboxEmail.query.update(
+                {
+                    "status": "sending",
+                    "claim_token": "deadworker",
+                    "next_attempt_at": datetime.utcnow() - timedelta(seconds=1),
+                }
+            )
+            db.session.commit()
+            self.assertEqual(mail_queue.drain(), 1)
+
+    def test_reset_request_only_queues_the_email(self):
+        with self.app.app_context():
+            response = self.client.post(
+                url_for("users.reset_request"), data={"email": "test@example.com"}
+            )
+            self.assertEqual(response.status_code, 302)
+            email = OutboxEmail.query.one()
+            self.assertEqual(email.subject, "Password Reset Request")
+            self.assertEqual(email.recipients, "test@example.com")
+            self.assertEqual(mail_queue.transport.sent, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,6 @@
 import unittest
 from flaskblog import create_app, db, bcrypt
-from flaskblog.models import User
+from flaskblog.models import User, Post, EXCERPT_LENGTH
 from flask import current_app
 from itsdangerous import URLSafeTimedSerializer
 from datetime import datetime, timedelta
@@ -59,6 +59,45 @@ class TestUserModel(TestBase):
                 expired_user = User.verify_token(token)
                 self.assertIsNone(expired_user)
 
+    def test_verify_email_token(self):
+        with self.app.app_context():
+            user = db.session.get(User, self.user.id)
+            verified_user, email = User.verify_email_token(user.get_verify_token())
+            self.assertEqual((verified_user.id, email), (user.id, "test@example.com"))
+            # an address the account never asked for is refused
+            self.assertIsNone(
+                User.verify_email_token(user.get_verify_token("other@example.com"))
+            )
+
+    def test_reset_and_verify_tokens_are_not_interchangeable(self):
+        with self.app.app_context():
+            user = db.session.get(User, self.user.id)
+            self.assertIsNone(User.verify_token(user.get_verify_token()))
+            self.assertIsNone(User.verify_email_token(user.get_reset_token()))
+
+
+class TestPostModel(TestBase):
+
+    def test_short_content_is_its_own_excerpt(self):
+        with self.app.app_context():
+            post = Post(title="title", content="Short\n\n  post.", author=self.user)
+            self.assertEqual(post.excerpt, "Short post.")
+
+    def test_long_content_is_cut_at_a_word(self):
+        with self.app.app_context():
+            post = Post(title="title", content="tango, " * 100, author=self.user)
+            self.assertLessEqual(len(post.excerpt), EXCERPT_LENGTH + 1)
+            self.assertTrue(post.excerpt.endswith("tango…"))
+
+    def test_excerpt_follows_edits(self):
+        with self.app.app_context():
+            post = Post(title="title", content="first", author=self.user)
+            db.session.add(post)
+            db.session.commit()
+            post.content = "second"
+            db.session.commit()
+            self.assertEqual(Post.query.one().excerpt, "second")
+
 
 if __name__ == "__main__":
     unittest.main()
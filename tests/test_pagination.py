@@ -0,0 +1,148 @@
+import unittest
+from datetime import datetime, timedelta
+from flask import url_for
+from sqlalchemy import event
+from flaskblog import create_app, db, bcrypt
+from flaskblog.models import User, Post
+from flaskblog.pagination import paginate_feed, encode_cursor, decode_cursor
+
+
+class TestBase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config["TESTING"] = True
+        self.app.config["WTF_CSRF_ENABLED"] = False
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        self.app.config["SERVER_NAME"] = "localhost.localdomain"
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            hashed_password = bcrypt.generate_password_hash("password")
+            user = User(
+                username="testuser",
+                email="test@example.com",
+                password=hashed_password,
+                email_verified=True,
+                first_name="Test_first_name",
+                last_name="Test_last_name",
+                role="Follower",
+            )
+            db.session.add(user)
+            # two posts share every timestamp so the id tie-breaker is exercised
+            start = datetime(2024, 6, 1)
+            for i in range(20):
+                db.session.add(
+                    Post(
+                        title=f"post {i}",
+                        content="content",
+                        author=user,
+                        date_posted=start + timedelta(minutes=i // 2),
+                    )
+                )
+            # posts added here bypass the routes that keep the counter
+            user.post_count = 20
+            db.session.commit()
+
+    def tearDown(self) -> None:
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+
+class TestFeedPagination(TestBase):
+    def feed(self, query_string=""):
+        with self.app.test_request_context("/" + query_string):
+            page = paginate_feed(Post.query, per_page=7)
+            return page, [post.title for post in page.items]
+
+    def test_first_page(self):
+        with self.app.app_context():
+            page, titles = self.feed()
+            self.assertEqual(titles, [f"post {i}" for i in range(19, 12, -1)])
+            self.assertEqual(page.page, 1)
+            self.assertFalse(page.has_prev)
+            self.assertTrue(page.has_next)
+
+    def test_walk_forward_and_back_with_cursors(self):
+        with self.app.app_context():
+            first, first_titles = self.feed()
+            second, second_titles = self.feed(f"?after={first.next_cursor}")
+            self.assertEqual(second_titles, [f"post {i}" for i in range(12, 5, -1)])
+            third, third_titles = self.feed(f"?after={second.next_cursor}")
+            self.assertEqual(third_titles, [f"post {i}" for i in range(5, -1, -1)])
+            self.assertFalse(third.has_next)
+
+            back, back_titles = self.feed(f"?before={third.prev_cursor}")
+            self.assertEqual(back_titles, second_titles)
+            self.assertTrue(back.has_prev)
+            start, start_titles = self.feed(f"?before={back.prev_cursor}")
+            self.assertEqual(start_titles, first_titles)
+            self.assertFalse(start.has_prev)
+
+    def test_page_numbers_match_cursor_pages(self):
+        with self.app.app_context():
+            first, _ = self.feed()
+            _, cursor_titles = self.feed(f"?after={first.next_cursor}")
+            page, page_titles = self.feed("?page=2")
+            self.assertEqual(page_titles, cursor_titles)
+            self.assertEqual(list(page.iter_pages()), [1, 2, 3])
+
+    def test_only_linked_pages_are_numbered(self):
+        self.app.config["FEED_PAGE_LINKS"] = 2
+        with self.app.app_context():
+            page, _ = self.feed("?page=2")
+            self.assertEqual(list(page.iter_pages()), [1, 2])
+            self.assertEqual(
+                self.client.get(url_for("main.home", page=3)).status_code, 404
+            )
+            self.assertEqual(
+                self.client.get(
+                    url_for("users.user_posts", username="testuser", page=3)
+                ).status_code,
+                404,
+            )
+
+    def test_cursor_round_trip(self):
+        with self.app.app_context():
+            post = Post.query.first()
+            self.assertEqual(
+                decode_cursor(encode_cursor(post)), (post.date_posted, post.id)
+            )
+
+    def test_home_does_not_count_rows(self):
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement.lower())
+
+        with self.app.app_context():
+            event.listen(db.engine, "before_cursor_execute", record)
+            try:
+                first = self.client.get(url_for("main.home"))
+                self.assertEqual(first.status_code, 200)
+                cursor, _ = self.feed()
+                response = self.client.get(
+                    url_for("main.home", after=cursor.next_cursor)
+                )
+                self.assertEqual(response.status_code, 200)
+            finally:
+                event.remove(db.engine, "before_cursor_execute", record)
+        self.assertTrue(statements)
+        self.assertFalse([s for s in statements if "count(" in s])
+
+    def test_invalid_cursor_is_not_found(self):
+        with self.app.app_context():
+            response = self.client.get(url_for("main.home", after="not-a-cursor"))
+            self.assertEqual(response.status_code, 404)
+
+    def test_user_posts_page(self):
+        with self.app.app_context():
+            response = self.client.get(
+                url_for("users.user_posts", username="testuser", page=2)
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(b"post 12", response.data)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+import unittest
+from datetime import datetime, timedelta
+from flask import url_for
+from flaskblog import create_app, db, bcrypt
+from flaskblog.bookings.pairing import max_matching, rotation
+from flaskblog.models import Booking, Event, User
+
+
+class TestBase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config["TESTING"] = True
+        self.app.config["WTF_CSRF_ENABLED"] = False
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        self.app.config["SERVER_NAME"] = "localhost.localdomain"
+        self.app.config["BCRYPT_LOG_ROUNDS"] = 4
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            hashed_password = bcrypt.generate_password_hash("password")
+            for name, role in (
+                ("organizer", "Leader"),
+                ("ana", "Follower"),
+                ("both", "Both"),
+                ("other", "Leader"),
+            ):
+                db.session.add(
+                    User(
+                        username=name,
+                        email=f"{name}@example.com",
+                        password=hashed_password,
+                        email_verified=True,
+                        first_name="Test_first_name",
+                        last_name="Test_last_name",
+                        role=role,
+                    )
+                )
+            db.session.add(
+                Event(
+                    title="Class",
+                    location="Studio",
+                    starts_at=datetime.utcnow() + timedelta(days=7),
+                    capacity=10,
+                    organizer_id=1,
+                )
+            )
+            for user_id, role in ((1, "Leader"), (2, "Follower"), (3, "Follower")):
+                db.session.add(Booking(event_id=1, user_id=user_id, role=role))
+            db.session.commit()
+
+    def tearDown(self) -> None:
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def login(self, name):
+        self.client.post(
+            url_for("users.login"),
+            data={"email": f"{name}@example.com", "password": "password"},
+        )
+
+
+def attendees(leaders, followers, both=0):
+    return (
+        [(f"l{number}", "Leader") for number in range(leaders)]
+        + [(f"f{number}", "Follower") for number in range(followers)]
+        + [(f"b{number}", "Both") for number in range(both)]
+    )
+
+
+def pairs_seen(schedule):
+    return [frozenset(pair) for round_ in schedule for pair in round_.pairs]
+
+
+class TestRotation(unittest.TestCase):
+    def test_no_repeats_while_fresh_partners_exist(self):
+        schedule = rotation(attendees(6, 6, 4), 8)
+        seen = pairs_seen(schedule)
+        self.assertEqual(len(seen), len(set(seen)))
+        for round_ in schedule:
+            self.assertEqual(len(round_.pairs), 8)
+            self.assertEqual(round_.sitting_out, [])
+
+    def test_roles_are_respected(self):
+        schedule = rotation(attendees(3, 7, 4), 6)
+        for round_ in schedule:
+            for lead, follow in round_.pairs:
+                self.assertFalse(lead.startswith("f"))
+                self.assertFalse(follow.startswith("l"))
+            # the "Both" dancers even the sides out
+            self.assertEqual(len(round_.pairs), 7)
+
+    def test_sitting_out_rotates(self):
+        schedule = rotation(attendees(2, 4), 2)
+        self.assertEqual(len(schedule[0].sitting_out), 2)
+        self.assertFalse(set(schedule[0].sitting_out) & set(schedule[1].sitting_out))
+
+    def test_repeats_once_everyone_has_danced_together(self):
+        schedule = rotation(attendees(2, 2), 3)
+        self.assertEqual([len(round_.pairs) for round_ in schedule], [2, 2, 2])
+        self.assertEqual(len(set(pairs_seen(schedule))), 4)
+
+    def test_matching_repairs_a_bad_start(self):
+        # greedy would keep 0-0 and strand 1, the matching reroutes 0 to 1
+        adjacency = [[0, 1], [0]]
+        matched = max_matching(2, 2, lambda u: adjacency[u], [0, -1])
+        self.assertEqual(matched, [1, 0])
+
+    def test_empty_side(self):
+        schedule = rotation(attendees(3, 0), 1)
+        self.assertEqual(schedule[0].pairs, [])
+        self.assertEqual(len(schedule[0].sitting_out), 3)
+
+
+class TestPairingsEndpoints(TestBase):
+    def test_organizer_sees_pairings(self):
+        with self.app.app_context():
+            self.login("organizer")
+            response = self.client.get(
+                url_for("bookings.pairings", event_id=1, rounds=2)
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"Round 2", response.data)
+        self.assertIn(b"organizer leads ana", response.data)
+        self.assertIn(b"organizer leads both", response.data)
+
+    def test_only_the_organizer(self):
+        with self.app.app_context():
+            self.login("other")
+            response = self.client.get(url_for("bookings.pairings", event_id=1))
+        self.assertEqual(response.status_code, 403)
+
+    def test_cli(self):
+        result = self.app.test_cli_runner().invoke(
+            args=["events", "pairings", "1", "--rounds", "2"]
+        )
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn("Round 1:", result.output)
+        self.assertIn("organizer leads", result.output)
+        result = self.app.test_cli_runner().invoke(args=["events", "pairings", "9"])
+        self.assertNotEqual(result.exit_code, 0)
+        self.assertIn("There is no event 9.", result.output)
+
+
+if __name__ == "__main__":
+    unittest.main()
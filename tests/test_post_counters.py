@@ -0,0 +1,144 @@
+import unittest
+from datetime import datetime, timedelta
+from flask import url_for
+from sqlalchemy import event
+from flaskblog import create_app, db, bcrypt
+from flaskblog.models import User, Post
+
+
+class TestBase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config["TESTING"] = True
+        self.app.config["WTF_CSRF_ENABLED"] = False
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        self.app.config["SERVER_NAME"] = "localhost.localdomain"
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            hashed_password = bcrypt.generate_password_hash("password")
+            user = User(
+                username="testuser",
+                email="test@example.com",
+                password=hashed_password,
+                email_verified=True,
+                first_name="Test_first_name",
+                last_name="Test_last_name",
+                role="Follower",
+            )
+            db.session.add(user)
+            db.session.commit()
+
+    def tearDown(self) -> None:
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def login(self):
+        self.client.post(
+            url_for("users.login"),
+            data={"email": "test@example.com", "password": "password"},
+        )
+
+    def counters(self):
+        user = db.session.get(User, 1)
+        db.session.refresh(user)
+        return user.post_count, user.last_posted_at
+
+
+class TestPostCounters(TestBase):
+    def test_new_post_counts(self):
+        with self.app.app_context():
+            self.login()
+            for i in range(2):
+                self.client.post(
+                    url_for("posts.new_post"),
+                    data={"title": f"post {i}", "content": "content"},
+                )
+            post_count, last_posted_at = self.counters()
+            self.assertEqual(post_count, 2)
+            self.assertEqual(
+                last_posted_at,
+                db.session.scalars(db.select(db.func.max(Post.date_posted))).one(),
+            )
+
+    def test_delete_post_uncounts(self):
+        with self.app.app_context():
+            self.login()
+            for i in range(2):
+                self.client.post(
+                    url_for("posts.new_post"),
+                    data={"title": f"post {i}", "content": "content"},
+                )
+            first, newest = Post.query.order_by(Post.id).all()
+            first_posted_at = first.date_posted
+
+            self.client.post(url_for("posts.delete_post", post_id=newest.id))
+            self.assertEqual(self.counters(), (1, first_posted_at))
+
+            self.client.post(url_for("posts.delete_post", post_id=first.id))
+            self.assertEqual(self.counters(), (0, None))
+
+    def test_recount_repairs_counters(self):
+        with self.app.app_context():
+            user = db.session.get(User, 1)
+            newest = datetime(2024, 5, 1)
+            for i in range(3):
+                db.session.add(
+                    Post(
+                        title=f"post {i}",
+                        content="content",
+                        author=user,
+                        date_posted=newest - timedelta(days=i),
+                    )
+                )
+            user.post_count = 99
+            db.session.commit()
+
+            result = self.app.test_cli_runner().invoke(args=["users", "recount-posts"])
+            self.assertEqual(result.exit_code, 0, result.output)
+            self.assertEqual(self.counters(), (3, newest))
+
+    def test_profile_pages_come_from_the_counter(self):
+        with self.app.app_context():
+            user = db.session.get(User, 1)
+            start = datetime(2024, 1, 1)
+            for i in range(10):
+                db.session.add(
+                    Post(
+                        title=f"post {i}",
+                        content="content",
+                        author=user,
+                        date_posted=start + timedelta(days=i),
+                    )
+                )
+            user.post_count = 10
+            user.last_posted_at = start + timedelta(days=9)
+            db.session.commit()
+
+            statements = []
+
+            def record(conn, cursor, statement, *args):
+                statements.append(statement)
+
+            event.listen(db.engine, "before_cursor_execute", record)
+            try:
+                response = self.client.get(
+                    url_for("users.user_posts", username="testuser")
+                )
+            finally:
+                event.remove(db.engine, "before_cursor_execute", record)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(b"10 posts, last on 2024-01-10", response.data)
+            # both pages linked from the first one, without counting the posts
+            self.assertIn(b"page=2", response.data)
+            self.assertFalse(any("count(" in s.lower() for s in statements))
+
+            response = self.client.get(
+                url_for("users.user_posts", username="testuser", page=3)
+            )
+            self.assertEqual(response.status_code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+import unittest
+from contextlib import contextmanager
+from flask import url_for
+from sqlalchemy import event
+from flaskblog import create_app, db, bcrypt
+from flaskblog.models import User, Post
+
+
+class TestBase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config["TESTING"] = True
+        self.app.config["WTF_CSRF_ENABLED"] = False
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        self.app.config["SERVER_NAME"] = "localhost.localdomain"
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            hashed_password = bcrypt.generate_password_hash("password")
+            # one author per post, the worst case for lazy loading authors
+            for i in range(7):
+                user = User(
+                    username=f"testuser{i}",
+                    email=f"test{i}@example.com",
+                    password=hashed_password,
+                    email_verified=True,
+                    first_name="Test_first_name",
+                    last_name="Test_last_name",
+                    role="Follower",
+                )
+                db.session.add(user)
+                db.session.add(Post(title=f"post {i}", content="content", author=user))
+            db.session.commit()
+
+    def tearDown(self) -> None:
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    @contextmanager
+    def count_statements(self):
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", record)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, "before_cursor_execute", record)
+
+
+class TestPostListingQueries(TestBase):
+    def test_home_loads_authors_in_one_query(self):
+        with self.app.app_context():
+            with self.count_statements() as statements:
+                response = self.client.get(url_for("main.home"))
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(b"testuser6", response.data)
+            # the feed version, then the posts with their authors
+            self.assertEqual(len(statements), 2, statements)
+
+    def test_user_posts_queries(self):
+        with self.app.app_context():
+            with self.count_statements() as statements:
+                response = self.client.get(
+                    url_for("users.user_posts", username="testuser3")
+                )
+            self.assertEqual(response.status_code, 200)
+            # the profile owner, the feed version, then their posts
+            self.assertEqual(len(statements), 3, statements)
+
+    def test_post_page_loads_author_with_post(self):
+        with self.app.app_context():
+            post_id = Post.query.first().id
+            with self.count_statements() as statements:
+                response = self.client.get(url_for("posts.post", post_id=post_id))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(statements), 1, statements)
+
+    def test_listing_skips_unused_author_columns(self):
+        with self.app.app_context():
+            with self.count_statements() as statements:
+                self.client.get(url_for("main.home"))
+            self.assertIn("FROM post", statements[-1])
+            self.assertNotIn("user_1.password", statements[-1])
+
+    def test_listings_leave_post_content_unloaded(self):
+        with self.app.app_context():
+            post = Post.query.first()
+            post.content = "A long post body. " * 100
+            db.session.commit()
+            for url in (
+                url_for("main.home"),
+                url_for("users.user_posts", username=post.author.username),
+            ):
+                with self.count_statements() as statements:
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotIn("post.content", statements[-1])
+                self.assertIn("post.excerpt", statements[-1])
+                self.assertIn(post.excerpt.encode(), response.data)
+                self.assertNotIn(post.content.encode(), response.data)
+
+    def test_post_page_shows_full_content(self):
+        with self.app.app_context():
+            post = Post.query.first()
+            post.content = "A long post body. " * 100
+            db.session.commit()
+            response = self.client.get(url_for("posts.post", post_id=post.id))
+            self.assertIn(post.content.strip().encode(), response.data)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+import unittest
+from datetime import datetime
+from sqlalchemy import event
+from flaskblog import create_app, db, bcrypt
+from flaskblog.bookings.calendar import after_cursor, open_events
+from flaskblog.models import User, Post
+from flaskblog.pagination import paginate_feed, encode_cursor, encode_key
+from flaskblog.posts.utils import feed_query, user_feed_query
+from flaskblog.users.utils import expired_pending_users
+
+
+class TestBase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config["TESTING"] = True
+        self.app.config["WTF_CSRF_ENABLED"] = False
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        self.app.config["SERVER_NAME"] = "localhost.localdomain"
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            hashed_password = bcrypt.generate_password_hash("password")
+            user = User(
+                username="testuser",
+                email="test@example.com",
+                password=hashed_password,
+                email_verified=True,
+                first_name="Test_first_name",
+                last_name="Test_last_name",
+                role="Follower",
+            )
+            db.session.add(user)
+            db.session.add(Post(title="post", content="content", author=user))
+            db.session.commit()
+
+    def tearDown(self) -> None:
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+
+class TestQueryPlans(TestBase):
+    def executed_statements(self, run):
+        # capture the SQL (with its parameters) that a named query really sends
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append((statement, parameters))
+
+        event.listen(db.engine, "before_cursor_execute", record)
+        try:
+            run()
+        finally:
+            event.remove(db.engine, "before_cursor_execute", record)
+        return statements
+
+    def query_plan(self, statement, parameters):
+        with db.engine.connect() as conn:
+            rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+            return [row.detail for row in rows]
+
+    def assert_uses_index(self, run, index_name):
+        statements = self.executed_statements(run)
+        self.assertEqual(len(statements), 1, statements)
+        plan = self.query_plan(*statements[0])
+        self.assertTrue(any(index_name in step for step in plan), plan)
+        for step in plan:
+            # a SCAN without USING is a full table scan
+            if step.startswith("SCAN"):
+                self.assertIn("USING", step, plan)
+            self.assertNotIn("TEMP B-TREE", step, plan)
+
+    def run_feed(self, query, query_string=""):
+        def run():
+            with self.app.test_request_context("/" + query_string):
+                paginate_feed(query, per_page=7)
+
+        return run
+
+    def test_home_feed_first_page(self):
+        with self.app.app_context():
+            self.assert_uses_index(
+                self.run_feed(feed_query()), "ix_post_date_posted_id"
+            )
+
+    def test_home_feed_after_cursor(self):
+        with self.app.app_context():
+            cursor = encode_cursor(Post.query.first())
+            self.assert_uses_index(
+                self.run_feed(feed_query(), f"?after={cursor}"),
+                "ix_post_date_posted_id",
+            )
+
+    def test_user_feed(self):
+        with self.app.app_context():
+            user = User.query.first()
+            self.assert_uses_index(
+                self.run_feed(user_feed_query(user)), "ix_post_user_id_date_posted_id"
+            )
+
+    def test_user_feed_after_cursor(self):
+        with self.app.app_context():
+            user = User.query.first()
+            cursor = encode_cursor(Post.query.first())
+            self.assert_uses_index(
+                self.run_feed(user_feed_query(user), f"?after={cursor}"),
+                "ix_post_user_id_date_posted_id",
+            )
+
+    def test_expired_pending_users(self):
+        with self.app.app_context():
+            self.assert_uses_index(
+                lambda: expired_pending_users(datetime(2024, 6, 1)).all(),
+                "ix_user_email_verified_created_at",
+            )
+
+    def test_open_events(self):
+        with self.app.app_context():
+            self.assert_uses_index(
+                lambda: open_events(
+                    datetime(2026, 1, 1), datetime(2026, 2, 1), "Both"
+                ).all(),
+                "ix_event_calendar",
+            )
+
+    def test_open_events_after_cursor(self):
+        with self.app.app_context():
+            cursor = encode_key(datetime(2026, 1, 5), 3)
+            self.assert_uses_index(
+                lambda: after_cursor(
+                    open_events(datetime(2026, 1, 1), role="Leader"), cursor
+                ).all(),
+                "ix_event_calendar",
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+import os
+import shutil
+import tempfile
+import unittest
+from flaskblog import create_app, db, bcrypt
+from flaskblog.config import Config
+from flaskblog.models import User, Post
+from flaskblog.replicas import STICKY_COOKIE
+
+
+class TestBase(unittest.TestCase):
+    # two SQLite files: the primary and a replica that never receives writes,
+    # so every read tells which database answered it
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        directory = self.directory
+
+        class ReplicaConfig(Config):
+            SQLALCHEMY_DATABASE_URI = "sqlite:///" + os.path.join(
+                directory, "primary.db"
+            )
+            SQLALCHEMY_REPLICA_URIS = [
+                "sqlite:///" + os.path.join(directory, "replica.db")
+            ]
+            TESTING = True
+            WTF_CSRF_ENABLED = False
+            SERVER_NAME = "localhost.localdomain"
+            FEED_CACHE_ENABLED = False
+
+        self.app = create_app(ReplicaConfig)
+        self.client = self.app.test_client()
+        self.replica = self.app.extensions["replicas"][0]
+        with self.app.app_context():
+            self.primary = db.engine
+            hashed_password = bcrypt.generate_password_hash("password")
+            for engine, title in (
+                (self.primary, "on the primary"),
+                (self.replica, "on the replica"),
+            ):
+                db.metadata.create_all(engine)
+                with engine.begin() as connection:
+                    connection.execute(
+                        User.__table__.insert(),
+                        {
+                            "username": "testuser",
+                            "email": "test@example.com",
+                            "password": hashed_password,
+                            "email_verified": True,
+                            "first_name": "Test_first_name",
+                            "last_name": "Test_last_name",
+                            "role": "Follower",
+                        },
+                    )
+                    connection.execute(
+                        Post.__table__.insert(),
+                        {
+                            "title": title,
+                            "content": "content",
+                            "excerpt": "content",
+                            "user_id": 1,
+                        },
+                    )
+
+    def tearDown(self) -> None:
+        with self.app.app_context():
+            db.session.remove()
+        self.primary.dispose()
+        self.replica.dispose()
+        shutil.rmtree(self.directory)
+
+    def login(self, client):
+        client.post(
+            "/login", data={"email": "test@example.com", "password": "password"}
+        )
+
+    def titles(self, engine):
+        with engine.connect() as connection:
+            return {
+                title for title, in connection.exec_driver_sql("SELECT title FROM post")
+            }
+
+
+# Every client request below gets its own app context, as in production. A
+# test wrapped in app_context() would share one session and g across them.
+class TestReadReplicas(TestBase):
+    def test_get_reads_from_replica(self):
+        response = self.client.get("/")
+        self.assertIn(b"on the replica", response.data)
+        self.assertNotIn(b"on the primary", response.data)
+
+    def test_writes_go_to_primary(self):
+        self.login(self.client)
+        self.client.post("/post/new", data={"title": "brand new", "content": "content"})
+        self.assertIn("brand new", self.titles(self.primary))
+        self.assertNotIn("brand new", self.titles(self.replica))
+
+    def test_writer_reads_own_writes(self):
+        self.login(self.client)
+        response = self.client.post(
+            "/post/new", data={"title": "brand new", "content": "content"}
+        )
+        self.assertIn(STICKY_COOKIE, response.headers.get("Set-Cookie", ""))
+        response = self.client.get("/")
+        self.assertIn(b"brand new", response.data)
+        # someone else keeps reading the replica
+        response = self.app.test_client().get("/")
+        self.assertNotIn(b"brand new", response.data)
+        self.assertIn(b"on the replica", response.data)
+
+    def test_reads_do_not_stick(self):
+        self.client.get("/")
+        response = self.client.get("/")
+        self.assertNotIn(STICKY_COOKIE, response.headers.get("Set-Cookie", ""))
+        self.assertIn(b"on the replica", response.data)
+
+    def test_reads_after_a_write_stay_on_primary(self):
+        with self.app.test_request_context("/", method="GET"):
+            self.assertEqual(Post.query.one().title, "on the replica")
+            db.session.add(
+                Post(title="written", content="content", author=db.session.get(User, 1))
+            )
+            db.session.flush()
+            self.assertEqual(
+                {post.title for post in Post.query}, {"on the primary", "written"}
+            )
+            db.session.rollback()
+
+    def test_post_requests_read_from_primary(self):
+        with self.app.test_request_context("/", method="POST"):
+            self.assertEqual(Post.query.one().title, "on the primary")
+
+    def test_outside_requests_use_primary(self):
+        with self.app.app_context():
+            self.assertEqual(Post.query.one().title, "on the primary")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+import unittest
+from flask import url_for
+from flaskblog import create_app, db, bcrypt
+from flaskblog.models import User, Post
+from flaskblog.search import rebuild_index
+
+
+class TestBase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config["TESTING"] = True
+        self.app.config["WTF_CSRF_ENABLED"] = False
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        self.app.config["SERVER_NAME"] = "localhost.localdomain"
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            hashed_password = bcrypt.generate_password_hash("password")
+            user = User(
+                username="testuser",
+                email="test@example.com",
+                password=hashed_password,
+                email_verified=True,
+                first_name="Test_first_name",
+                last_name="Test_last_name",
+                role="Follower",
+            )
+            db.session.add(user)
+            db.session.add_all(
+                [
+                    Post(
+                        title="Milonga on Friday",
+                        content="Dancing until late.",
+                        author=user,
+                    ),
+                    Post(
+                        title="Practica notes",
+                        content="We practiced the ocho for the milonga <b>next</b> week.",
+                        author=user,
+                    ),
+                    Post(title="Shoes", content="Where to buy shoes.", author=user),
+                ]
+            )
+            db.session.commit()
+            # posts added behind the routes' back need a rebuild
+            rebuild_index()
+
+    def tearDown(self) -> None:
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def login(self):
+        self.client.post(
+            url_for("users.login"),
+            data={"email": "test@example.com", "password": "password"},
+        )
+
+    def search(self, terms, **kwargs):
+        return self.client.get(url_for("main.search", q=terms, **kwargs))
+
+
+class TestSearch(TestBase):
+    def test_ranked_results_with_highlights(self):
+        with self.app.app_context():
+            response = self.search("milonga")
+            self.assertEqual(response.status_code, 200)
+            html = response.data.decode()
+            # a title hit ranks above a hit in the text
+            self.assertLess(html.index("Friday"), html.index("Practica"))
+            self.assertIn("<mark>Milonga</mark> on Friday", html)
+            self.assertIn("for the <mark>milonga</mark> &lt;b&gt;next", html)
+            self.assertNotIn("Shoes", html)
+
+    def test_stemming_and_prefixes(self):
+        with self.app.app_context():
+            self.assertIn(b"<mark>Practica</mark> notes", self.search("practice").data)
+            self.assertIn(b"Shoes", self.search("sho").data)
+
+    def test_query_syntax_is_not_interpreted(self):
+        with self.app.app_context():
+            for terms in ['"milonga', "milonga AND (", "NEAR(", "*", "title:shoes"]:
+                self.assertEqual(self.search(terms).status_code, 200, terms)
+
+    def test_no_results(self):
+        with self.app.app_context():
+            self.assertIn(b"No posts match", self.search("vals").data)
+
+    def test_pages(self):
+        with self.app.app_context():
+            user = User.query.first()
+            for i in range(12):
+                db.session.add(Post(title=f"vals {i}", content="vals", author=user))
+            db.session.commit()
+            rebuild_index()
+            first = self.search("vals").data.decode()
+            self.assertEqual(first.count('class="article-title"'), 10)
+            self.assertIn("/search?q=vals&amp;page=2", first)
+            second = self.search("vals", page=2).data.decode()
+            self.assertEqual(second.count('class="article-title"'), 2)
+            self.assertNotIn(">Next<", second)
+            self.assertEqual(self.search("vals", page=0).status_code, 404)
+
+
+class TestIncrementalIndex(TestBase):
+    def test_new_posts_are_searchable(self):
+        with self.app.app_context():
+            self.login()
+            self.client.post(
+                url_for("posts.new_post"),
+                data={"title": "Vals marathon", "content": "Three days of vals."},
+            )
+            self.assertIn(b"marathon", self.search("vals").data)
+
+    def test_edits_replace_the_indexed_text(self):
+        with self.app.app_context():
+            self.login()
+            post_id = Post.query.filter_by(title="Shoes").first().id
+            self.client.post(
+                url_for("posts.update_post", post_id=post_id),
+                data={"title": "Sneakers", "content": "Where to buy sneakers."},
+            )
+            self.assertIn(b"No posts match", self.search("shoes").data)
+            self.assertIn(b"Sneakers", self.search("sneakers").data)
+
+    def test_deleted_posts_leave_the_index(self):
+        with self.app.app_context():
+            self.login()
+            post_id = Post.query.filter_by(title="Shoes").first().id
+            self.client.post(url_for("posts.delete_post", post_id=post_id))
+            self.assertIn(b"No posts match", self.search("shoes").data)
+
+    def test_rebuild_command(self):
+        with self.app.app_context():
+            user = User.query.first()
+            db.session.add(Post(title="Tango camp", content="camp", author=user))
+            db.session.commit()
+            self.assertIn(b"No posts match", self.search("camp").data)
+        result = self.app.test_cli_runner().invoke(args=["search", "rebuild"])
+        self.assertEqual(result.exit_code, 0, result.output)
+        with self.app.app_context():
+            self.assertIn(b"Tango <mark>camp</mark>", self.search("camp").data)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,4 +1,5 @@
 import unittest
+from sqlalchemy import event
 from flaskblog import create_app, db, bcrypt
 from flaskblog.models import User
 from flask_login import login_user
@@ -110,6 +111,37 @@ class TestForms(TestBase):
                 form.password.errors,
             )
 
+    def test_registration_form_taken_username_and_email(self):
+        with self.app.app_context():
+            statements = []
+
+            def record(conn, cursor, statement, *args):
+                statements.append(statement)
+
+            event.listen(db.engine, "before_cursor_execute", record)
+            try:
+                form = RegistrationForm(
+                    username="testuser",
+                    email="test@example.com",
+                    password="Test1234!",
+                    confirm_password="Test1234!",
+                    first_name="Test",
+                    last_name="User",
+                    role="Follower",
+                )
+                self.assertFalse(form.validate())
+            finally:
+                event.remove(db.engine, "before_cursor_execute", record)
+            self.assertIn(
+                "Username already taken, please choose another", form.username.errors
+            )
+            self.assertIn(
+                "email already taken, please choose another", form.email.errors
+            )
+            # both fields answered by one EXISTS query
+            self.assertEqual(len(statements), 1)
+            self.assertEqual(statements[0].count("EXISTS"), 2)
+
     def test_login_form_valid_data(self):
         with self.app.app_context():
             form = LoginForm(email="test@example.com", password="Test1234!")
@@ -135,6 +167,35 @@ class TestForms(TestBase):
             )
             self.assertTrue(form.validate())
 
+    def test_update_account_form_taken_email(self):
+        with self.app.test_request_context():
+            db.session.add(
+                User(
+                    username="otheruser",
+                    email="other@example.com",
+                    password=b"x",
+                    first_name="Other",
+                    last_name="User",
+                    role="Leader",
+                )
+            )
+            db.session.commit()
+            user = User.query.filter_by(email="test@example.com").first()
+            login_user(user)
+
+            form = UpdateAccountForm(
+                username="testuser",
+                email="other@example.com",
+                first_name="New",
+                last_name="User",
+                role="Leader",
+            )
+            self.assertFalse(form.validate())
+            self.assertIn(
+                "email already taken, please choose another", form.email.errors
+            )
+            self.assertEqual(form.username.errors, [])
+
     def test_update_account_form_invalid_username(self):
         with self.app.test_request_context():
 
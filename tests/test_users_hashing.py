@@ -0,0 +1,125 @@
+import threading
+import unittest
+from unittest.mock import patch
+from flask import url_for
+from flaskblog import create_app, db, bcrypt, password_hasher
+from flaskblog.models import User
+from flaskblog.users import hashing
+from flaskblog.users.hashing import AuthThrottled, RateLimiter
+
+
+class TestBase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config["TESTING"] = True
+        self.app.config["WTF_CSRF_ENABLED"] = False
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        self.app.config["SERVER_NAME"] = "localhost.localdomain"
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            hashed_password = bcrypt.generate_password_hash("password")
+            user = User(
+                username="testuser",
+                email="test@example.com",
+                password=hashed_password,
+                email_verified=True,
+                first_name="Test_first_name",
+                last_name="Test_last_name",
+                role="Follower",
+            )
+            db.session.add(user)
+            db.session.commit()
+
+    def tearDown(self) -> None:
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def login(self, password="password"):
+        return self.client.post(
+            url_for("users.login"),
+            data={"email": "test@example.com", "password": password},
+        )
+
+
+class TestPasswordHasher(TestBase):
+    def test_hash_and_check(self):
+        self.app.config["BCRYPT_LOG_ROUNDS"] = 4
+        with self.app.app_context():
+            hashed = password_hasher.hash_password("Secret12!")
+            self.assertTrue(hashed.startswith(b"$2b$04$"))
+            self.assertTrue(password_hasher.check_password(hashed, "Secret12!"))
+            self.assertFalse(password_hasher.check_password(hashed, "wrong"))
+
+    def test_login_verifies_password_once(self):
+        with self.app.app_context():
+            with patch.object(hashing, "_check", wraps=hashing._check) as mock_check:
+                response = self.login(password="wrong")
+            self.assertEqual(response.status_code, 200)
+            mock_check.assert_called_once()
+
+    def test_login_rehashes_when_work_factor_changes(self):
+        self.app.config["BCRYPT_LOG_ROUNDS"] = 4
+        with self.app.app_context():
+            response = self.login()
+            self.assertEqual(response.status_code, 302)
+            user = User.query.filter_by(email="test@example.com").first()
+            self.assertTrue(user.password.startswith(b"$2b$04$"))
+            self.assertTrue(password_hasher.check_password(user.password, "password"))
+
+    def test_account_attempts_are_limited_before_hashing(self):
+        self.app.config["AUTH_ACCOUNT_ATTEMPTS_PER_MINUTE"] = 3
+        with self.app.app_context():
+            for _ in range(3):
+                self.assertEqual(self.login(password="wrong").status_code, 200)
+            with patch.object(hashing, "_check") as mock_check:
+                response = self.login()
+            self.assertEqual(response.status_code, 429)
+            mock_check.assert_not_called()
+
+    def test_full_pool_rejects_new_work(self):
+        self.app.config["AUTH_HASH_WORKERS"] = 1
+        self.app.config["AUTH_HASH_MAX_PENDING"] = 1
+        started, release = threading.Event(), threading.Event()
+
+        def slow_hash(password, rounds):
+            started.set()
+            release.wait()
+            return b"hash"
+
+        def hash_in_background():
+            with self.app.app_context():
+                password_hasher.hash_password("x")
+
+        with self.app.app_context(), patch.object(hashing, "_hash", slow_hash):
+            worker = threading.Thread(target=hash_in_background)
+            worker.start()
+            started.wait()
+            with self.assertRaises(AuthThrottled):
+                password_hasher.hash_password("y")
+            release.set()
+            worker.join()
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_bucket_refills_over_time(self):
+        limiter = RateLimiter(per_minute=2)
+        with patch("flaskblog.users.hashing.time.monotonic", return_value=0):
+            self.assertTrue(limiter.allow("ip"))
+            self.assertTrue(limiter.allow("ip"))
+            self.assertFalse(limiter.allow("ip"))
+            self.assertTrue(limiter.allow("other ip"))
+        with patch("flaskblog.users.hashing.time.monotonic", return_value=30):
+            self.assertTrue(limiter.allow("ip"))
+            self.assertFalse(limiter.allow("ip"))
+
+    def test_forgets_least_recent_keys(self):
+        limiter = RateLimiter(per_minute=1, max_keys=2)
+        for key in ("a", "b", "c"):
+            limiter.allow(key)
+        self.assertEqual(list(limiter._buckets), ["b", "c"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -63,6 +63,35 @@ class TestRegistrationRoute(TestBase):
                     mock_commit.assert_called_once()
                     mock_send_verify_email.assert_called_once()
 
+    def test_register_race_maps_integrity_error_to_field(self):
+        with (
+            patch(
+                "flaskblog.users.forms.taken_account_fields", autospec=True
+            ) as mock_taken,
+            patch(
+                "flaskblog.users.routes.send_verify_email", autospec=True
+            ) as mock_send_verify_email,
+        ):
+            # validation runs before the other signup commits, the retry after
+            mock_taken.side_effect = [(False, False), (False, True)]
+            with self.app.app_context():
+                response = self.client.post(
+                    url_for("users.register"),
+                    data={
+                        "username": "newuser",
+                        "email": "test@example.com",
+                        "password": "Test1234!",
+                        "confirm_password": "Test1234!",
+                        "first_name": "New",
+                        "last_name": "User",
+                        "role": "Follower",
+                    },
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertIn(b"email already taken", response.data)
+                self.assertEqual(User.query.count(), 1)
+                mock_send_verify_email.assert_not_called()
+
 
 class TestLoginRoute(TestBase):
     @patch("flaskblog.users.routes.LoginForm", autospec=True)
@@ -111,8 +140,13 @@ class TestAccountRoute(TestBase):
     @patch("flaskblog.users.routes.UpdateAccountForm", autospec=True)
     @patch("flaskblog.users.routes.save_picture", autospec=True)
     @patch("flaskblog.users.routes.remove_old_picture", autospec=True)
+    @patch("flaskblog.users.routes.send_verify_email", autospec=True)
     def test_account_post(
-        self, mock_remove_old_picture, mock_save_picture, MockUpdateAccountForm
+        self,
+        mock_send_verify_email,
+        mock_remove_old_picture,
+        mock_save_picture,
+        MockUpdateAccountForm,
     ):
         mock_save_picture.return_value = "new_pic.jpg"
 
@@ -154,14 +188,80 @@ class TestAccountRoute(TestBase):
                 mock_remove_old_picture.assert_called_once()
 
                 # Verify that the user data was updated in the database
-                user = User.query.filter_by(email="updated@example.com").first()
+                user = User.query.filter_by(username="updateduser").first()
                 self.assertIsNotNone(user)
-                self.assertEqual(user.username, "updateduser")
+                # the new email waits for its verification link
+                self.assertEqual(user.email, "test@example.com")
+                self.assertEqual(user.pending_email, "updated@example.com")
+                self.assertTrue(user.email_verified)
+                mock_send_verify_email.assert_called_once_with(
+                    user, "updated@example.com"
+                )
                 self.assertEqual(user.first_name, "Updated")
                 self.assertEqual(user.last_name, "User")
                 self.assertEqual(user.role, "Leader")
                 self.assertEqual(user.image_file, "new_pic.jpg")
 
 
+class TestEmailChange(TestBase):
+    def change_email(self, email):
+        self.client.post(
+            url_for("users.login"),
+            data={"email": "test@example.com", "password": "password"},
+        )
+        with patch("flaskblog.users.routes.send_verify_email") as send_verify_email:
+            response = self.client.post(
+                url_for("users.account"),
+                data={
+                    "username": "testuser",
+                    "email": email,
+                    "first_name": "Test",
+                    "last_name": "User",
+                    "role": "Follower",
+                },
+            )
+        self.assertEqual(response.status_code, 302)
+        send_verify_email.assert_called_once()
+        # the user and the address the link was mailed to
+        user = User.query.filter_by(username="testuser").first()
+        return user, send_verify_email.call_args.args[1]
+
+    def test_confirmed_by_the_link(self):
+        with self.app.app_context():
+            user, email = self.change_email("new@example.com")
+            token = user.get_verify_token(email)
+            response = self.client.get(url_for("users.verify_token", token=token))
+            self.assertEqual(
+                response.location, url_for("users.account", _external=False)
+            )
+            user = db.session.get(User, user.id)
+            self.assertEqual(user.email, "new@example.com")
+            self.assertIsNone(user.pending_email)
+            self.assertTrue(user.email_verified)
+
+    def test_typo_does_not_lock_the_user_out(self):
+        with self.app.app_context():
+            self.change_email("tset@example.com")
+            self.client.get(url_for("users.logout"))
+            response = self.client.post(
+                url_for("users.login"),
+                data={"email": "test@example.com", "password": "password"},
+            )
+            self.assertEqual(response.location, url_for("main.home", _external=False))
+
+    def test_verify_link_cannot_reset_the_password(self):
+        with self.app.app_context():
+            user, email = self.change_email("stranger@example.com")
+            token = user.get_verify_token(email)
+            self.client.get(url_for("users.logout"))
+            response = self.client.post(
+                url_for("users.reset_token", token=token),
+                data={"password": "taken over", "confirm_password": "taken over"},
+            )
+            self.assertEqual(
+                response.location, url_for("users.reset_request", _external=False)
+            )
+
+
 if __name__ == "__main__":
     unittest.main()
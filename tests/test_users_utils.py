@@ -1,10 +1,30 @@
+import io
+import os
+import shutil
+import tempfile
+import time
 import unittest
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
 from unittest.mock import patch, MagicMock
 from flaskblog import create_app, db, bcrypt
 from flaskblog.models import User
-from flaskblog.users.utils import save_picture, remove_old_picture, send_reset_email
+from flaskblog.users import utils as users_utils
+from flaskblog.users.utils import (
+    InvalidImage,
+    _thumbnail_done,
+    avatar_ready,
+    avatar_sources,
+    avatar_url,
+    save_picture,
+    remove_old_picture,
+    send_reset_email,
+    send_verify_email,
+    sweep_pictures,
+)
 from PIL import Image
 from flask import url_for
+from werkzeug.datastructures import FileStorage
 
 
 class TestBase(unittest.TestCase):
@@ -38,57 +58,274 @@ class TestBase(unittest.TestCase):
 
 class TestUtils(TestBase):
 
+    def picture_root(self):
+        # a throwaway root_path with an empty static/profile_pics
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        os.makedirs(os.path.join(root, "static", "profile_pics"))
+        self.app.root_path = root
+        return os.path.join(root, "static", "profile_pics")
+
+    def upload(self, size=(400, 300), image_format="JPEG", filename="test.jpg"):
+        data = io.BytesIO()
+        Image.new("RGB", size, "red").save(data, format=image_format)
+        data.seek(0)
+        return FileStorage(stream=data, filename=filename)
+
     def test_save_picture(self):
+        self.app.config["AVATAR_PROCESS_WORKERS"] = 0
+        pictures = self.picture_root()
+        with self.app.app_context():
+            key = save_picture(self.upload())
+
+            self.assertRegex(key, r"^[0-9a-f]{16}$")
+            self.assertEqual(
+                sorted(os.listdir(os.path.join(pictures, key))),
+                [
+                    "125.jpg",
+                    "125.webp",
+                    "250.jpg",
+                    "250.webp",
+                    "32.jpg",
+                    "32.webp",
+                    "64.jpg",
+                    "64.webp",
+                ],
+            )
+            with Image.open(os.path.join(pictures, key, "64.webp")) as image:
+                self.assertEqual(image.size, (64, 64))
+                self.assertEqual(image.format, "WEBP")
+            with Image.open(os.path.join(pictures, key, "250.jpg")) as image:
+                self.assertEqual(image.size, (250, 250))
+                self.assertEqual(image.format, "JPEG")
+
+    def test_identical_uploads_share_variants(self):
+        self.app.config["AVATAR_PROCESS_WORKERS"] = 0
+        pictures = self.picture_root()
         with self.app.app_context(), patch(
-            "flaskblog.users.utils.secrets.token_hex"
-        ) as mock_token_hex, patch(
-            "flaskblog.users.utils.os.path.splitext"
-        ) as mock_splitext, patch(
-            "flaskblog.users.utils.Image.open"
-        ) as mock_image_open, patch(
-            "flaskblog.users.utils.current_app"
-        ) as mock_current_app:
-
-            mock_current_app.root_path = "/fakepath"
-            mock_token_hex.return_value = "randomhex"
-            mock_splitext.return_value = ("filename", ".jpg")
-
-            mock_form_picture = MagicMock()
-            mock_form_picture.filename = "test.jpg"
-            mock_image = MagicMock(spec=Image.Image)
-            mock_image_open.return_value = mock_image
-
-            file_name = save_picture(mock_form_picture)
-
-            mock_token_hex.assert_called_once()
-            mock_splitext.assert_called_once_with("test.jpg")
-            mock_image_open.assert_called_once_with(mock_form_picture)
-            mock_image.thumbnail.assert_called_with((125, 125))
-            mock_image.save.assert_called_with(
-                "/fakepath/static/profile_pics/randomhex.jpg"
+            "flaskblog.users.utils.make_variants"
+        ) as mock_make_variants:
+
+            def make_variants(source_path, directory, *args):
+                os.makedirs(directory)
+                open(os.path.join(directory, "250.jpg"), "wb").close()
+                os.remove(source_path)
+
+            mock_make_variants.side_effect = make_variants
+            first = save_picture(self.upload())
+            second = save_picture(self.upload())
+            self.assertEqual(first, second)
+            mock_make_variants.assert_called_once()
+            self.assertEqual(os.listdir(pictures), [first])
+
+    def test_save_picture_in_worker_process(self):
+        self.app.config["AVATAR_PROCESS_WORKERS"] = 1
+        pictures = self.picture_root()
+        with self.app.app_context():
+            key = save_picture(self.upload(image_format="PNG", filename="a.png"))
+            path = os.path.join(pictures, key, "250.jpg")
+            for _ in range(100):
+                if os.path.exists(path):
+                    break
+                time.sleep(0.05)
+            with Image.open(path) as image:
+                self.assertEqual(image.size, (250, 250))
+
+    def test_failed_resize_resets_the_picture(self):
+        with self.app.app_context():
+            user = User.query.first()
+            user.image_file = "0123456789abcdef"
+            db.session.commit()
+            future = Future()
+            future.set_exception(OSError("image file is truncated"))
+            with self.assertLogs(self.app.logger, level="ERROR"):
+                _thumbnail_done(self.app, "0123456789abcdef", future)
+            db.session.refresh(user)
+            self.assertEqual(user.image_file, "default.png")
+
+    def test_broken_pool_does_not_leak_the_upload(self):
+        self.app.config["AVATAR_PROCESS_WORKERS"] = 1
+        self.picture_root()
+        uploads = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, uploads)
+        broken = MagicMock()
+        broken.submit.side_effect = BrokenProcessPool()
+        with self.app.app_context(), patch.object(tempfile, "tempdir", uploads), patch(
+            "flaskblog.users.utils._executor", broken
+        ):
+            with self.assertRaises(BrokenProcessPool):
+                save_picture(self.upload())
+            self.assertEqual(os.listdir(uploads), [])
+            # the next upload gets a fresh pool
+            self.assertIsNone(users_utils._executor)
+
+    def test_save_picture_refuses_too_many_pixels(self):
+        self.app.config["AVATAR_PROCESS_WORKERS"] = 0
+        self.app.config["AVATAR_MAX_PIXELS"] = 10_000
+        pictures = self.picture_root()
+        upload = self.upload(size=(101, 100))
+        with self.app.app_context(), patch.object(Image.Image, "load") as mock_load:
+            with self.assertRaises(InvalidImage):
+                save_picture(upload)
+            mock_load.assert_not_called()
+            self.assertEqual(os.listdir(pictures), [])
+
+    def test_save_picture_refuses_non_images(self):
+        self.picture_root()
+        with self.app.app_context():
+            upload = FileStorage(stream=io.BytesIO(b"not an image"), filename="a.jpg")
+            with self.assertRaises(InvalidImage):
+                save_picture(upload)
+
+    def test_save_picture_refuses_truncated_images(self):
+        self.app.config["AVATAR_PROCESS_WORKERS"] = 0
+        pictures = self.picture_root()
+        data = io.BytesIO()
+        Image.effect_noise((400, 300), 64).save(data, format="JPEG")
+        # the header is intact, decoding fails halfway
+        half = io.BytesIO(data.getvalue()[: len(data.getvalue()) // 2])
+        with self.app.app_context():
+            with self.assertRaises(InvalidImage):
+                save_picture(FileStorage(stream=half, filename="a.jpg"))
+            self.assertEqual(os.listdir(pictures), [])
+
+    def test_avatar_url_serves_placeholder_until_ready(self):
+        pictures = self.picture_root()
+        with self.app.test_request_context():
+            self.assertEqual(
+                avatar_url("0123456789abcdef"), "/static/profile_pics/default.png"
+            )
+            self.assertEqual(avatar_sources("0123456789abcdef"), [])
+            os.makedirs(os.path.join(pictures, "0123456789abcdef"))
+            open(os.path.join(pictures, "0123456789abcdef", "250.jpg"), "wb").close()
+            self.assertEqual(
+                avatar_url("0123456789abcdef", 65),
+                "/static/profile_pics/0123456789abcdef/125.jpg",
             )
 
-            self.assertEqual(file_name, "randomhex.jpg")
+    def test_avatar_sources(self):
+        self.app.config["AVATAR_PROCESS_WORKERS"] = 0
+        self.picture_root()
+        with self.app.test_request_context():
+            key = save_picture(self.upload())
+            sources = avatar_sources(key)
+            self.assertEqual(
+                [mime_type for mime_type, _ in sources], ["image/webp", "image/jpeg"]
+            )
+            self.assertEqual(
+                sources[0][1],
+                ", ".join(
+                    f"/static/profile_pics/{key}/{size}.webp {size}w"
+                    for size in (32, 64, 125, 250)
+                ),
+            )
+
+    def test_single_file_pictures(self):
+        pictures = self.picture_root()
+        open(os.path.join(pictures, "0f7683169355a8c0.jpeg"), "wb").close()
+        with self.app.test_request_context():
+            self.assertEqual(
+                avatar_url("0f7683169355a8c0.jpeg", 65),
+                "/static/profile_pics/0f7683169355a8c0.jpeg",
+            )
+            self.assertEqual(avatar_sources("0f7683169355a8c0.jpeg"), [])
+
+    def make_variants_dir(self, pictures, key, age=7200):
+        path = os.path.join(pictures, key)
+        os.makedirs(path)
+        open(os.path.join(path, "250.jpg"), "wb").close()
+        os.utime(path, (time.time() - age,) * 2)
+        return path
 
     def test_remove_old_picture(self):
-        with self.app.app_context(), patch(
-            "flaskblog.users.utils.current_app"
-        ) as mock_current_app, patch("flaskblog.users.utils.os.remove") as mock_remove:
+        pictures = self.picture_root()
+        self.make_variants_dir(pictures, "0123456789abcdef")
+        open(os.path.join(pictures, "0f7683169355a8c0.jpeg"), "wb").close()
+        with self.app.app_context():
+            user = User.query.first()
+            user.image_file = "0123456789abcdef"
+            db.session.commit()
 
-            mock_current_app.root_path = "/fakepath"
-            remove_old_picture("test.jpg")
-            mock_remove.assert_called_once_with(
-                "/fakepath/static/profile_pics/test.jpg"
+            # still referenced by a user
+            remove_old_picture("0123456789abcdef")
+            self.assertTrue(os.path.isdir(os.path.join(pictures, "0123456789abcdef")))
+
+            user.image_file = "default.png"
+            db.session.commit()
+            remove_old_picture("0123456789abcdef")
+            self.assertFalse(os.path.exists(os.path.join(pictures, "0123456789abcdef")))
+
+            # pictures from before the variant store are single files
+            remove_old_picture("0f7683169355a8c0.jpeg")
+            self.assertFalse(
+                os.path.exists(os.path.join(pictures, "0f7683169355a8c0.jpeg"))
             )
-            # Test case where old_pic is default.png
-            mock_remove.reset_mock()
-            remove_old_picture("default.png")
-            mock_remove.assert_not_called()
 
-    def test_send_reset_email(self):
+            # the placeholder is never removed
+            with patch("flaskblog.users.utils.os.remove") as mock_remove:
+                remove_old_picture("default.png")
+                mock_remove.assert_not_called()
+
+    def test_claimed_variants_are_kept(self):
+        # an identical upload took the dedup shortcut but has not committed
+        self.app.config["AVATAR_PROCESS_WORKERS"] = 0
+        pictures = self.picture_root()
+        with self.app.app_context():
+            key = save_picture(self.upload())
+            path = os.path.join(pictures, key)
+            os.utime(path, (time.time() - 7200,) * 2)
+            self.assertEqual(save_picture(self.upload()), key)
+            self.assertFalse(remove_old_picture(key))
+            self.assertTrue(avatar_ready(key))
+
+    def test_claim_during_removal_restores_the_variants(self):
+        pictures = self.picture_root()
+        path = self.make_variants_dir(pictures, "0123456789abcdef")
+        real_rename = os.rename
+
+        def claimed_first(source, destination):
+            # the other upload's claim lands between the check and the rename
+            if source == path:
+                os.utime(path)
+            real_rename(source, destination)
+
         with self.app.app_context(), patch(
-            "flaskblog.users.utils.Message"
-        ) as mock_Message, patch("flaskblog.users.utils.mail.send") as mock_mail_send:
+            "flaskblog.users.utils.os.rename", side_effect=claimed_first
+        ):
+            self.assertFalse(remove_old_picture("0123456789abcdef"))
+        self.assertEqual(os.listdir(pictures), ["0123456789abcdef"])
+
+    def test_claim_after_removal_makes_new_variants(self):
+        self.app.config["AVATAR_PROCESS_WORKERS"] = 0
+        pictures = self.picture_root()
+        with self.app.app_context():
+            key = save_picture(self.upload())
+            shutil.rmtree(os.path.join(pictures, key))
+            with patch("flaskblog.users.utils.avatar_ready", return_value=True):
+                # the variants went between the ready check and the claim
+                self.assertEqual(save_picture(self.upload()), key)
+            self.assertTrue(avatar_ready(key))
+
+    def test_sweep_pictures(self):
+        pictures = self.picture_root()
+        self.make_variants_dir(pictures, "0123456789abcdef")
+        self.make_variants_dir(pictures, "fedcba9876543210", age=0)
+        self.make_variants_dir(pictures, "00000000000000aa.1a2b3c4d.removing")
+        self.make_variants_dir(pictures, "1111111111111111")
+        with self.app.app_context():
+            user = User.query.first()
+            user.image_file = "1111111111111111"
+            db.session.commit()
+            self.assertEqual(sweep_pictures(), 1)
+        # the recently claimed and the referenced ones stay
+        self.assertEqual(
+            sorted(os.listdir(pictures)), ["1111111111111111", "fedcba9876543210"]
+        )
+
+    def test_send_reset_email(self):
+        with self.app.app_context(), patch("flask_mail.Message") as mock_Message, patch(
+            "flaskblog.users.utils.mail_queue.enqueue"
+        ) as mock_enqueue:
 
             user = User.query.filter_by(email="test@example.com").first()
 
@@ -100,7 +337,25 @@ class TestUtils(TestBase):
                 sender="shu151343@gmail.com",
                 recipients=["test@example.com"],
             )
-            mock_mail_send.assert_called_once()
+            mock_enqueue.assert_called_once_with(mock_Message.return_value)
+
+    def test_send_verify_email_to_a_new_address(self):
+        with self.app.app_context(), patch("flask_mail.Message") as mock_Message, patch(
+            "flaskblog.users.utils.mail_queue.enqueue"
+        ) as mock_enqueue:
+
+            user = User.query.filter_by(email="test@example.com").first()
+
+            user.get_verify_token = MagicMock(return_value="dummytoken")
+            send_verify_email(user, "new@example.com")
+
+            user.get_verify_token.assert_called_once_with("new@example.com")
+            mock_Message.assert_called_with(
+                "Email Verification",
+                sender="shu151343@gmail.com",
+                recipients=["new@example.com"],
+            )
+            mock_enqueue.assert_called_once_with(mock_Message.return_value)
 
 
 if __name__ == "__main__":